@@ -0,0 +1,271 @@
+"""Admission control: weigh requests by estimated cost against a budget.
+
+Each request is charged an estimated working-set size (from the payload size
+and page count) and one CPU slot. Requests that do not fit wait in FIFO order
+for up to ``queue_timeout`` seconds, then are rejected with a retry hint. A
+waiting call that is cancelled or reaches its deadline stops waiting at once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from pdf_service.core import cancellation
+from pdf_service.core.pdf import peek_page_count
+from pdf_service.sessions import DocumentSession
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Rough working-set estimates: MuPDF's parsed document plus an output copy
+# scale with the payload; text, layout and pixmaps scale with the pages.
+BYTES_FACTOR = 3
+PAGE_BYTES = 256 * 1024
+# Payload bytes per page assumed when the page count cannot be read from the
+# PDF's page tree: text pages are smaller, scanned pages larger.
+PAYLOAD_BYTES_PER_PAGE = 32 * 1024
+
+# Weight of the latest call in the moving average used for retry hints.
+_HOLD_SMOOTHING = 0.2
+
+
+class AdmissionRejectedError(Exception):
+    """The request could not be admitted within the queue timeout."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Cost:
+    memory_bytes: int
+    cpu_slots: int = 1
+
+
+def estimate_cost(source: bytes | DocumentSession) -> Cost:
+    """Estimate the cost of processing ``source`` without processing it."""
+    if isinstance(source, DocumentSession):
+        size, page_count = source.size, len(source.doc)
+    else:
+        # Opening the PDF here would cost about as much as a small request.
+        size = len(source)
+        peeked = peek_page_count(source)
+        page_count = (
+            peeked if peeked is not None else -(-size // PAYLOAD_BYTES_PER_PAGE)
+        )
+    return Cost(memory_bytes=size * BYTES_FACTOR + page_count * PAGE_BYTES)
+
+
+@dataclass(eq=False)
+class _Waiter:
+    cost: Cost
+    wake: Callable[[], None]
+    granted: bool = False
+
+
+class AdmissionController:
+    """Memory and CPU budgets shared by all in-flight requests.
+
+    A budget of 0 is unlimited. A request costing more than the whole memory
+    budget is charged the full budget, so it runs alone rather than never.
+    Usable from threads (admit) and from the event loop (admit_async).
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int,
+        cpu_slots: int,
+        queue_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.memory_bytes = memory_bytes
+        self.cpu_slots = cpu_slots
+        self.queue_timeout = queue_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._waiters: deque[_Waiter] = deque()
+        self._memory_in_use = 0
+        self._cpu_in_use = 0
+        self._hold_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_bytes > 0 or self.cpu_slots > 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def memory_in_use(self) -> int:
+        return self._memory_in_use
+
+    @property
+    def cpu_in_use(self) -> int:
+        return self._cpu_in_use
+
+    def acquire(self, cost: Cost) -> Cost:
+        """Block until ``cost`` fits, returning the amount actually charged.
+
+        Stops waiting with ``OperationCancelled`` once the bound cancellation
+        token is cancelled or expires.
+        """
+        cost = self._clamp(cost)
+        event = threading.Event()
+        with self._lock:
+            if self._try_take(cost):
+                return cost
+            waiter = _Waiter(cost, event.set)
+            self._waiters.append(waiter)
+
+        token = cancellation.current()
+        timeout = self.queue_timeout
+        if token is not None:
+            token.add_callback(event.set)
+            if token.deadline is not None:
+                timeout = min(timeout, max(token.deadline - time.time(), 0))
+        try:
+            event.wait(timeout)
+        finally:
+            if token is not None:
+                token.remove_callback(event.set)
+        with self._lock:
+            if waiter.granted:
+                return cost
+            self._abandon(waiter)
+        cancellation.check()
+        raise self._rejection()
+
+    async def acquire_async(self, cost: Cost) -> Cost:
+        """Like acquire(), but waits on the event loop instead of a thread."""
+        cost = self._clamp(cost)
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(_resolve, granted)
+
+        with self._lock:
+            if self._try_take(cost):
+                return cost
+            waiter = _Waiter(cost, wake)
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.queue_timeout)
+        except TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._give_back(cost)
+                else:
+                    self._abandon(waiter)
+            raise
+        with self._lock:
+            if waiter.granted:
+                return cost
+            self._abandon(waiter)
+        raise self._rejection()
+
+    def release(self, cost: Cost, held_seconds: float | None = None) -> None:
+        with self._lock:
+            if held_seconds is not None:
+                self._hold_seconds += _HOLD_SMOOTHING * (
+                    held_seconds - self._hold_seconds
+                )
+            self._give_back(cost)
+
+    @contextlib.contextmanager
+    def admit(self, cost: Cost) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        charged = self.acquire(cost)
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.release(charged, self._clock() - start)
+
+    @contextlib.asynccontextmanager
+    async def admit_async(self, cost: Cost) -> AsyncIterator[None]:
+        if not self.enabled:
+            yield
+            return
+        charged = await self.acquire_async(cost)
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.release(charged, self._clock() - start)
+
+    def _clamp(self, cost: Cost) -> Cost:
+        memory = cost.memory_bytes if self.memory_bytes else 0
+        cpu = cost.cpu_slots if self.cpu_slots else 0
+        return Cost(min(memory, self.memory_bytes), min(cpu, self.cpu_slots))
+
+    def _fits(self, cost: Cost) -> bool:
+        # Unlimited dimensions are clamped to zero, so they always fit.
+        return (
+            self._memory_in_use + cost.memory_bytes <= self.memory_bytes
+            and self._cpu_in_use + cost.cpu_slots <= self.cpu_slots
+        )
+
+    def _try_take(self, cost: Cost) -> bool:
+        # Requests already queued go first, so large ones are not starved.
+        if self._waiters or not self._fits(cost):
+            return False
+        self._take(cost)
+        return True
+
+    def _take(self, cost: Cost) -> None:
+        self._memory_in_use += cost.memory_bytes
+        self._cpu_in_use += cost.cpu_slots
+
+    def _give_back(self, cost: Cost) -> None:
+        self._memory_in_use -= cost.memory_bytes
+        self._cpu_in_use -= cost.cpu_slots
+        self._grant_waiters()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        self._waiters.remove(waiter)
+        # The head of the queue may have been what blocked the others.
+        self._grant_waiters()
+
+    def _grant_waiters(self) -> None:
+        while self._waiters and self._fits(self._waiters[0].cost):
+            waiter = self._waiters.popleft()
+            self._take(waiter.cost)
+            waiter.granted = True
+            waiter.wake()
+
+    def _rejection(self) -> AdmissionRejectedError:
+        retry_after = max(self._hold_seconds, 1.0)
+        logger.warning(
+            "Rejected request after %.1fs in the admission queue "
+            "(%d waiting, %d bytes and %d CPU slots in use)",
+            self.queue_timeout,
+            len(self._waiters),
+            self._memory_in_use,
+            self._cpu_in_use,
+        )
+        return AdmissionRejectedError(
+            f"Server busy: not admitted within {self.queue_timeout:g}s",
+            retry_after,
+        )
+
+
+def _resolve(future: asyncio.Future[None]) -> None:
+    if not future.done():
+        future.set_result(None)
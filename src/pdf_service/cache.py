@@ -0,0 +1,249 @@
+"""Content-addressed cache of core results.
+
+Entries are keyed by the SHA-256 of the PDF plus the request options, so the
+same document sent again (retries, re-reviews, other teams) is answered
+without re-processing. Results are JSON-serializable core TypedDicts.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from pdf_service.sessions import DocumentSession
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterator
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Part of every key; bump when the shape of a cached result changes, so
+# entries written by an older version in the disk tier are not served.
+FORMAT_VERSION = 5
+
+# Fraction of the disk budget the disk tier is trimmed to once it is over:
+# the directory is scanned once per tenth of the budget written, not on
+# every write.
+DISK_LOW_WATER = 0.9
+
+
+def result_key(kind: str, source: bytes | DocumentSession, **options: Any) -> str:
+    """Cache key for a ``kind`` of result computed from ``source``."""
+    return _key(kind, _digest(source), options)
+
+
+def result_keys(
+    kind: str, source: bytes | DocumentSession, items: list[Any], **options: Any
+) -> list[str]:
+    """One cache key per item (e.g. page) of ``source``, hashing it only once."""
+    digest = _digest(source)
+    return [_key(kind, digest, {**options, "item": item}) for item in items]
+
+
+def _digest(source: bytes | DocumentSession) -> str:
+    if isinstance(source, DocumentSession):
+        return source.sha256
+    return hashlib.sha256(source).hexdigest()
+
+
+def _key(kind: str, digest: str, options: dict[str, Any]) -> str:
+    material = json.dumps([FORMAT_VERSION, kind, digest, options], sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ResultCache:
+    """In-memory LRU bounded by encoded size, with an optional disk tier.
+
+    The disk tier stores one JSON file per entry in ``directory``, survives
+    restarts and is bounded by ``max_disk_bytes``; the least recently used
+    files are removed first. Unreadable files are dropped as misses.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        directory: str = "",
+        max_disk_bytes: int = 0,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or bool(self.directory)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        encoded = self._read_disk(key)
+        if encoded is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            value = json.loads(encoded)
+        except ValueError:
+            # Truncated or corrupt, e.g. written by a process that crashed
+            # or by another version sharing the directory.
+            logger.warning("Dropping unreadable cache entry %s", key)
+            self._remove_disk(key, len(encoded))
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, value, len(encoded))
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        encoded = json.dumps(value, separators=(",", ":")).encode()
+        with self._lock:
+            self._remember(key, value, len(encoded))
+        if self.directory:
+            self._write_disk(key, encoded)
+
+    def lookup(self, key_fn: Callable[[], str]) -> tuple[str, Any | None]:
+        """Return ``(key, cached value or None)``; the key is "" if disabled."""
+        if not self.enabled:
+            return "", None
+        key = key_fn()
+        return key, self.get(key)
+
+    def cached(self, key_fn: Callable[[], str], compute: Callable[[], T]) -> T:
+        """Return the cached result for ``key_fn()``, computing it on a miss."""
+        key, value = self.lookup(key_fn)
+        if value is not None:
+            return value  # type: ignore[no-any-return]
+        value = compute()
+        if key:
+            self.put(key, value)
+        return value
+
+    def cached_prefix(self, keys: list[str]) -> Generator[Any]:
+        """Cached values for ``keys`` in order, up to the first one missing."""
+        for key in keys:
+            value = self.get(key) if key else None
+            if value is None:
+                return
+            yield value
+
+    def store_each(self, keys: list[str], values: Iterator[T]) -> Generator[T]:
+        """Pass ``values`` through, storing each under its key as it arrives.
+
+        Values sent before a stream breaks off stay cached, so a retry that
+        resumes the stream starts from where it stopped.
+        """
+        for key, value in zip(keys, values, strict=False):
+            if key:
+                self.put(key, value)
+            yield value
+
+    def _remember(self, key: str, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous[1]
+        self._entries[key] = (value, size)
+        self._total_bytes += size
+        while self._total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._total_bytes -= evicted_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                encoded = f.read()
+            os.utime(path)  # mark as recently used for eviction
+        except OSError:
+            return None
+        return encoded
+
+    def _write_disk(self, key: str, encoded: bytes) -> None:
+        if len(encoded) > self.max_disk_bytes:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(encoded)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            logger.warning("Failed to write cache entry %s", key, exc_info=True)
+            return
+
+        with self._lock:
+            self._disk_bytes += len(encoded)
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            # Rescan so sizes stay right when entries are overwritten or the
+            # directory is shared, then drop the least recently used files.
+            files = sorted(self._disk_files(), key=lambda f: f[2])
+            self._disk_bytes = sum(size for _, size, _ in files)
+            low_water = self.max_disk_bytes * DISK_LOW_WATER
+            for path, size, _ in files:
+                if self._disk_bytes <= low_water:
+                    break
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                    self._disk_bytes -= size
+
+    def _remove_disk(self, key: str, size: int) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _disk_files(self) -> list[tuple[str, int, float]]:
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                with contextlib.suppress(OSError):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
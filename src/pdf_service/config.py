@@ -2,6 +2,13 @@ import os
 from dataclasses import dataclass, field
 
 
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 @dataclass
 class ServiceConfig:
     port: int = field(default_factory=lambda: int(os.getenv("PORT", "50051")))
@@ -13,3 +20,122 @@ class ServiceConfig:
             os.getenv("MAX_MESSAGE_SIZE", str(50 * 1024 * 1024))
         )
     )
+    # Chunk size for streamed responses (e.g. ApplyRedactionsUpload).
+    stream_chunk_size: int = field(
+        default_factory=lambda: int(os.getenv("STREAM_CHUNK_SIZE", str(1024 * 1024)))
+    )
+    # Largest PDF accepted by the *Upload RPCs (0 = unlimited).
+    max_upload_size: int = field(
+        default_factory=lambda: int(os.getenv("MAX_UPLOAD_SIZE", "0"))
+    )
+    # Memory budget (PDF bytes) and idle TTL for OpenDocument sessions.
+    session_cache_bytes: int = field(
+        default_factory=lambda: int(
+            os.getenv("SESSION_CACHE_BYTES", str(512 * 1024 * 1024))
+        )
+    )
+    session_ttl_seconds: float = field(
+        default_factory=lambda: float(os.getenv("SESSION_TTL_SECONDS", "300"))
+    )
+    # Serve with grpc.aio instead of the thread-per-call grpc.server.
+    async_server: bool = field(default_factory=lambda: _env_flag("ASYNC_SERVER"))
+    # "thread" runs core calls on the gRPC worker threads; "process" sends
+    # them to a pool of worker processes.
+    engine: str = field(default_factory=lambda: os.getenv("ENGINE", "thread"))
+    process_workers: int = field(
+        default_factory=lambda: int(
+            os.getenv("PROCESS_WORKERS", str(os.cpu_count() or 1))
+        )
+    )
+    # Pages per worker call when streaming ExtractText from the process pool.
+    extract_batch_pages: int = field(
+        default_factory=lambda: int(os.getenv("EXTRACT_BATCH_PAGES", "8"))
+    )
+    # ExtractText batches in flight per stream in the process pool, buffered
+    # until they can be streamed in page order (0 = one per worker).
+    extract_window: int = field(
+        default_factory=lambda: int(os.getenv("EXTRACT_WINDOW", "0"))
+    )
+    # Pages per streamed message (and worker call) in StreamDocumentInfo.
+    info_batch_pages: int = field(
+        default_factory=lambda: int(os.getenv("INFO_BATCH_PAGES", "50"))
+    )
+    # Recycle a worker process after this many calls (0 = never).
+    worker_max_tasks: int = field(
+        default_factory=lambda: int(os.getenv("WORKER_MAX_TASKS", "0"))
+    )
+    # Memory budget (encoded JSON bytes) for cached GetDocumentInfo and
+    # ExtractText results (0 = no memory tier). Off by default: every cached
+    # result is encoded as JSON, which only pays off for repeated documents.
+    result_cache_bytes: int = field(
+        default_factory=lambda: int(os.getenv("RESULT_CACHE_BYTES", "0"))
+    )
+    # Directory for the on-disk result cache tier ("" = disabled) and its size.
+    result_cache_dir: str = field(
+        default_factory=lambda: os.getenv("RESULT_CACHE_DIR", "")
+    )
+    result_cache_disk_bytes: int = field(
+        default_factory=lambda: int(
+            os.getenv("RESULT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))
+        )
+    )
+    # OCR results by rendered page image: memory budget (0 = no memory tier),
+    # directory of the on-disk tier ("" = disabled) and its size limit.
+    ocr_cache_bytes: int = field(
+        default_factory=lambda: int(os.getenv("OCR_CACHE_BYTES", str(16 * 1024 * 1024)))
+    )
+    ocr_cache_dir: str = field(default_factory=lambda: os.getenv("OCR_CACHE_DIR", ""))
+    ocr_cache_disk_bytes: int = field(
+        default_factory=lambda: int(
+            os.getenv("OCR_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))
+        )
+    )
+    # Worker processes that run OCR apart from other calls (default: half
+    # the cores; 0 = OCR runs where the page is extracted), Tesseract threads
+    # per page (OMP_THREAD_LIMIT for worker processes, 0 = not set) and
+    # pages of one ExtractText stream in the OCR pool at once.
+    ocr_workers: int = field(
+        default_factory=lambda: int(
+            os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // 2)))
+        )
+    )
+    ocr_threads: int = field(default_factory=lambda: int(os.getenv("OCR_THREADS", "1")))
+    ocr_pages_per_request: int = field(
+        default_factory=lambda: int(os.getenv("OCR_PAGES_PER_REQUEST", "2"))
+    )
+    # Admission control: estimated working-set bytes and concurrent calls
+    # admitted at once (0 = unlimited), and how long a request may queue
+    # before it is rejected with RESOURCE_EXHAUSTED.
+    admission_memory_bytes: int = field(
+        default_factory=lambda: int(os.getenv("ADMISSION_MEMORY_BYTES", "0"))
+    )
+    admission_cpu_slots: int = field(
+        default_factory=lambda: int(os.getenv("ADMISSION_CPU_SLOTS", "0"))
+    )
+    admission_queue_timeout: float = field(
+        default_factory=lambda: float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+    )
+    # Port for the Prometheus text endpoint at /metrics (0 = disabled).
+    metrics_port: int = field(
+        default_factory=lambda: int(os.getenv("METRICS_PORT", "0"))
+    )
+    # Allow clients to profile calls with the x-pdfcore-profile metadata flag,
+    # and where to write full profiles ("" = summary trailer only).
+    profiling_enabled: bool = field(
+        default_factory=lambda: _env_flag("PROFILING_ENABLED")
+    )
+    profile_dir: str = field(default_factory=lambda: os.getenv("PROFILE_DIR", ""))
+    # Items of a ProcessBatch stream processed at once.
+    batch_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("BATCH_CONCURRENCY", "8"))
+    )
+    # Response compression ("gzip", "deflate" or "none") for responses of at
+    # least compression_min_bytes (serialized).
+    compression: str = field(default_factory=lambda: os.getenv("COMPRESSION", "none"))
+    compression_min_bytes: int = field(
+        default_factory=lambda: int(os.getenv("COMPRESSION_MIN_BYTES", "4096"))
+    )
+    # Server processes sharing the port via SO_REUSEPORT (1 = no supervisor).
+    server_processes: int = field(
+        default_factory=lambda: int(os.getenv("SERVER_PROCESSES", "1"))
+    )
@@ -4,6 +4,9 @@ import xml.etree.ElementTree as ET
 
 import fitz
 
+from pdf_service.core import cancellation
+from pdf_service.core.pdf import open_pdf
+from pdf_service.core.stages import stage, timed_page
 from pdf_service.core.types import SuggestionAnnotationsResult, SuggestionResultItem
 
 logger = logging.getLogger(__name__)
@@ -14,64 +17,74 @@ XFDF_NS = "http://ns.adobe.com/xfdf/"
 def get_suggestion_annotations(
     pdf_data: bytes, texts: list[str]
 ) -> SuggestionAnnotationsResult:
-    if not pdf_data:
-        raise ValueError("Empty PDF data")
-
-    try:
-        doc = fitz.open(stream=pdf_data, filetype="pdf")
-    except Exception as exc:
-        raise ValueError("Invalid or corrupt PDF") from exc
-
-    with doc:
-        total_suggestions = 0
-        results: list[SuggestionResultItem] = []
-
-        root = ET.Element("xfdf", xmlns=XFDF_NS)
-        annots_el = ET.SubElement(root, "annots")
-
-        for text in texts:
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                page_height = page.rect.height
-                matches = page.search_for(text)
-                occurrences = len(matches)
-
-                for rect in matches:
-                    annot_name = str(uuid.uuid4())
-                    xfdf_y0 = page_height - rect.y1
-                    xfdf_y1 = page_height - rect.y0
-
-                    highlight = ET.SubElement(annots_el, "highlight")
-                    highlight.set("name", annot_name)
-                    highlight.set("page", str(page_num))
-                    highlight.set(
-                        "rect",
-                        f"{rect.x0:.2f},{xfdf_y0:.2f},{rect.x1:.2f},{xfdf_y1:.2f}",
-                    )
-                    contents = ET.SubElement(highlight, "contents")
-                    contents.text = text
-                    total_suggestions += 1
-
-                if occurrences > 0:
-                    results.append(
-                        {
-                            "text": text,
-                            "page": page_num,
-                            "occurrences_found": occurrences,
-                        }
-                    )
-
-        xfdf_str = ET.tostring(root, encoding="unicode", xml_declaration=True)
-
-        logger.info(
-            "Generated %d suggestions for %d text queries across %d pages",
-            total_suggestions,
-            len(texts),
-            len(doc),
+    with open_pdf(pdf_data) as doc:
+        return search_document(doc, texts)
+
+
+def find_matches(
+    doc: fitz.Document, texts: list[str]
+) -> tuple[list[tuple[str, int, fitz.Rect]], list[SuggestionResultItem]]:
+    """Every ``(text, page_number, rect)`` match in ``doc``, and the per-text,
+    per-page counts (pages with matches only)."""
+    matches: list[tuple[str, int, fitz.Rect]] = []
+    results: list[SuggestionResultItem] = []
+
+    for text in texts:
+        for page_num in range(len(doc)):
+            cancellation.check()
+            page = doc[page_num]
+            with timed_page(page_num), stage("search_for"):
+                page_matches = page.search_for(text)
+            matches.extend((text, page_num, rect) for rect in page_matches)
+
+            if page_matches:
+                results.append(
+                    {
+                        "text": text,
+                        "page": page_num,
+                        "occurrences_found": len(page_matches),
+                    }
+                )
+
+    return matches, results
+
+
+def search_document(
+    doc: fitz.Document, texts: list[str]
+) -> SuggestionAnnotationsResult:
+    """Search an already-open document and build XFDF highlight suggestions."""
+    matches, results = find_matches(doc, texts)
+
+    root = ET.Element("xfdf", xmlns=XFDF_NS)
+    annots_el = ET.SubElement(root, "annots")
+
+    for text, page_num, rect in matches:
+        page_height = doc[page_num].rect.height
+        annot_name = str(uuid.uuid4())
+        xfdf_y0 = page_height - rect.y1
+        xfdf_y1 = page_height - rect.y0
+
+        highlight = ET.SubElement(annots_el, "highlight")
+        highlight.set("name", annot_name)
+        highlight.set("page", str(page_num))
+        highlight.set(
+            "rect",
+            f"{rect.x0:.2f},{xfdf_y0:.2f},{rect.x1:.2f},{xfdf_y1:.2f}",
         )
-
-        return {
-            "xfdf": xfdf_str,
-            "total_suggestions": total_suggestions,
-            "results": results,
-        }
+        contents = ET.SubElement(highlight, "contents")
+        contents.text = text
+
+    xfdf_str = ET.tostring(root, encoding="unicode", xml_declaration=True)
+
+    logger.info(
+        "Generated %d suggestions for %d text queries across %d pages",
+        len(matches),
+        len(texts),
+        len(doc),
+    )
+
+    return {
+        "xfdf": xfdf_str,
+        "total_suggestions": len(matches),
+        "results": results,
+    }
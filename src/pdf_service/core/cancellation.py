@@ -0,0 +1,168 @@
+"""Cooperative cancellation of core processing.
+
+The servicer binds a ``CancellationToken`` for each call (``bind`` or
+``call_with``); it is cancelled when the client goes away and expires at the
+call's deadline. Core loops call ``check()`` between pages and between
+stages, which raises ``OperationCancelled`` so abandoned work stops within
+a page. Outside a bound token ``check()`` does nothing.
+
+Worker processes cannot see the server's token, so the process engine sends
+a ``SharedFlagToken``: a slot in a shared-memory flag array that the server
+sets on cancellation (see ``attach_shared_flags``).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterator, MutableSequence
+
+
+class OperationCancelled(Exception):
+    """The caller cancelled the call; its remaining work was abandoned."""
+
+
+class DeadlineExceeded(OperationCancelled):
+    """The call's deadline passed before its work finished."""
+
+
+class CancellationToken:
+    """Cancelled explicitly with ``cancel()`` or once ``deadline`` passes.
+
+    ``deadline`` is wall-clock time (``time.time()``) so it means the same in
+    worker processes.
+    """
+
+    def __init__(self, deadline: float | None = None):
+        self.deadline = deadline
+        self._cancelled = False
+        self._callbacks: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_timeout(cls, timeout: float | None) -> CancellationToken:
+        """Token expiring ``timeout`` seconds from now (``None``: never)."""
+        return cls(None if timeout is None else time.time() + timeout)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` on cancellation (now, if already cancelled)."""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self) -> None:
+        # Expiry first: gRPC also ends (and so cancels) calls at their deadline.
+        if self.expired:
+            raise DeadlineExceeded("Deadline exceeded")
+        if self.cancelled:
+            raise OperationCancelled("Operation cancelled by the client")
+
+
+# Flag array shared with this worker process by the process engine.
+_shared_flags: MutableSequence[int] | None = None
+
+
+def attach_shared_flags(flags: MutableSequence[int]) -> None:
+    """Worker initializer: use ``flags`` for ``SharedFlagToken`` lookups."""
+    global _shared_flags
+    _shared_flags = flags
+
+
+class SharedFlagToken(CancellationToken):
+    """Worker-side view of a server token: flag ``slot`` plus its deadline.
+
+    Picklable; ``slot`` is None if no flag was free, leaving the deadline.
+    """
+
+    def __init__(self, slot: int | None, deadline: float | None = None):
+        super().__init__(deadline)
+        self.slot = slot
+
+    @property
+    def cancelled(self) -> bool:
+        if self.slot is None or _shared_flags is None:
+            return False
+        return bool(_shared_flags[self.slot])
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return SharedFlagToken, (self.slot, self.deadline)
+
+
+_current: ContextVar[CancellationToken | None] = ContextVar(
+    "cancellation_token", default=None
+)
+
+
+def current() -> CancellationToken | None:
+    return _current.get()
+
+
+def check() -> None:
+    """Raise ``OperationCancelled`` if the bound token is cancelled or expired."""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def bind(token: CancellationToken | None) -> Iterator[None]:
+    """Make ``token`` the one ``check()`` consults in this context."""
+    reset = _current.set(token)
+    try:
+        yield
+    finally:
+        _current.reset(reset)
+
+
+def call_with(
+    token: CancellationToken | None,
+    fn: Callable[..., Any],
+    /,
+    *args: Any,
+    **kwargs: Any,
+) -> Any:
+    """Call ``fn`` with ``token`` bound, e.g. on another thread."""
+    with bind(token):
+        return fn(*args, **kwargs)
+
+
+def bound_steps(
+    token: CancellationToken | None, steps: Iterator[Any]
+) -> Generator[Any]:
+    """Advance ``steps`` with ``token`` bound while each item is computed."""
+    while True:
+        with bind(token):
+            try:
+                item = next(steps)
+            except StopIteration:
+                return
+        yield item
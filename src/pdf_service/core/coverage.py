@@ -0,0 +1,249 @@
+"""How much of a page is text and how much is image, without extracting it.
+
+``measure`` runs a page through a probe device that records the bounds of
+text objects, image placements and (on request) vector drawings on a coarse
+grid over the page, and whether any non-whitespace glyph is drawn. It does
+not build a text page or decode images.
+
+Most callers only need to know whether a page has text and, if it has none,
+how much of it images cover. ``measure(page, full=False)`` aborts the page
+run at the first legible glyph, so on a text page it costs a fraction of
+``page.get_text()``; only pages without text are walked to the end. The
+full walk is needed only by forced OCR, which weighs images and drawings
+against the text around them.
+
+The coverages decide which pages count as scans (``likely_scanned``) and
+which are worth sending to OCR (``ocr_pays_off``): a small logo on a blank
+page or a stamp on a text page is not.
+"""
+
+import math
+from dataclasses import dataclass
+
+import fitz
+from fitz import mupdf
+
+# Cells per side of the grid coverage is measured on.
+GRID_SIZE = 64
+
+# Share of the page that images not under text must cover before a page
+# without text counts as scanned, or a page is worth OCR; also the share
+# vector drawings must cover before a page without text is worth forced OCR.
+MIN_SCAN_COVERAGE = 0.05
+
+
+@dataclass(frozen=True)
+class PageCoverage:
+    # Whether page.get_text() would return anything but whitespace.
+    has_text: bool
+    # Share of the page covered by text objects.
+    text_coverage: float
+    # Share of the page covered by images.
+    image_coverage: float
+    # Share of the page covered by images but not by text.
+    image_only_coverage: float
+    # False if the run stopped at the first legible glyph; the coverages
+    # are then not measured (0).
+    complete: bool = True
+    # Share of the page covered by vector drawings (full runs only).
+    drawing_coverage: float = 0.0
+
+
+def likely_scanned(coverage: PageCoverage) -> bool:
+    """A page with no text whose images cover a meaningful part of it."""
+    return not coverage.has_text and coverage.image_coverage >= MIN_SCAN_COVERAGE
+
+
+def ocr_pays_off(
+    coverage: PageCoverage, force: bool = False, illegible_text: bool = False
+) -> bool:
+    """Whether OCR can find text that extraction does not.
+
+    Without ``force`` only pages without text qualify. With it, also pages
+    with text whose images not under that text are large enough to hold
+    more (a scanned attachment, not a stamp or logo), pages whose text does
+    not extract (``illegible_text``: it contains U+FFFD), and pages without
+    text whose drawings cover enough of them to be text converted to
+    outlines. Forced decisions need a full measurement.
+    """
+    if coverage.has_text and not force:
+        return False
+    if force and not coverage.complete:
+        raise ValueError("Forced OCR needs a full coverage measurement")
+    if coverage.image_only_coverage >= MIN_SCAN_COVERAGE:
+        return True
+    if not force:
+        return False
+    if illegible_text:
+        return True
+    return not coverage.has_text and coverage.drawing_coverage >= MIN_SCAN_COVERAGE
+
+
+class CoverageGrid:
+    """Cells of a ``size`` x ``size`` grid over ``bounds`` touched by rects."""
+
+    def __init__(self, bounds: fitz.Rect, size: int = GRID_SIZE) -> None:
+        self.bounds = bounds
+        self.size = size
+        self.cells = bytearray(size * size)
+
+    def add(self, x0: float, y0: float, x1: float, y1: float) -> None:
+        bounds, size = self.bounds, self.size
+        if bounds.is_empty:
+            return
+        scale_x = size / bounds.width
+        scale_y = size / bounds.height
+        col0 = max(0, int((x0 - bounds.x0) * scale_x))
+        col1 = min(size, math.ceil((x1 - bounds.x0) * scale_x))
+        row0 = max(0, int((y0 - bounds.y0) * scale_y))
+        row1 = min(size, math.ceil((y1 - bounds.y0) * scale_y))
+        if col0 >= col1 or row0 >= row1:
+            return
+        if col0 == 0 and col1 == size:
+            # Whole rows (a full-page scan): one contiguous run of cells.
+            self.cells[row0 * size : row1 * size] = b"\x01" * ((row1 - row0) * size)
+            return
+        span = b"\x01" * (col1 - col0)
+        for row in range(row0 * size, row1 * size, size):
+            self.cells[row + col0 : row + col1] = span
+
+    @property
+    def ratio(self) -> float:
+        return self.cells.count(1) / len(self.cells)
+
+    def ratio_without(self, other: "CoverageGrid") -> float:
+        """Share of cells covered here but not in ``other``."""
+        # Cells are 0 or 1 bytes, so bitwise ops on the whole grid as one
+        # integer combine them cell by cell.
+        only = int.from_bytes(self.cells) & ~int.from_bytes(other.cells)
+        return only.bit_count() / len(self.cells)
+
+
+class _Probe(mupdf.FzDevice2):  # type: ignore[misc]
+    """Device recording text and image bounds and whether any glyph shows.
+
+    ``has_text`` matches ``bool(page.get_text().strip())``: text in every
+    render mode counts (including invisible OCR layers), whitespace and text
+    wholly outside the page do not. With a ``cookie`` the run is aborted at
+    the first legible glyph; with ``drawings`` vector paths are recorded too.
+    """
+
+    def __init__(
+        self, bounds: fitz.Rect, cookie: object = None, drawings: bool = False
+    ) -> None:
+        super().__init__()
+        for name in ("fill_text", "stroke_text", "clip_text", "clip_stroke_text"):
+            getattr(self, f"use_virtual_{name}")()
+        self.use_virtual_ignore_text()
+        self.use_virtual_fill_image()
+        self.use_virtual_fill_image_mask()
+        if drawings:
+            self.use_virtual_fill_path()
+            self.use_virtual_stroke_path()
+        self.has_text = False
+        self.text = CoverageGrid(bounds)
+        self.images = CoverageGrid(bounds)
+        self.drawings = CoverageGrid(bounds)
+        self._bounds = bounds
+        self._cookie = cookie
+
+    def _text(self, text: object, ctm: object) -> None:
+        r = mupdf.ll_fz_bound_text(text, None, ctm)
+        if r.x1 <= self._bounds.x0 or r.x0 >= self._bounds.x1:
+            return
+        if r.y1 <= self._bounds.y0 or r.y0 >= self._bounds.y1:
+            return
+        if not self.has_text:
+            self.has_text = _has_glyph(text)
+            if self.has_text and self._cookie is not None:
+                # Nothing after the first glyph changes the answer.
+                self._cookie.m_internal.abort = 1  # type: ignore[attr-defined]
+                return
+        self.text.add(r.x0, r.y0, r.x1, r.y1)
+
+    def _image(self, ctm: object) -> None:
+        r = mupdf.ll_fz_transform_rect(mupdf.fz_unit_rect, ctm)
+        self.images.add(r.x0, r.y0, r.x1, r.y1)
+
+    def _path(self, path: object, stroke: object, ctm: object) -> None:
+        r = mupdf.ll_fz_bound_path(path, stroke, ctm)
+        self.drawings.add(r.x0, r.y0, r.x1, r.y1)
+
+    def fill_text(self, ctx: object, text: object, ctm: object, *args: object) -> None:
+        self._text(text, ctm)
+
+    def stroke_text(
+        self, ctx: object, text: object, stroke: object, ctm: object, *args: object
+    ) -> None:
+        self._text(text, ctm)
+
+    def clip_text(self, ctx: object, text: object, ctm: object, *args: object) -> None:
+        self._text(text, ctm)
+
+    def clip_stroke_text(
+        self, ctx: object, text: object, stroke: object, ctm: object, *args: object
+    ) -> None:
+        self._text(text, ctm)
+
+    def ignore_text(self, ctx: object, text: object, ctm: object) -> None:
+        self._text(text, ctm)
+
+    def fill_image(
+        self, ctx: object, image: object, ctm: object, *args: object
+    ) -> None:
+        self._image(ctm)
+
+    def fill_image_mask(
+        self, ctx: object, image: object, ctm: object, *args: object
+    ) -> None:
+        self._image(ctm)
+
+    def fill_path(
+        self, ctx: object, path: object, even_odd: object, ctm: object, *args: object
+    ) -> None:
+        self._path(path, None, ctm)
+
+    def stroke_path(
+        self, ctx: object, path: object, stroke: object, ctm: object, *args: object
+    ) -> None:
+        self._path(path, stroke, ctm)
+
+
+def _has_glyph(text: object) -> bool:
+    """Whether ``text`` draws any glyph but whitespace."""
+    span = text.head  # type: ignore[attr-defined]
+    while span:
+        items = mupdf.FzTextSpan(span)
+        for i in range(span.len):
+            ucs = items.items(i).ucs
+            if ucs >= 0 and not chr(ucs).isspace():
+                return True
+        span = span.next
+    return False
+
+
+def measure(page: fitz.Page, full: bool = True) -> PageCoverage:
+    """Text and image coverage of ``page``, including its annotations.
+
+    Unless ``full``, the run stops at the first legible glyph (see
+    ``PageCoverage.complete``) and drawings are not recorded. That is
+    enough for ``likely_scanned`` and for ``ocr_pays_off`` without force.
+    """
+    r = mupdf.ll_fz_bound_page(page.this.m_internal)
+    cookie = None if full else mupdf.FzCookie()
+    probe = _Probe(fitz.Rect(r.x0, r.y0, r.x1, r.y1), cookie, drawings=full)
+    try:
+        mupdf.fz_run_page(
+            page.this, probe, mupdf.FzMatrix(), cookie or mupdf.FzCookie()
+        )
+    finally:
+        mupdf.fz_close_device(probe)
+    if not full and probe.has_text:
+        return PageCoverage(True, 0.0, 0.0, 0.0, complete=False)
+    return PageCoverage(
+        has_text=probe.has_text,
+        text_coverage=probe.text.ratio,
+        image_coverage=probe.images.ratio,
+        image_only_coverage=probe.images.ratio_without(probe.text),
+        drawing_coverage=probe.drawings.ratio,
+    )
@@ -1,76 +1,288 @@
+"""Document analysis for GetDocumentInfo.
+
+Analysis only needs to know *whether* a page has text and, for pages
+without text, how much of them images cover, so instead of extracting it
+each page is measured with ``coverage.measure``, which stops at the first
+legible glyph. Annotations are counted from the page's
+annotation xrefs without loading them. ``get_document_info`` can also analyze
+a page range, so engines can split long documents across workers and
+``merge`` the parts, or stream batches of a range as they are analyzed.
+``triage_document`` skips the page walk and estimates from a sample.
+"""
+
 import logging
+import math
+from collections.abc import Generator
 
 import fitz
+from fitz import mupdf
 
-from pdf_service.core.types import DocumentInfoResult, PageInfoResult
+from pdf_service.core import cancellation, coverage
+from pdf_service.core.pdf import open_pdf
+from pdf_service.core.stages import stage, timed_page
+from pdf_service.core.types import (
+    DocumentInfoResult,
+    DocumentMetadataResult,
+    PageInfoResult,
+    TriageResult,
+)
 
 logger = logging.getLogger(__name__)
 
+# Normal quantile for the 95% interval behind triage confidence.
+_Z95 = 1.96
+
+# Annotation types ``Page.annots()`` skips; they are not counted either.
+_UNCOUNTED_ANNOTS = (
+    mupdf.PDF_ANNOT_LINK,
+    mupdf.PDF_ANNOT_POPUP,
+    mupdf.PDF_ANNOT_WIDGET,
+)
+
+
+def annotation_count(page: fitz.Page) -> int:
+    """Number of annotations ``page.annots()`` would yield, without loading them."""
+    return sum(1 for _, kind, _ in page.annot_xrefs() if kind not in _UNCOUNTED_ANNOTS)
+
+
+def get_document_info(
+    pdf_data: bytes, start: int = 0, stop: int | None = None
+) -> DocumentInfoResult:
+    """Analyze ``pdf_data``; ``start``/``stop`` limit the pages analyzed."""
+    with open_pdf(pdf_data) as doc:
+        return analyze_document(doc, len(pdf_data), start, stop)
+
+
+def analyze_document(
+    doc: fitz.Document, file_size: int, start: int = 0, stop: int | None = None
+) -> DocumentInfoResult:
+    """Analyze an already-open document; ``file_size`` is its size in bytes.
+
+    Only pages ``start`` to ``stop`` (exclusive, default: the last page) are
+    analyzed; the page flags and annotation count cover those pages.
+    """
+    result = _analyze(doc, file_size, start, stop)
+    logger.info(
+        "Analyzed %d of %d pages (%d bytes, %d annotations)",
+        len(result["pages"]),
+        len(doc),
+        file_size,
+        result["existing_annotation_count"],
+    )
+    return result
+
+
+def page_range(doc: fitz.Document, start: int = 0, stop: int | None = None) -> range:
+    """Validate a requested page range; ``stop`` None means the last page."""
+    _check_readable(doc)
+    stop = len(doc) if stop is None else stop
+    if not 0 <= start < stop <= len(doc):
+        raise ValueError(
+            f"Page range out of range: {start}-{stop} (document has {len(doc)} pages)"
+        )
+    return range(start, stop)
+
+
+def stream_header(
+    pdf_data: bytes, start: int = 0, stop: int | None = None
+) -> tuple[DocumentInfoResult, range]:
+    """Document-level fields (no pages analyzed) and the validated page range."""
+    with open_pdf(pdf_data) as doc:
+        return document_header(doc, len(pdf_data), start, stop)
+
+
+def document_header(
+    doc: fitz.Document, file_size: int, start: int = 0, stop: int | None = None
+) -> tuple[DocumentInfoResult, range]:
+    """``stream_header`` of an open document."""
+    pages = page_range(doc, start, stop)
+    return _analyze(doc, file_size, pages.start, pages.start), pages
+
 
-def get_document_info(pdf_data: bytes) -> DocumentInfoResult:
-    if not pdf_data:
-        raise ValueError("Empty PDF data")
-
-    try:
-        doc = fitz.open(stream=pdf_data, filetype="pdf")
-    except Exception as exc:
-        raise ValueError("Invalid or corrupt PDF") from exc
-
-    with doc:
-        if doc.is_encrypted:
-            raise ValueError("PDF is encrypted")
-
-        has_text_content = False
-        has_annotations = False
-        annotation_count = 0
-        pages: list[PageInfoResult] = []
-
-        for i, page in enumerate(doc):
-            page_text = page.get_text().strip()
-            page_has_text = bool(page_text)
-            page_images = page.get_images()
-            page_has_images = len(page_images) > 0
-
-            if page_has_text:
-                has_text_content = True
-
-            page_annots = list(page.annots() or [])
-            if page_annots:
-                has_annotations = True
-                annotation_count += len(page_annots)
-
-            pages.append(
-                {
-                    "page_number": i,
-                    "has_text": page_has_text,
-                    "has_images": page_has_images,
-                    "likely_scanned": page_has_images and not page_has_text,
-                    "width": page.rect.width,
-                    "height": page.rect.height,
-                }
-            )
-
-        meta = doc.metadata or {}
-
-        logger.info(
-            "Analyzed %d-page document (%d bytes, %d annotations)",
-            len(doc),
-            len(pdf_data),
-            annotation_count,
+def get_page_batch(pdf_data: bytes, start: int, stop: int) -> DocumentInfoResult:
+    """Analysis of one batch of a streamed range."""
+    with open_pdf(pdf_data) as doc:
+        return analyze_page_batch(doc, len(pdf_data), start, stop)
+
+
+def analyze_page_batch(
+    doc: fitz.Document, file_size: int, start: int, stop: int
+) -> DocumentInfoResult:
+    """``get_page_batch`` of an open document."""
+    return _analyze(doc, file_size, start, stop)
+
+
+def stream_document_info(
+    pdf_data: bytes, start: int, stop: int | None, batch_pages: int
+) -> Generator[DocumentInfoResult]:
+    with open_pdf(pdf_data) as doc:
+        yield from stream_document_analysis(
+            doc, len(pdf_data), start, stop, batch_pages
         )
 
-        return {
-            "page_count": len(doc),
-            "file_size_bytes": len(pdf_data),
-            "is_encrypted": doc.is_encrypted,
-            "has_text_content": has_text_content,
-            "has_annotations": has_annotations,
-            "existing_annotation_count": annotation_count,
-            "metadata": {
-                "title": meta.get("title", ""),
-                "author": meta.get("author", ""),
-                "producer": meta.get("producer", ""),
-                "creator": meta.get("creator", ""),
-            },
-            "pages": pages,
-        }
+
+def stream_document_analysis(
+    doc: fitz.Document,
+    file_size: int,
+    start: int,
+    stop: int | None,
+    batch_pages: int,
+) -> Generator[DocumentInfoResult]:
+    """Analyze pages ``start`` to ``stop`` of an open document as they are read.
+
+    Yields the document-level fields first (a result with no pages), then one
+    result per ``batch_pages`` pages.
+    """
+    pages = page_range(doc, start, stop)
+    yield _analyze(doc, file_size, pages.start, pages.start)
+    for first in pages[::batch_pages]:
+        yield _analyze(doc, file_size, first, min(first + batch_pages, pages.stop))
+    logger.info(
+        "Streamed analysis of %d of %d pages (%d bytes)",
+        len(pages),
+        len(doc),
+        file_size,
+    )
+
+
+def get_triage(pdf_data: bytes, sample_pages: int = 0) -> TriageResult:
+    with open_pdf(pdf_data) as doc:
+        return triage_document(doc, len(pdf_data), sample_pages)
+
+
+def triage_document(
+    doc: fitz.Document, file_size: int, sample_pages: int = 0
+) -> TriageResult:
+    """Document-level fields and an estimate of how much of it is scanned.
+
+    Opening a document reads only its trailer and xref, so without samples
+    no page is touched. Otherwise ``sample_pages`` pages spread over the
+    document are analyzed (see ``sample_page_numbers``) and the share of
+    likely scans among them estimates the share in the document. Encrypted
+    documents are reported, not rejected, but cannot be sampled.
+    """
+    if sample_pages < 0:
+        raise ValueError("sample_pages must not be negative")
+    samples: list[PageInfoResult] = []
+    if not doc.is_encrypted:
+        for i in sample_page_numbers(len(doc), sample_pages):
+            cancellation.check()
+            with timed_page(i):
+                samples.append(_analyze_page(doc[i], i))
+    scanned = sum(p["likely_scanned"] for p in samples)
+    ratio, confidence = scanned_estimate(scanned, len(samples), len(doc))
+    return {
+        "page_count": len(doc),
+        "file_size_bytes": file_size,
+        "is_encrypted": doc.is_encrypted,
+        "metadata": _metadata(doc),
+        "sampled_pages": samples,
+        "estimated_scanned_ratio": ratio,
+        "confidence": confidence,
+    }
+
+
+def sample_page_numbers(page_count: int, sample_pages: int) -> list[int]:
+    """The middle page of each of ``sample_pages`` equal parts of the document.
+
+    Every page if the sample is as large as the document. The choice is
+    deterministic, so repeated triage of a document gives the same answer.
+    """
+    if sample_pages >= page_count:
+        return list(range(page_count))
+    return [(2 * k + 1) * page_count // (2 * sample_pages) for k in range(sample_pages)]
+
+
+def scanned_estimate(
+    scanned: int, sampled: int, page_count: int
+) -> tuple[float, float]:
+    """Scanned share of ``page_count`` pages from ``scanned`` of ``sampled``.
+
+    Returns the sample share and a confidence: 1 minus the half-width of
+    the 95% Wilson score interval around it, narrowed by the finite
+    population correction. Confidence is 1 when every page was sampled and
+    0 without a sample.
+    """
+    if sampled == 0:
+        return 0.0, 0.0
+    ratio = scanned / sampled
+    if sampled >= page_count:
+        return ratio, 1.0
+    z2 = _Z95**2 / sampled
+    half_width = (
+        _Z95
+        / (1 + z2)
+        * math.sqrt(ratio * (1 - ratio) / sampled + z2 / (4 * sampled))
+        * math.sqrt((page_count - sampled) / (page_count - 1))
+    )
+    return ratio, 1 - half_width
+
+
+def _check_readable(doc: fitz.Document) -> None:
+    if doc.is_encrypted:
+        raise ValueError("PDF is encrypted")
+
+
+def _analyze(
+    doc: fitz.Document, file_size: int, start: int, stop: int | None
+) -> DocumentInfoResult:
+    _check_readable(doc)
+
+    annotation_total = 0
+    pages: list[PageInfoResult] = []
+
+    for i in range(start, len(doc) if stop is None else min(stop, len(doc))):
+        cancellation.check()
+        page = doc[i]
+        with timed_page(i):
+            pages.append(_analyze_page(page, i))
+            with stage("annots"):
+                annotation_total += annotation_count(page)
+
+    return {
+        "page_count": len(doc),
+        "file_size_bytes": file_size,
+        "is_encrypted": doc.is_encrypted,
+        "has_text_content": any(p["has_text"] for p in pages),
+        "has_annotations": annotation_total > 0,
+        "existing_annotation_count": annotation_total,
+        "metadata": _metadata(doc),
+        "pages": pages,
+    }
+
+
+def _analyze_page(page: fitz.Page, page_number: int) -> PageInfoResult:
+    with stage("coverage"):
+        page_coverage = coverage.measure(page, full=False)
+    with stage("get_images"):
+        has_images = len(page.get_images()) > 0
+    return {
+        "page_number": page_number,
+        "has_text": page_coverage.has_text,
+        "has_images": has_images,
+        "likely_scanned": coverage.likely_scanned(page_coverage),
+        "width": page.rect.width,
+        "height": page.rect.height,
+    }
+
+
+def _metadata(doc: fitz.Document) -> DocumentMetadataResult:
+    meta = doc.metadata or {}
+    return {
+        "title": meta.get("title", ""),
+        "author": meta.get("author", ""),
+        "producer": meta.get("producer", ""),
+        "creator": meta.get("creator", ""),
+    }
+
+
+def merge(parts: list[DocumentInfoResult]) -> DocumentInfoResult:
+    """Combine analyses of consecutive page ranges of one document."""
+    annotation_total = sum(part["existing_annotation_count"] for part in parts)
+    return {
+        **parts[0],
+        "has_text_content": any(part["has_text_content"] for part in parts),
+        "has_annotations": annotation_total > 0,
+        "existing_annotation_count": annotation_total,
+        "pages": [page for part in parts for page in part["pages"]],
+    }
@@ -1,14 +1,229 @@
+"""OCR of page images with Tesseract, cached by the rendered image.
+
+``ocr_textpage`` works like ``page.get_textpage_ocr()``: legible text is kept
+and the rest of the page (images, illegible text) is rendered and OCRed. The
+OCR result for a rendered image is cached by a hash of its pixels, the
+language and the resolution, so a page seen before (a recurring form, a
+re-submitted scan) is not sent to Tesseract again. Install a cache with
+``set_cache``; without one every page is OCRed.
+
+Tesseract runs in the calling thread unless a recognizer is installed with
+``set_recognizer``, e.g. a dedicated OCR process pool. ``submit_page``
+renders a page and hands its image to the recognizer without waiting, so
+extraction can render the next pages while earlier ones are recognized.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
 import logging
+import weakref
+from concurrent import futures
+from typing import TYPE_CHECKING
 
 import fitz
 
+from pdf_service.core.stages import stage
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from pdf_service.cache import ResultCache
+
+    # recognizer(samples, width, height, language): the result of
+    # recognize_image() for those arguments.
+    Recognizer = Callable[[bytes, int, int, str], futures.Future[bytes]]
+
 logger = logging.getLogger(__name__)
 
+# Resolution pages are rendered at for OCR, as in get_textpage_ocr().
+DPI = 72
+
+# Part of every cache key; bump when the OCR output for an image changes.
+_CACHE_VERSION = 1
+
+_cache: ResultCache | None = None
+_recognizer: Recognizer | None = None
+_pages_in_flight = 1
+
+
+def set_cache(cache: ResultCache | None) -> None:
+    """Cache OCR results in ``cache`` (None: no caching) in this process."""
+    global _cache
+    _cache = cache
+
+
+def set_recognizer(recognizer: Recognizer | None, pages_in_flight: int = 1) -> None:
+    """Send images to ``recognizer`` (None: the calling thread) in this process.
+
+    ``pages_in_flight`` is how many pages of one extraction may be submitted
+    before the first of them is needed.
+    """
+    global _recognizer, _pages_in_flight
+    if pages_in_flight < 1:
+        raise ValueError("pages_in_flight must be at least 1")
+    _recognizer = recognizer
+    _pages_in_flight = pages_in_flight
+
+
+def pages_in_flight() -> int:
+    return _pages_in_flight
+
 
 def ocr_page(page: fitz.Page, language: str = "eng") -> str:
+    return str(ocr_textpage(page, language=language).extractText())
+
+
+def ocr_textpage(
+    page: fitz.Page, language: str = "eng", flags: int = fitz.TEXTFLAGS_TEXT
+) -> fitz.TextPage:
+    """A TextPage of ``page`` with OCR text and positions for its images."""
+    return submit_page(page, language, flags).result()
+
+
+class PendingOcr:
+    """A page whose image is being recognized; ``result()`` waits for it."""
+
+    def __init__(
+        self,
+        page: fitz.Page,
+        textpage: fitz.TextPage,
+        key: str | None,
+        ocr_pdf: futures.Future[bytes],
+    ) -> None:
+        self._page = page
+        self._textpage = textpage
+        # Cache key to store the result under; None if it came from the cache.
+        self._key = key
+        self._ocr_pdf = ocr_pdf
+
+    def result(self) -> fitz.TextPage:
+        """The page's legible text extended with the recognized text."""
+        ocr_pdf = self._ocr_pdf.result()
+        if self._key is not None and _cache is not None:
+            _cache.put(self._key, base64.b64encode(ocr_pdf).decode())
+        with fitz.open(stream=ocr_pdf, filetype="pdf") as doc:
+            doc[0].extend_textpage(self._textpage, flags=fitz.TEXT_ACCURATE_BBOXES)
+        self._textpage.parent = weakref.proxy(self._page)
+        return self._textpage
+
+    def cancel(self) -> None:
+        self._ocr_pdf.cancel()
+
+
+def submit_page(
+    page: fitz.Page, language: str = "eng", flags: int = fitz.TEXTFLAGS_TEXT
+) -> PendingOcr:
+    """Render ``page`` and start recognizing it, as ``ocr_textpage`` does."""
+    # As in get_textpage_ocr(): keep U+FFFD, it marks text to OCR.
+    flags &= ~(
+        fitz.TEXT_USE_CID_FOR_UNKNOWN_UNICODE | fitz.TEXT_USE_GID_FOR_UNKNOWN_UNICODE
+    )
+    with stage("ocr_render"):
+        textpage, pix = _ocr_input(page, flags)
+    key = _cache_key(pix, language)
+    cached = _cached(key)
+    if cached is not None:
+        return PendingOcr(page, textpage, None, _done(cached))
+    if _recognizer is None:
+        return PendingOcr(page, textpage, key, _done(_recognize(pix, language)))
+    return PendingOcr(
+        page,
+        textpage,
+        key,
+        _recognizer(pix.samples, pix.width, pix.height, language),
+    )
+
+
+def recognize_image(samples: bytes, width: int, height: int, language: str) -> bytes:
+    """``_recognize`` for the RGB samples of an image ``submit_page`` rendered.
+
+    Pixmaps cannot be pickled; recognizers in other processes call this.
+    """
+    return _recognize(fitz.Pixmap(fitz.csRGB, width, height, samples, False), language)
+
+
+def _done(ocr_pdf: bytes) -> futures.Future[bytes]:
+    future: futures.Future[bytes] = futures.Future()
+    future.set_result(ocr_pdf)
+    return future
+
+
+def _ocr_input(page: fitz.Page, flags: int) -> tuple[fitz.TextPage, fitz.Pixmap]:
+    """The legible text of ``page`` and an image of the rest to OCR.
+
+    The page is copied to a scratch document, its legible text is redacted
+    and the remainder rendered, as get_textpage_ocr() does.
+    """
+    scratch = fitz.open()
+    scratch.insert_pdf(page.parent, from_page=page.number, to_page=page.number)
+    copy = scratch[0]
+    copy.remove_rotation()
+    textpage = copy.get_textpage(flags=flags)
+    spans = _spans(textpage)
+
+    illegible = [bbox for bbox, text in spans if chr(0xFFFD) in text]
+    if illegible:
+        # The text layer must not contain unreadable spans; OCR reads them
+        # from a fresh copy of the page instead.
+        _remove_text(copy, illegible)
+        textpage = copy.get_textpage(flags=flags)
+        spans = _spans(textpage)
+        scratch.insert_pdf(page.parent, from_page=page.number, to_page=page.number)
+        copy = scratch[-1]
+        copy.remove_rotation()
+
+    _remove_text(copy, [bbox for bbox, text in spans if chr(0xFFFD) not in text])
+    return textpage, copy.get_pixmap(dpi=DPI)
+
+
+def _spans(textpage: fitz.TextPage) -> list[tuple[tuple[float, ...], str]]:
+    return [
+        (span["bbox"], span["text"])
+        for block in textpage.extractDICT()["blocks"]
+        if block["type"] == 0
+        for line in block["lines"]
+        for span in line["spans"]
+    ]
+
+
+def _remove_text(page: fitz.Page, bboxes: list[tuple[float, ...]]) -> None:
+    for bbox in bboxes:
+        page.add_redact_annot(bbox)
+    page.apply_redactions(
+        images=fitz.PDF_REDACT_IMAGE_NONE,
+        graphics=fitz.PDF_REDACT_LINE_ART_NONE,
+        text=fitz.PDF_REDACT_TEXT_REMOVE,
+    )
+
+
+def _cache_key(pix: fitz.Pixmap, language: str) -> str:
+    digest = hashlib.sha256(pix.samples_mv)
+    digest.update(f"{_CACHE_VERSION}:{pix.width}x{pix.height}x{pix.n}".encode())
+    digest.update(f":{DPI}:{language}".encode())
+    return digest.hexdigest()
+
+
+def _cached(key: str) -> bytes | None:
+    if _cache is None:
+        return None
+    encoded = _cache.get(key)
+    if encoded is None:
+        return None
+    return base64.b64decode(encoded)
+
+
+def _recognize(pix: fitz.Pixmap, language: str) -> bytes:
+    """Tesseract's text layer for ``pix`` as a one-page PDF, without the image."""
     try:
-        tp = page.get_textpage_ocr(language=language)
-        return str(page.get_text(textpage=tp))
+        with stage("ocr"):
+            ocr_pdf = fitz.open(
+                stream=pix.pdfocr_tobytes(
+                    language=language, tessdata=fitz.get_tessdata()
+                ),
+                filetype="pdf",
+            )
     except RuntimeError as e:
         if "tesseract" in str(e).lower() or "not installed" in str(e).lower():
             raise RuntimeError("Tesseract OCR is not installed") from e
@@ -17,3 +232,10 @@ def ocr_page(page: fitz.Page, language: str = "eng") -> str:
         if "tesseract" in str(e).lower():
             raise RuntimeError("Tesseract OCR is not installed") from e
         raise
+    with ocr_pdf:
+        # Only the invisible text is needed; dropping the page image keeps
+        # cache entries to a few KiB.
+        page = ocr_pdf[0]
+        for xref, *_ in page.get_images():
+            page.delete_image(xref)
+        return bytes(ocr_pdf.tobytes(garbage=4, deflate=True))
@@ -0,0 +1,98 @@
+import re
+
+import fitz
+
+from pdf_service.core.stages import stage
+
+# Bytes searched at the end of a file for its trailer and startxref, and
+# after a cross-reference table for its trailer.
+_TRAILER_BYTES = 4096
+# Longest object read when following the catalog to the page tree.
+_OBJECT_BYTES = 64 * 1024
+# Cross-reference sections followed through /Prev, i.e. incremental updates.
+_XREF_SECTIONS = 32
+# Length of a cross-reference table entry: "oooooooooo ggggg n" and EOL.
+_XREF_ENTRY = 20
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+(\d+)\s+R")
+_PAGES = re.compile(rb"/Pages\s+(\d+)\s+(\d+)\s+R")
+_COUNT = re.compile(rb"/Count\s+(\d+)")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_XREF = re.compile(rb"xref\s+")
+_SUBSECTION = re.compile(rb"(\d+) (\d+)\s*?[\r\n]+")
+_OBJ = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+
+
+def open_pdf(pdf_data: bytes) -> fitz.Document:
+    """Open PDF bytes, raising ValueError for empty or unparseable input."""
+    if not pdf_data:
+        raise ValueError("Empty PDF data")
+
+    try:
+        with stage("fitz_open"):
+            return fitz.open(stream=pdf_data, filetype="pdf")
+    except Exception as exc:
+        raise ValueError("Invalid or corrupt PDF") from exc
+
+
+def peek_page_count(pdf_data: bytes) -> int | None:
+    """The page count recorded in the page tree, without opening the PDF.
+
+    Follows the last trailer to the catalog and its page tree root through
+    the cross-reference table, reading a few small slices of the bytes.
+    None where that fails: cross-reference streams and object streams
+    (compressed, PDF 1.5 and later) are not read, and damaged files are not
+    repaired. The count is not checked against the pages themselves.
+    """
+    tail = pdf_data[-_TRAILER_BYTES:]
+    startxref = _STARTXREF.findall(tail)
+    roots = _ROOT.findall(tail)
+    if not startxref or not roots:
+        return None
+    xref = int(startxref[-1])
+    catalog = _object(pdf_data, xref, *roots[-1])
+    pages = _PAGES.search(catalog) if catalog is not None else None
+    if pages is None:
+        return None
+    tree = _object(pdf_data, xref, pages[1], pages[2])
+    count = _COUNT.search(tree) if tree is not None else None
+    return int(count[1]) if count is not None else None
+
+
+def _object(
+    pdf_data: bytes, xref: int, number: bytes, generation: bytes
+) -> bytes | None:
+    """Object ``number`` up to ``endobj``, located through the table at ``xref``."""
+    offset = _object_offset(pdf_data, xref, int(number))
+    if offset is None:
+        return None
+    header = _OBJ.match(pdf_data, offset)
+    if header is None or header.group(1, 2) != (number, generation):
+        return None
+    stop = pdf_data.find(b"endobj", offset, offset + _OBJECT_BYTES)
+    return pdf_data[offset:stop] if stop >= 0 else None
+
+
+def _object_offset(pdf_data: bytes, xref: int, number: int) -> int | None:
+    """Offset of object ``number`` in the table at ``xref`` or an earlier one."""
+    for _ in range(_XREF_SECTIONS):
+        section = _XREF.match(pdf_data, xref)
+        if section is None:
+            return None
+        position = section.end()
+        while subsection := _SUBSECTION.match(pdf_data, position):
+            first, count = int(subsection[1]), int(subsection[2])
+            position = subsection.end()
+            if first <= number < first + count:
+                at = position + (number - first) * _XREF_ENTRY
+                entry = pdf_data[at : at + _XREF_ENTRY]
+                if entry[17:18] != b"n" or not entry[:10].isdigit():
+                    return None
+                return int(entry[:10])
+            position += count * _XREF_ENTRY
+        prev = _PREV.search(pdf_data, position, position + _TRAILER_BYTES)
+        if prev is None:
+            return None
+        xref = int(prev[1])
+    return None
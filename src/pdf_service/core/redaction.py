@@ -9,14 +9,19 @@ from typing import TYPE_CHECKING
 
 import fitz
 
+from pdf_service.core import cancellation
+from pdf_service.core.annotation import find_matches
 from pdf_service.core.branding import (
     BrandingStyle,
     draw_branding,
     generate_redaction_id,
 )
+from pdf_service.core.pdf import open_pdf
+from pdf_service.core.stages import stage, timed_page
 
 if TYPE_CHECKING:
     from pdf_service.core.types import (
+        AutoRedactResult,
         RedactionLogEntryResult,
         RedactionResult,
         RedactionStyleConfig,
@@ -37,14 +42,55 @@ def apply_redactions(
     if not xfdf:
         raise ValueError("Empty XFDF data")
 
-    try:
-        doc = fitz.open(stream=pdf_data, filetype="pdf")
-    except Exception as exc:
-        raise ValueError("Invalid or corrupt PDF") from exc
+    doc = open_pdf(pdf_data)
 
     branding_style = BrandingStyle.from_config(style_config)
 
     with doc:
+        rects = parse_xfdf(doc, xfdf)
+        return _redact(doc, rects, branding_style)
+
+
+def auto_redact(
+    pdf_data: bytes,
+    texts: list[str],
+    style_config: RedactionStyleConfig | None = None,
+) -> AutoRedactResult:
+    """Search for ``texts`` and redact every match in one pass.
+
+    The matches go straight to redaction, without the XFDF round trip of
+    ``get_suggestion_annotations`` followed by ``apply_redactions``.
+    """
+    if not pdf_data:
+        raise ValueError("Empty PDF data")
+
+    doc = open_pdf(pdf_data)
+
+    branding_style = BrandingStyle.from_config(style_config)
+
+    with doc:
+        page_count = len(doc)
+        matches, results = find_matches(doc, texts)
+        rects: dict[int, list[fitz.Rect]] = defaultdict(list)
+        for _, page_num, rect in matches:
+            rects[page_num].append(rect)
+        redacted = _redact(doc, rects, branding_style)
+
+    return {
+        **redacted,
+        "page_count": page_count,
+        "total_suggestions": len(matches),
+        "results": results,
+    }
+
+
+def parse_xfdf(doc: fitz.Document, xfdf: str) -> dict[int, list[fitz.Rect]]:
+    """Rectangles (PyMuPDF coordinates) of the XFDF annotations, per page.
+
+    Highlight, redact and square annotations are accepted; those with an
+    invalid page or rect are skipped.
+    """
+    with stage("xfdf_parse"):
         try:
             root = ET.fromstring(xfdf)
         except ET.ParseError as exc:
@@ -59,11 +105,8 @@ def apply_redactions(
             for tag in annot_types:
                 annotations.extend(root.findall(f".//{tag}"))
 
-        redaction_count = 0
         skipped = 0
-        # Store (rect, redaction_id) per page
-        redaction_rects: dict[int, list[tuple[fitz.Rect, str]]] = defaultdict(list)
-
+        rects: dict[int, list[fitz.Rect]] = defaultdict(list)
         for hl in annotations:
             page_num = int(hl.get("page", "0"))
             rect_str = hl.get("rect", "")
@@ -77,27 +120,50 @@ def apply_redactions(
                 continue
 
             x0, xfdf_y0, x1, xfdf_y1 = coords
-            page = doc[page_num]
-            page_height = page.rect.height
+            page_height = doc[page_num].rect.height
 
             # Reverse coordinate conversion: XFDF bottom-left → PyMuPDF top-left
             y0 = page_height - xfdf_y1
             y1 = page_height - xfdf_y0
+            rects[page_num].append(fitz.Rect(x0, y0, x1, y1))
+
+    if skipped > 0:
+        logger.warning("Skipped %d annotations with invalid page/rect", skipped)
+    return rects
 
-            rect = fitz.Rect(x0, y0, x1, y1)
-            page.add_redact_annot(rect, fill=(0, 0, 0))
-            rid = generate_redaction_id(page_num, rect.x0, rect.y0, rect.x1, rect.y1)
-            redaction_rects[page_num].append((rect, rid))
-            redaction_count += 1
 
-        if skipped > 0:
-            logger.warning("Skipped %d annotations with invalid page/rect", skipped)
+def _redact(
+    doc: fitz.Document,
+    rects: dict[int, list[fitz.Rect]],
+    branding_style: BrandingStyle | None,
+) -> RedactionResult:
+    """Redact ``rects`` in the open ``doc`` and serialize the result."""
+    redaction_count = 0
+    # Store (rect, redaction_id) per page
+    redaction_rects: dict[int, list[tuple[fitz.Rect, str]]] = defaultdict(list)
+
+    with stage("add_redact_annot"):
+        for page_num, page_rects in rects.items():
+            page = doc[page_num]
+            for rect in page_rects:
+                cancellation.check()
+                page.add_redact_annot(rect, fill=(0, 0, 0))
+                rid = generate_redaction_id(
+                    page_num, rect.x0, rect.y0, rect.x1, rect.y1
+                )
+                redaction_rects[page_num].append((rect, rid))
+                redaction_count += 1
 
+    with stage("apply_redactions"):
         for page in doc:
-            page.apply_redactions()
+            cancellation.check()
+            with timed_page(page.number):
+                page.apply_redactions()
 
-        # Re-add Redact annotations as structural markers and apply branding
+    # Re-add Redact annotations as structural markers and apply branding
+    with stage("draw_branding"):
         for page_num, rect_entries in redaction_rects.items():
+            cancellation.check()
             page = doc[page_num]
             for rect, rid in rect_entries:
                 if branding_style:
@@ -110,32 +176,35 @@ def apply_redactions(
                 else:
                     page.add_redact_annot(rect, fill=(0, 0, 0), cross_out=True)
 
-        # Build redaction audit log
-        redaction_log: list[RedactionLogEntryResult] = []
-        for page_num, rect_entries in redaction_rects.items():
-            for rect, rid in rect_entries:
-                redaction_log.append(
-                    {
-                        "redaction_id": rid,
-                        "page": page_num,
-                        "x0": rect.x0,
-                        "y0": rect.y0,
-                        "x1": rect.x1,
-                        "y1": rect.y1,
-                    }
-                )
-
-        pkg_version = version("pdf-core")
-        doc.set_metadata({"producer": f"PDF Core v{pkg_version} by redactr.io"})
-
+    # Build redaction audit log
+    redaction_log: list[RedactionLogEntryResult] = []
+    for page_num, rect_entries in redaction_rects.items():
+        for rect, rid in rect_entries:
+            redaction_log.append(
+                {
+                    "redaction_id": rid,
+                    "page": page_num,
+                    "x0": rect.x0,
+                    "y0": rect.y0,
+                    "x1": rect.x1,
+                    "y1": rect.y1,
+                }
+            )
+
+    pkg_version = version("pdf-core")
+    doc.set_metadata({"producer": f"PDF Core v{pkg_version} by redactr.io"})
+
+    # Last chance to stop: serialisation cannot be interrupted.
+    cancellation.check()
+    with stage("tobytes"):
         output_bytes = doc.tobytes(garbage=4, deflate=True)
-        content_hash = hashlib.sha256(output_bytes).digest()
+    content_hash = hashlib.sha256(output_bytes).digest()
 
-        logger.info("Applied %d redactions across %d pages", redaction_count, len(doc))
+    logger.info("Applied %d redactions across %d pages", redaction_count, len(doc))
 
-        return {
-            "pdf_data": output_bytes,
-            "redactions_applied": redaction_count,
-            "content_hash": content_hash,
-            "redaction_log": redaction_log,
-        }
+    return {
+        "pdf_data": output_bytes,
+        "redactions_applied": redaction_count,
+        "content_hash": content_hash,
+        "redaction_log": redaction_log,
+    }
@@ -0,0 +1,98 @@
+"""Timing of core processing stages (open, parse, search, OCR, ...).
+
+Core modules wrap each stage in ``stage(name)``. Durations go to the
+registered observers (the metrics subsystem), or to a ``collect()`` list
+when the work runs in a worker process and the samples must be shipped
+back to the server process. Per-page work is wrapped in ``timed_page(number)``,
+which is timed only inside ``collect_pages()`` (per-request profiles).
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+StageSample = tuple[str, float]
+
+_observers: list[Callable[[str, float], None]] = []
+_collector: ContextVar[list[StageSample] | None] = ContextVar(
+    "stage_collector", default=None
+)
+_page_collector: ContextVar[list[tuple[int, float]] | None] = ContextVar(
+    "page_collector", default=None
+)
+
+
+def add_observer(observer: Callable[[str, float], None]) -> None:
+    """Call ``observer(stage, seconds)`` for every completed stage."""
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def remove_observer(observer: Callable[[str, float], None]) -> None:
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+def record(name: str, seconds: float) -> None:
+    samples = _collector.get()
+    if samples is not None:
+        samples.append((name, seconds))
+        return
+    for observer in _observers:
+        observer(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect() -> Iterator[list[StageSample]]:
+    """Collect samples recorded in this context instead of reporting them."""
+    samples: list[StageSample] = []
+    token = _collector.set(samples)
+    try:
+        yield samples
+    finally:
+        _collector.reset(token)
+
+
+def replay(samples: Iterable[StageSample]) -> None:
+    """Report samples collected elsewhere, e.g. in a worker process."""
+    for name, seconds in samples:
+        record(name, seconds)
+
+
+@contextmanager
+def timed_page(number: int) -> Iterator[None]:
+    pages = _page_collector.get()
+    if pages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        pages.append((number, time.perf_counter() - start))
+
+
+@contextmanager
+def collect_pages() -> Iterator[list[tuple[int, float]]]:
+    """Collect ``(page number, seconds)`` for pages processed in this context."""
+    pages: list[tuple[int, float]] = []
+    token = _page_collector.set(pages)
+    try:
+        yield pages
+    finally:
+        _page_collector.reset(token)
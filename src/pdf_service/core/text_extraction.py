@@ -1,82 +1,386 @@
 import logging
+from collections import deque
 from collections.abc import Generator
+from itertools import accumulate
 from typing import Any
 
 import fitz
+from fitz import mupdf
 
-from pdf_service.core.ocr import ocr_page
-from pdf_service.core.types import PageTextResult, TextBlockResult
+from pdf_service.core import cancellation, coverage, ocr
+from pdf_service.core.pdf import open_pdf
+from pdf_service.core.stages import stage, timed_page
+from pdf_service.core.types import (
+    PackedTextBlocksResult,
+    PageTextResult,
+    TextBlockResult,
+)
 
 logger = logging.getLogger(__name__)
 
+# TEXTFLAGS_TEXT, but glyphs without Unicode extract as U+FFFD rather than
+# as their CID. Without such glyphs the text is the same.
+_UNMAPPED_AS_FFFD = fitz.TEXTFLAGS_TEXT & ~(
+    fitz.TEXT_USE_CID_FOR_UNKNOWN_UNICODE | fitz.TEXT_USE_GID_FOR_UNKNOWN_UNICODE
+)
+
+
+def _page_numbers(doc: fitz.Document, pages: list[int] | None) -> list[int]:
+    if not pages:
+        return list(range(len(doc)))
+
+    invalid = [p for p in pages if p < 0 or p >= len(doc)]
+    if invalid:
+        raise ValueError(
+            f"Page numbers out of range: {invalid} (document has {len(doc)} pages)"
+        )
+    return pages
+
+
+def select_pages(
+    pdf_data: bytes, pages: list[int] | None, start: int = 0, stop: int | None = None
+) -> list[int]:
+    """Validate requested pages and return the page numbers to extract."""
+    with open_pdf(pdf_data) as doc:
+        return select_document_pages(doc, pages, start, stop)
+
+
+def select_document_pages(
+    doc: fitz.Document,
+    pages: list[int] | None,
+    start: int = 0,
+    stop: int | None = None,
+) -> list[int]:
+    """Page numbers for a page list or for pages ``start`` to ``stop``.
+
+    ``stop`` is exclusive; None means the last page. A page list and a range
+    cannot be combined.
+    """
+    if pages:
+        if start or stop is not None:
+            raise ValueError("Pages and a page range cannot both be given")
+        return _page_numbers(doc, pages)
+    if start == 0 and stop is None:
+        return list(range(len(doc)))
+    stop = len(doc) if stop is None else stop
+    if not 0 <= start < stop <= len(doc):
+        raise ValueError(
+            f"Page range out of range: {start}-{stop} (document has {len(doc)} pages)"
+        )
+    return list(range(start, stop))
+
 
 def extract_text(
     pdf_data: bytes,
     pages: list[int] | None,
     include_positions: bool,
     ocr_options: dict[str, Any] | None,
+    packed_positions: bool = False,
+) -> Generator[PageTextResult]:
+    with open_pdf(pdf_data) as doc:
+        yield from extract_document_text(
+            doc, pages, include_positions, ocr_options, packed_positions
+        )
+
+
+def extract_all_text(
+    pdf_data: bytes,
+    pages: list[int] | None,
+    include_positions: bool,
+    ocr_options: dict[str, Any] | None,
+    packed_positions: bool = False,
+) -> list[PageTextResult]:
+    """Extract all requested pages in one call instead of streaming them."""
+    return list(
+        extract_text(pdf_data, pages, include_positions, ocr_options, packed_positions)
+    )
+
+
+def extract_document_text(
+    doc: fitz.Document,
+    pages: list[int] | None,
+    include_positions: bool,
+    ocr_options: dict[str, Any] | None,
+    packed_positions: bool = False,
 ) -> Generator[PageTextResult]:
-    if not pdf_data:
-        raise ValueError("Empty PDF data")
+    """Extract text page-by-page from an already-open document.
 
+    With ``packed_positions``, positions are returned as ``packed_blocks``
+    instead of ``blocks`` and the text is built from the same lines. Pages
+    to OCR are submitted up to ``ocr.pages_in_flight()`` pages ahead, so
+    later pages are rendered while earlier ones are recognized.
+    """
+    # Pages read but not yet extracted, in page order.
+    window: deque[tuple[int, fitz.TextPage | ocr.PendingOcr]] = deque()
     try:
-        doc = fitz.open(stream=pdf_data, filetype="pdf")
-    except Exception as exc:
-        raise ValueError("Invalid or corrupt PDF") from exc
-
-    with doc:
-        page_numbers = pages if pages else list(range(len(doc)))
-
-        if pages:
-            invalid = [p for p in page_numbers if p < 0 or p >= len(doc)]
-            if invalid:
-                raise ValueError(
-                    f"Page numbers out of range: {invalid} "
-                    f"(document has {len(doc)} pages)"
+        for page_num in _page_numbers(doc, pages):
+            cancellation.check()
+            with timed_page(page_num):
+                window.append((page_num, _read_page(doc[page_num], ocr_options)))
+            if len(window) >= ocr.pages_in_flight():
+                yield _page_result(
+                    *window.popleft(), include_positions, packed_positions
                 )
+        while window:
+            yield _page_result(*window.popleft(), include_positions, packed_positions)
+    finally:
+        # The stream failed or was abandoned: stop OCR still queued.
+        for _, textpage in window:
+            if isinstance(textpage, ocr.PendingOcr):
+                textpage.cancel()
+
 
-        for page_num in page_numbers:
-            page = doc[page_num]
-            page_text = page.get_text()
-            blocks: list[TextBlockResult] = []
+def extract_all_text_deferring_ocr(
+    pdf_data: bytes,
+    pages: list[int] | None,
+    include_positions: bool,
+    ocr_options: dict[str, Any] | None,
+    packed_positions: bool = False,
+) -> list[PageTextResult | int]:
+    """``extract_all_text``, leaving out the OCR: pages OCR pays off for are
+    returned as their page numbers, to be extracted on their own elsewhere.
+    """
+    results: list[PageTextResult | int] = []
+    with open_pdf(pdf_data) as doc:
+        for page_num in _page_numbers(doc, pages):
+            cancellation.check()
+            with timed_page(page_num):
+                page = doc[page_num]
+                use_ocr, textpage = _ocr_decision(page, ocr_options)
+                if use_ocr:
+                    results.append(page_num)
+                    continue
+                results.append(
+                    _textpage_result(
+                        textpage or _textpage(page),
+                        page_num,
+                        include_positions,
+                        packed_positions,
+                    )
+                )
+    return results
 
-            use_ocr = (
-                ocr_options
-                and ocr_options.get("enabled")
-                and (not page_text.strip() or ocr_options.get("force"))
+
+def ocr_document_page(
+    doc: fitz.Document,
+    page_num: int,
+    include_positions: bool,
+    ocr_options: dict[str, Any] | None,
+    packed_positions: bool = False,
+) -> PageTextResult:
+    """Extract a page with OCR, without measuring whether OCR pays off.
+
+    For pages ``extract_all_text_deferring_ocr`` already left to OCR.
+    """
+    cancellation.check()
+    language = (ocr_options or {}).get("language", "eng")
+    with timed_page(page_num):
+        page = doc[page_num]
+        logger.info("Running OCR on page %d (language=%s)", page_num, language)
+        textpage = ocr.submit_page(page, language=language).result()
+        return _textpage_result(textpage, page_num, include_positions, packed_positions)
+
+
+def _read_page(
+    page: fitz.Page, ocr_options: dict[str, Any] | None
+) -> fitz.TextPage | ocr.PendingOcr:
+    """The TextPage of ``page``, or the OCR of it under way."""
+    use_ocr, textpage = _ocr_decision(page, ocr_options)
+    # Text and positions come from one TextPage, so the page is parsed once
+    # and positions of OCRed pages are those of the OCR text.
+    if use_ocr and ocr_options:
+        cancellation.check()
+        language = ocr_options.get("language", "eng")
+        logger.info("Running OCR on page %d (language=%s)", page.number, language)
+        return ocr.submit_page(page, language=language)
+    return textpage or _textpage(page)
+
+
+def _textpage(page: fitz.Page) -> fitz.TextPage:
+    with stage("get_textpage"):
+        return page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+
+
+def _ocr_decision(
+    page: fitz.Page, ocr_options: dict[str, Any] | None
+) -> tuple[bool, fitz.TextPage | None]:
+    """Whether to OCR ``page``, and its TextPage if deciding needed one."""
+    if not ocr_options or not ocr_options.get("enabled"):
+        return False, None
+    # OCR is the most expensive stage: skip pages where it finds nothing
+    # new, e.g. a logo on a blank page or a stamp on a text page. Only
+    # forced OCR needs the page measured past its first glyph.
+    force = bool(ocr_options.get("force"))
+    with stage("coverage"):
+        page_coverage = coverage.measure(page, full=force)
+    if coverage.ocr_pays_off(page_coverage, force=force):
+        return True, None
+    if not (force and page_coverage.has_text):
+        return False, None
+    # Forced OCR still reads text that does not extract.
+    with stage("get_textpage"):
+        textpage = page.get_textpage(flags=_UNMAPPED_AS_FFFD)
+    with stage("get_text"):
+        illegible = chr(0xFFFD) in textpage.extractText()
+    use_ocr = coverage.ocr_pays_off(page_coverage, force=True, illegible_text=illegible)
+    return use_ocr, textpage
+
+
+def _page_result(
+    page_num: int,
+    textpage: fitz.TextPage | ocr.PendingOcr,
+    include_positions: bool,
+    packed_positions: bool = False,
+) -> PageTextResult:
+    with timed_page(page_num):
+        if isinstance(textpage, ocr.PendingOcr):
+            textpage = textpage.result()
+        return _textpage_result(textpage, page_num, include_positions, packed_positions)
+
+
+def _textpage_result(
+    textpage: fitz.TextPage,
+    page_num: int,
+    include_positions: bool,
+    packed_positions: bool,
+) -> PageTextResult:
+    if include_positions and packed_positions:
+        page_text, packed = _packed_lines(textpage)
+        return {
+            "page_number": page_num,
+            "text": page_text,
+            "blocks": [],
+            "packed_blocks": packed,
+        }
+
+    with stage("get_text"):
+        page_text = textpage.extractText()
+    blocks: list[TextBlockResult] = []
+    if include_positions:
+        with stage("get_text_dict"):
+            text_dict = textpage.extractDICT()
+        blocks = _line_blocks(text_dict)
+
+    return {
+        "page_number": page_num,
+        "text": page_text,
+        "blocks": blocks,
+        "packed_blocks": None,
+    }
+
+
+def _line_blocks(text_dict: dict[str, Any]) -> list[TextBlockResult]:
+    blocks: list[TextBlockResult] = []
+    block_num = 0
+    for block in text_dict.get("blocks", []):
+        if block.get("type") != 0:  # skip image blocks
+            continue
+        for line_num, line in enumerate(block.get("lines", [])):
+            line_text = ""
+            for span in line.get("spans", []):
+                line_text += span.get("text", "")
+            bbox = line.get("bbox", (0, 0, 0, 0))
+            blocks.append(
+                {
+                    "text": line_text,
+                    "x0": bbox[0],
+                    "y0": bbox[1],
+                    "x1": bbox[2],
+                    "y1": bbox[3],
+                    "block_number": block_num,
+                    "line_number": line_num,
+                }
             )
+        block_num += 1
+    return blocks
+
+
+def _packed_lines(textpage: fitz.TextPage) -> tuple[str, PackedTextBlocksResult]:
+    """Page text and line positions in columns, without a dict per line.
+
+    The text is ``extractText()``, which ends every line with a newline,
+    so the line offsets are where the newlines are. The bboxes come from
+    a walk over MuPDF's lines, which skips building the spans and chars
+    of ``extractDICT()``. If the newlines do not match the lines (a line
+    with a newline character in it, or with no characters on the page),
+    the positions are taken from ``extractDICT()`` instead.
+    """
+    with stage("get_text"):
+        page_text = textpage.extractText()
+    with stage("line_bboxes"):
+        bboxes, counts = _line_bboxes(textpage)
+    data = page_text.encode()
+    lines = data.split(b"\n")
+    if lines[-1] or len(lines) - 1 != len(bboxes) // 4:
+        with stage("get_text_dict"):
+            text_dict = textpage.extractDICT()
+        return _dict_packed_lines(text_dict)
+    offsets = list(accumulate((len(line) + 1 for line in lines[:-1]), initial=0))
+    return page_text, {
+        "line_offsets": offsets,
+        "bboxes": bboxes,
+        "block_line_counts": counts,
+    }
+
+
+def _line_bboxes(textpage: fitz.TextPage) -> tuple[list[float], list[int]]:
+    """Bbox of each line and number of lines in each text block.
+
+    Blocks and lines off the page are skipped, like ``extractDICT()`` does.
+    Lines are followed through their ``next`` pointers: wrapping each one
+    in an ``FzStextLine`` costs three times as much as reading its box.
+    """
+    page = textpage.this.m_internal.mediabox
+    left, top, right, bottom = page.x0, page.y0, page.x1, page.y1
+    bboxes: list[float] = []
+    counts: list[int] = []
+    for block in textpage.this:
+        r = block.m_internal.bbox
+        if block.m_internal.type != mupdf.FZ_STEXT_BLOCK_TEXT or not (
+            r.x0 < right and left < r.x1 and r.y0 < bottom and top < r.y1
+        ):
+            continue
+        count = 0
+        first = next(iter(block), None)
+        line = first.m_internal if first is not None else None
+        while line is not None:
+            r = line.bbox
+            x0, y0, x1, y1 = r.x0, r.y0, r.x1, r.y1
+            if (
+                line.first_char
+                and x0 < right
+                and left < x1
+                and y0 < bottom
+                and top < y1
+            ):
+                bboxes += (x0, y0, x1, y1)
+                count += 1
+            line = line.next
+        counts.append(count)
+    return bboxes, counts
+
 
-            if use_ocr and ocr_options:
-                language = ocr_options.get("language", "eng")
-                logger.info("Running OCR on page %d (language=%s)", page_num, language)
-                page_text = ocr_page(page, language=language)
-
-            if include_positions:
-                text_dict = page.get_text("dict")
-                block_num = 0
-                for block in text_dict.get("blocks", []):
-                    if block.get("type") != 0:  # skip image blocks
-                        continue
-                    for line_num, line in enumerate(block.get("lines", [])):
-                        line_text = ""
-                        for span in line.get("spans", []):
-                            line_text += span.get("text", "")
-                        bbox = line.get("bbox", (0, 0, 0, 0))
-                        blocks.append(
-                            {
-                                "text": line_text,
-                                "x0": bbox[0],
-                                "y0": bbox[1],
-                                "x1": bbox[2],
-                                "y1": bbox[3],
-                                "block_number": block_num,
-                                "line_number": line_num,
-                            }
-                        )
-                    block_num += 1
-
-            yield {
-                "page_number": page_num,
-                "text": page_text,
-                "blocks": blocks,
-            }
+def _dict_packed_lines(
+    text_dict: dict[str, Any],
+) -> tuple[str, PackedTextBlocksResult]:
+    lines: list[str] = []
+    offsets = [0]
+    bboxes: list[float] = []
+    counts: list[int] = []
+    end = 0
+    for block in text_dict.get("blocks", []):
+        if block.get("type") != 0:  # skip image blocks
+            continue
+        block_lines = block.get("lines", [])
+        for line in block_lines:
+            text = "".join([span["text"] for span in line["spans"]]) + "\n"
+            lines.append(text)
+            end += len(text.encode())
+            offsets.append(end)
+            bboxes.extend(line["bbox"])
+        counts.append(len(block_lines))
+    return "".join(lines), {
+        "line_offsets": offsets,
+        "bboxes": bboxes,
+        "block_line_counts": counts,
+    }
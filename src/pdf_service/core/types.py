@@ -28,6 +28,16 @@ class DocumentInfoResult(TypedDict):
     pages: list[PageInfoResult]
 
 
+class TriageResult(TypedDict):
+    page_count: int
+    file_size_bytes: int
+    is_encrypted: bool
+    metadata: DocumentMetadataResult
+    sampled_pages: list[PageInfoResult]
+    estimated_scanned_ratio: float
+    confidence: float
+
+
 class TextBlockResult(TypedDict):
     text: str
     x0: float
@@ -38,10 +48,22 @@ class TextBlockResult(TypedDict):
     line_number: int
 
 
+class PackedTextBlocksResult(TypedDict):
+    # UTF-8 byte offset in the page text where each line starts, plus the
+    # end of the text; every line ends with a newline.
+    line_offsets: list[int]
+    # x0, y0, x1, y1 of each line.
+    bboxes: list[float]
+    # Number of lines in each text block.
+    block_line_counts: list[int]
+
+
 class PageTextResult(TypedDict):
     page_number: int
     text: str
     blocks: list[TextBlockResult]
+    # Positions in columnar form instead of ``blocks``, if requested.
+    packed_blocks: PackedTextBlocksResult | None
 
 
 class SuggestionResultItem(TypedDict):
@@ -78,3 +100,9 @@ class RedactionResult(TypedDict):
     redactions_applied: int
     content_hash: bytes
     redaction_log: list[RedactionLogEntryResult]
+
+
+class AutoRedactResult(RedactionResult):
+    page_count: int
+    total_suggestions: int
+    results: list[SuggestionResultItem]
@@ -0,0 +1,851 @@
+"""Execution engines that run core PDF processing calls for the servicer."""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Any, NamedTuple, ParamSpec, TypeVar
+
+from pdf_service.cache import ResultCache
+from pdf_service.core import cancellation, document_info, ocr, stages, text_extraction
+from pdf_service.core.pdf import open_pdf, peek_page_count
+from pdf_service.sessions import DocumentSession
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterator
+
+    import fitz
+
+    from pdf_service.config import ServiceConfig
+    from pdf_service.core.types import DocumentInfoResult, PageTextResult
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# Shared cancellation flags per process pool, i.e. calls that can be
+# cancelled in flight at once; further calls only honour their deadline.
+CANCELLATION_SLOTS = 1024
+
+# Fewest pages per worker when document analysis is split across workers;
+# shorter documents are analyzed by a single worker.
+ANALYSIS_PAGES = 250
+
+# Environment variable capping the threads Tesseract (OpenMP) starts per call.
+OCR_THREAD_LIMIT_ENV = "OMP_THREAD_LIMIT"
+
+
+class WorkerCrashedError(RuntimeError):
+    """A worker process died (e.g. MuPDF segfault) while handling a call."""
+
+
+class ExecutionEngine(ABC):
+    """Runs CPU-bound core calls on behalf of the gRPC servicer."""
+
+    @abstractmethod
+    def submit(
+        self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> futures.Future[T]: ...
+
+    def run(self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs) -> T:
+        return self.submit(fn, *args, **kwargs).result()
+
+    @abstractmethod
+    def extract_text(
+        self,
+        pdf_data: bytes,
+        pages: list[int] | None,
+        include_positions: bool,
+        ocr_options: dict[str, Any] | None,
+        packed_positions: bool = False,
+    ) -> Generator[PageTextResult]: ...
+
+    def run_document(
+        self,
+        source: bytes | DocumentSession,
+        bytes_fn: Callable[[bytes], T],
+        session_fn: Callable[[DocumentSession], T],
+    ) -> T:
+        """Run a call against PDF bytes or an open document session.
+
+        Engines that cannot share the session's open document send its
+        bytes instead.
+        """
+        if isinstance(source, DocumentSession):
+            return self.run(bytes_fn, source.pdf_data)
+        return self.run(bytes_fn, source)
+
+    def analyze_document(self, source: bytes | DocumentSession) -> DocumentInfoResult:
+        """GetDocumentInfo analysis of PDF bytes or an open document session."""
+        return self.run_document(
+            source, document_info.get_document_info, _analyze_session
+        )
+
+    def stream_document_info(
+        self,
+        source: bytes | DocumentSession,
+        start: int,
+        stop: int | None,
+        batch_pages: int,
+    ) -> Generator[DocumentInfoResult]:
+        """Streamed analysis: document-level fields, then batches of pages.
+
+        See ``document_info.stream_document_analysis``; each batch is its own
+        call.
+        """
+        pdf_data = source.pdf_data if isinstance(source, DocumentSession) else source
+        header, pages = self.run(document_info.stream_header, pdf_data, start, stop)
+        yield header
+        for first in pages[::batch_pages]:
+            yield self.run(
+                document_info.get_page_batch,
+                pdf_data,
+                first,
+                min(first + batch_pages, pages.stop),
+            )
+
+    def extract_document(
+        self,
+        source: bytes | DocumentSession,
+        pages: list[int] | None,
+        include_positions: bool,
+        ocr_options: dict[str, Any] | None,
+        packed_positions: bool = False,
+    ) -> Generator[PageTextResult]:
+        pdf_data = source.pdf_data if isinstance(source, DocumentSession) else source
+        return self.extract_text(
+            pdf_data, pages, include_positions, ocr_options, packed_positions
+        )
+
+    def worker_pids(self) -> list[int]:
+        """Process IDs of worker processes, if the engine has any."""
+        return []
+
+    def ocr_queue_depth(self) -> int:
+        """Pages waiting for an OCR worker."""
+        return 0
+
+    def shutdown(self) -> None:
+        return None
+
+
+class InlineEngine(ExecutionEngine):
+    """Runs calls directly on the calling (gRPC worker) thread.
+
+    OCR runs on ``ocr_pool`` if given (see ``build_engine``), which is shut
+    down with the engine.
+    """
+
+    def __init__(self, ocr_pool: OcrPool | None = None) -> None:
+        self._ocr_pool = ocr_pool
+
+    def submit(
+        self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> futures.Future[T]:
+        future: futures.Future[T] = futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+    def run(self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs) -> T:
+        return fn(*args, **kwargs)
+
+    def extract_text(
+        self,
+        pdf_data: bytes,
+        pages: list[int] | None,
+        include_positions: bool,
+        ocr_options: dict[str, Any] | None,
+        packed_positions: bool = False,
+    ) -> Generator[PageTextResult]:
+        return text_extraction.extract_text(
+            pdf_data, pages, include_positions, ocr_options, packed_positions
+        )
+
+    def run_document(
+        self,
+        source: bytes | DocumentSession,
+        bytes_fn: Callable[[bytes], T],
+        session_fn: Callable[[DocumentSession], T],
+    ) -> T:
+        if isinstance(source, DocumentSession):
+            with source.lock:
+                return session_fn(source)
+        return bytes_fn(source)
+
+    def stream_document_info(
+        self,
+        source: bytes | DocumentSession,
+        start: int,
+        stop: int | None,
+        batch_pages: int,
+    ) -> Generator[DocumentInfoResult]:
+        if not isinstance(source, DocumentSession):
+            return document_info.stream_document_info(source, start, stop, batch_pages)
+        return _locked_steps(
+            source.lock,
+            document_info.stream_document_analysis(
+                source.doc, source.size, start, stop, batch_pages
+            ),
+        )
+
+    def extract_document(
+        self,
+        source: bytes | DocumentSession,
+        pages: list[int] | None,
+        include_positions: bool,
+        ocr_options: dict[str, Any] | None,
+        packed_positions: bool = False,
+    ) -> Generator[PageTextResult]:
+        if not isinstance(source, DocumentSession):
+            return self.extract_text(
+                source, pages, include_positions, ocr_options, packed_positions
+            )
+        return _locked_steps(
+            source.lock,
+            text_extraction.extract_document_text(
+                source.doc, pages, include_positions, ocr_options, packed_positions
+            ),
+        )
+
+    def worker_pids(self) -> list[int]:
+        return self._ocr_pool.worker_pids() if self._ocr_pool is not None else []
+
+    def ocr_queue_depth(self) -> int:
+        return self._ocr_pool.queue_depth if self._ocr_pool is not None else 0
+
+    def shutdown(self) -> None:
+        if self._ocr_pool is not None:
+            self._ocr_pool.shutdown()
+
+
+class ProcessPoolEngine(ExecutionEngine):
+    """Runs calls in a pool of spawned worker processes.
+
+    Each worker has its own interpreter and MuPDF context, so CPU-bound work
+    scales across cores. If a worker dies, the pool is replaced and the
+    affected calls fail with WorkerCrashedError instead of taking down the
+    server. Document analysis of long documents is split into page ranges
+    of at least ``analysis_pages`` pages, one per worker. ExtractText runs up
+    to ``extract_window`` batches of ``batch_pages`` pages at once (default:
+    one per worker) and streams them in page order. Each worker has its own
+    OCR cache memory tier; ``ocr_cache_dir`` is shared by all of them. With
+    an ``ocr_pool``, workers leave pages to OCR out of their batches and each
+    such page is extracted in the OCR pool instead, at most
+    ``ocr_pages_per_request`` of them per stream at once; the engine's
+    workers never wait for Tesseract. The OCR pool is shut down with the
+    engine.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        batch_pages: int = 8,
+        max_tasks_per_child: int | None = None,
+        analysis_pages: int = ANALYSIS_PAGES,
+        extract_window: int | None = None,
+        ocr_cache_bytes: int = 0,
+        ocr_cache_dir: str = "",
+        ocr_cache_disk_bytes: int = 0,
+        ocr_pool: OcrPool | None = None,
+        ocr_pages_per_request: int = 1,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if batch_pages < 1:
+            raise ValueError("batch_pages must be at least 1")
+        if analysis_pages < 1:
+            raise ValueError("analysis_pages must be at least 1")
+        if extract_window is not None and extract_window < 1:
+            raise ValueError("extract_window must be at least 1")
+        if ocr_pages_per_request < 1:
+            raise ValueError("ocr_pages_per_request must be at least 1")
+        self._max_workers = max_workers
+        self._batch_pages = batch_pages
+        self._analysis_pages = analysis_pages
+        self._extract_window = extract_window or max_workers
+        self._ocr_cache = (ocr_cache_bytes, ocr_cache_dir, ocr_cache_disk_bytes)
+        self._max_tasks_per_child = max_tasks_per_child
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+        self._flags = _CancellationFlags(self._context)
+        self._ocr_pool = ocr_pool
+        self._ocr_pages_per_request = ocr_pages_per_request
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> futures.ProcessPoolExecutor:
+        return futures.ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(self._flags.array, *self._ocr_cache),
+            max_tasks_per_child=self._max_tasks_per_child,
+        )
+
+    def _replace_pool(self, broken: futures.ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is not broken:
+                return
+            logger.error("Worker process crashed, restarting process pool")
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(
+        self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> futures.Future[T]:
+        token = cancellation.current()
+        if token is not None:
+            token.check()
+        slot = self._flags.allocate() if token is not None else None
+        worker_token = (
+            cancellation.SharedFlagToken(slot, token.deadline)
+            if token is not None
+            else None
+        )
+
+        # Guards the slot against a late cancellation once it is reused.
+        slot_lock = threading.Lock()
+        released = False
+
+        def set_flag() -> None:
+            with slot_lock:
+                if slot is not None and not released:
+                    self._flags.set(slot)
+
+        def release() -> None:
+            nonlocal released
+            if token is None:
+                return
+            token.remove_callback(set_flag)
+            with slot_lock:
+                released = True
+            self._flags.release(slot)
+
+        pool = self._pool
+        try:
+            inner = pool.submit(_call_in_worker, worker_token, fn, *args, **kwargs)
+        except BrokenProcessPool as exc:
+            release()
+            self._replace_pool(pool)
+            raise WorkerCrashedError("Worker process crashed") from exc
+        if token is not None:
+            token.add_callback(set_flag)
+
+        outer: futures.Future[T] = futures.Future()
+
+        def relay(done: futures.Future[tuple[T, list[stages.StageSample]]]) -> None:
+            release()
+            if done.cancelled():
+                outer.cancel()
+                return
+            exc = done.exception()
+            if isinstance(exc, BrokenProcessPool):
+                self._replace_pool(pool)
+                crashed = WorkerCrashedError("Worker process crashed")
+                crashed.__cause__ = exc
+                outer.set_exception(crashed)
+            elif exc is not None:
+                outer.set_exception(exc)
+            else:
+                result, samples = done.result()
+                stages.replay(samples)
+                outer.set_result(result)
+
+        def propagate_cancel(done: futures.Future[T]) -> None:
+            if done.cancelled():
+                inner.cancel()
+
+        outer.add_done_callback(propagate_cancel)
+        inner.add_done_callback(relay)
+        return outer
+
+    def analyze_document(self, source: bytes | DocumentSession) -> DocumentInfoResult:
+        """Analysis split into page ranges, from PDF bytes shared once.
+
+        The ranges are sized from the page count of the session, or else the
+        one in the PDF's page tree, and all submitted at once. Without such
+        a count, the first range's result gives it and the remaining ranges
+        follow; the same if the page tree's count was too low.
+        """
+        if isinstance(source, DocumentSession):
+            pdf_data, expected = source.pdf_data, len(source.doc)
+        else:
+            pdf_data, expected = source, peek_page_count(source) or 0
+        size = self._range_pages(expected)
+        starts = range(0, max(expected, 1), size)
+        with _shared_pdf(pdf_data) as pdf:
+            parts = [
+                self.submit(_analyze_shared_range, pdf, start, start + size)
+                for start in starts
+            ]
+            try:
+                first = parts[0].result()
+                page_count = first["page_count"]
+                covered = starts[-1] + size
+                if covered < page_count:
+                    size = self._range_pages(page_count - covered)
+                    parts += [
+                        self.submit(_analyze_shared_range, pdf, start, start + size)
+                        for start in range(covered, page_count, size)
+                    ]
+                return document_info.merge(
+                    [first, *(part.result() for part in parts[1:])]
+                )
+            finally:
+                # Stop the remaining ranges if one of them failed.
+                for part in parts:
+                    part.cancel()
+
+    def _range_pages(self, page_count: int) -> int:
+        return max(self._analysis_pages, -(-page_count // self._max_workers))
+
+    def stream_document_info(
+        self,
+        source: bytes | DocumentSession,
+        start: int,
+        stop: int | None,
+        batch_pages: int,
+    ) -> Generator[DocumentInfoResult]:
+        """Streamed analysis, one call per batch, from PDF bytes shared once.
+
+        The PDF is put in shared memory for the duration of the stream. A
+        worker opens it from there once and keeps it open for the stream's
+        next batches, so batches are not sent the PDF and do not reopen it.
+        """
+        pdf_data = source.pdf_data if isinstance(source, DocumentSession) else source
+        with _shared_pdf(pdf_data) as pdf:
+            header, pages = self.run(_stream_header, pdf, start, stop)
+            yield header
+            for first in pages[::batch_pages]:
+                yield self.run(
+                    _stream_page_batch,
+                    pdf,
+                    first,
+                    min(first + batch_pages, pages.stop),
+                )
+
+    def extract_text(
+        self,
+        pdf_data: bytes,
+        pages: list[int] | None,
+        include_positions: bool,
+        ocr_options: dict[str, Any] | None,
+        packed_positions: bool = False,
+    ) -> Generator[PageTextResult]:
+        args = (include_positions, ocr_options, packed_positions)
+        if self._ocr_pool is None or not (ocr_options and ocr_options.get("enabled")):
+            return self._batch_results(
+                text_extraction.extract_all_text, pdf_data, pages, *args
+            )
+        items = self._batch_results(
+            text_extraction.extract_all_text_deferring_ocr, pdf_data, pages, *args
+        )
+        return self._with_ocr_pages(self._ocr_pool, items, pdf_data, *args)
+
+    def _batch_results(
+        self,
+        extract: Callable[..., list[T]],
+        pdf_data: bytes,
+        pages: list[int] | None,
+        *args: Any,
+    ) -> Generator[T]:
+        """``extract(pdf_data, batch, *args)`` over batches of pages, in order."""
+        page_numbers = self.run(text_extraction.select_pages, pdf_data, pages)
+        batches = (
+            page_numbers[start : start + self._batch_pages]
+            for start in range(0, len(page_numbers), self._batch_pages)
+        )
+        # Batches run in parallel but complete in any order; the window of
+        # submitted batches doubles as the reorder buffer, so a finished batch
+        # waits there until the batches before it have been streamed.
+        window: deque[futures.Future[list[T]]] = deque()
+        try:
+            for batch in batches:
+                window.append(self.submit(extract, pdf_data, batch, *args))
+                if len(window) == self._extract_window:
+                    yield from window.popleft().result()
+            while window:
+                yield from window.popleft().result()
+        finally:
+            # The stream failed or was abandoned: stop batches still queued.
+            for pending in window:
+                pending.cancel()
+
+    def _with_ocr_pages(
+        self,
+        ocr_pool: OcrPool,
+        items: Generator[PageTextResult | int],
+        pdf_data: bytes,
+        *args: Any,
+    ) -> Generator[PageTextResult]:
+        """``items`` with the pages left to OCR (numbers) extracted by ``ocr_pool``.
+
+        Up to ``ocr_pages_per_request`` of them are in the pool at once, and
+        up to a window of batches of pages is read ahead of the page streamed.
+        The PDF goes to the pool once, in shared memory, with the first page.
+        """
+        ahead_limit = self._extract_window * self._batch_pages
+        ahead: deque[PageTextResult | futures.Future[PageTextResult]] = deque()
+        in_flight = 0
+        shared = contextlib.ExitStack()
+        pdf: _SharedPdf | None = None
+
+        def next_page() -> PageTextResult:
+            nonlocal in_flight
+            head = ahead.popleft()
+            if not isinstance(head, futures.Future):
+                return head
+            in_flight -= 1
+            return head.result()
+
+        try:
+            for item in items:
+                if isinstance(item, int):
+                    while in_flight >= self._ocr_pages_per_request:
+                        yield next_page()
+                    if pdf is None:
+                        pdf = shared.enter_context(_shared_pdf(pdf_data))
+                    ahead.append(ocr_pool.call(_ocr_shared_page, pdf, item, *args))
+                    in_flight += 1
+                else:
+                    ahead.append(item)
+                while ahead and (
+                    len(ahead) > ahead_limit or not isinstance(ahead[0], futures.Future)
+                ):
+                    yield next_page()
+            while ahead:
+                yield next_page()
+        finally:
+            items.close()
+            for pending in ahead:
+                if isinstance(pending, futures.Future):
+                    pending.cancel()
+            shared.close()
+
+    def worker_pids(self) -> list[int]:
+        # ProcessPoolExecutor has no public accessor for its processes.
+        processes = getattr(self._pool, "_processes", None) or {}
+        ocr_pids = self._ocr_pool.worker_pids() if self._ocr_pool is not None else []
+        return list(processes) + ocr_pids
+
+    def ocr_queue_depth(self) -> int:
+        return self._ocr_pool.queue_depth if self._ocr_pool is not None else 0
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._ocr_pool is not None:
+            self._ocr_pool.shutdown()
+
+
+class OcrPool:
+    """Worker processes that only run OCR, apart from the engine.
+
+    OCR holds a core for seconds per page; on the gRPC threads it would
+    stall every other call (it holds the GIL), and in the engine's workers
+    it would hold them from other calls. Here at most ``max_workers`` calls
+    run at once and the rest queue. The thread engine sends page images
+    (``submit``, an ``ocr.set_recognizer`` hook), the process engine page
+    numbers of a PDF in shared memory (``call``); each worker has its own
+    OCR cache memory tier for the latter. A dead worker is replaced like
+    ``ProcessPoolEngine`` replaces its pool.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        ocr_cache_bytes: int = 0,
+        ocr_cache_dir: str = "",
+        ocr_cache_disk_bytes: int = 0,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self._max_workers = max_workers
+        self._ocr_cache = (ocr_cache_bytes, ocr_cache_dir, ocr_cache_disk_bytes)
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> futures.ProcessPoolExecutor:
+        return futures.ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            mp_context=self._context,
+            initializer=_init_ocr_worker,
+            initargs=self._ocr_cache,
+        )
+
+    def _replace_pool(self, broken: futures.ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is not broken:
+                return
+            logger.error("OCR worker process crashed, restarting OCR pool")
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def call(
+        self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> futures.Future[T]:
+        """Run ``fn`` in an OCR worker."""
+        pool = self._pool
+        try:
+            inner = pool.submit(_call_in_worker, None, fn, *args, **kwargs)
+        except BrokenProcessPool as exc:
+            self._replace_pool(pool)
+            raise WorkerCrashedError("OCR worker process crashed") from exc
+        with self._lock:
+            self._pending += 1
+
+        outer: futures.Future[T] = futures.Future()
+
+        def relay(done: futures.Future[tuple[T, list[stages.StageSample]]]) -> None:
+            with self._lock:
+                self._pending -= 1
+            if done.cancelled():
+                outer.cancel()
+                return
+            exc = done.exception()
+            if isinstance(exc, BrokenProcessPool):
+                self._replace_pool(pool)
+                crashed = WorkerCrashedError("OCR worker process crashed")
+                crashed.__cause__ = exc
+                outer.set_exception(crashed)
+            elif exc is not None:
+                outer.set_exception(exc)
+            else:
+                result, samples = done.result()
+                stages.replay(samples)
+                outer.set_result(result)
+
+        def propagate_cancel(done: futures.Future[T]) -> None:
+            if done.cancelled():
+                inner.cancel()
+
+        outer.add_done_callback(propagate_cancel)
+        inner.add_done_callback(relay)
+        return outer
+
+    def submit(
+        self, samples: bytes, width: int, height: int, language: str
+    ) -> futures.Future[bytes]:
+        """``ocr.recognize_image`` in a worker; an ``ocr.set_recognizer`` hook."""
+        return self.call(ocr.recognize_image, samples, width, height, language)
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting beyond those the workers can be running."""
+        with self._lock:
+            return max(0, self._pending - self._max_workers)
+
+    def worker_pids(self) -> list[int]:
+        processes = getattr(self._pool, "_processes", None) or {}
+        return list(processes)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _analyze_session(session: DocumentSession) -> DocumentInfoResult:
+    return document_info.analyze_document(session.doc, session.size)
+
+
+class _SharedPdf(NamedTuple):
+    """PDF bytes of one call, in shared memory for the workers serving it."""
+
+    pdf_id: str
+    memory_name: str
+    size: int
+
+
+@contextlib.contextmanager
+def _shared_pdf(pdf_data: bytes) -> Iterator[_SharedPdf]:
+    """``pdf_data`` in shared memory, freed when the block ends."""
+    memory = shared_memory.SharedMemory(create=True, size=max(len(pdf_data), 1))
+    try:
+        memory.buf[: len(pdf_data)] = pdf_data  # type: ignore[index]
+        yield _SharedPdf(uuid.uuid4().hex, memory.name, len(pdf_data))
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+# In a worker: documents opened from shared PDFs, oldest first. Calls in
+# flight at once each keep theirs open for their next tasks; once a call has
+# freed its shared PDF, the worker's next task closes the document.
+SHARED_DOCUMENTS = 4
+_shared_documents: dict[_SharedPdf, fitz.Document] = {}
+
+
+def _open_shared_document(pdf: _SharedPdf) -> fitz.Document:
+    doc = _shared_documents.get(pdf)
+    if doc is not None:
+        return doc
+    memory = shared_memory.SharedMemory(pdf.memory_name)
+    try:
+        pdf_data = bytes(memory.buf[: pdf.size])  # type: ignore[index]
+    finally:
+        memory.close()
+    doc = open_pdf(pdf_data)
+    if len(_shared_documents) >= SHARED_DOCUMENTS:
+        oldest = next(iter(_shared_documents))
+        _shared_documents.pop(oldest).close()
+    _shared_documents[pdf] = doc
+    return doc
+
+
+def _close_finished_documents() -> None:
+    """Close the documents of calls that have ended and unlinked their PDF."""
+    for pdf in list(_shared_documents):
+        try:
+            shared_memory.SharedMemory(pdf.memory_name).close()
+        except FileNotFoundError:
+            _shared_documents.pop(pdf).close()
+
+
+def _analyze_shared_range(pdf: _SharedPdf, start: int, stop: int) -> DocumentInfoResult:
+    doc = _open_shared_document(pdf)
+    return document_info.analyze_document(doc, pdf.size, start, stop)
+
+
+def _stream_header(
+    pdf: _SharedPdf, start: int, stop: int | None
+) -> tuple[DocumentInfoResult, range]:
+    doc = _open_shared_document(pdf)
+    return document_info.document_header(doc, pdf.size, start, stop)
+
+
+def _stream_page_batch(pdf: _SharedPdf, start: int, stop: int) -> DocumentInfoResult:
+    doc = _open_shared_document(pdf)
+    return document_info.analyze_page_batch(doc, pdf.size, start, stop)
+
+
+def _ocr_shared_page(pdf: _SharedPdf, page_num: int, *args: Any) -> PageTextResult:
+    doc = _open_shared_document(pdf)
+    return text_extraction.ocr_document_page(doc, page_num, *args)
+
+
+def _locked_steps(lock: threading.Lock, steps: Generator[Any]) -> Generator[Any]:
+    """Advance ``steps`` holding ``lock`` only while each item is computed."""
+    try:
+        while True:
+            with lock:
+                try:
+                    item = next(steps)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        with lock:
+            steps.close()
+
+
+class _CancellationFlags:
+    """Slots in a shared byte array that mark in-flight calls as cancelled.
+
+    Workers read the array through ``cancellation.SharedFlagToken``; the
+    server sets a call's slot when its token is cancelled.
+    """
+
+    def __init__(self, context: Any, size: int = CANCELLATION_SLOTS) -> None:
+        self.array = context.RawArray("b", size)
+        self._free = list(range(size))
+        self._lock = threading.Lock()
+
+    def allocate(self) -> int | None:
+        with self._lock:
+            if not self._free:
+                return None
+            slot = self._free.pop()
+        self.array[slot] = 0
+        return slot
+
+    def set(self, slot: int) -> None:
+        self.array[slot] = 1
+
+    def release(self, slot: int | None) -> None:
+        if slot is None:
+            return
+        with self._lock:
+            self._free.append(slot)
+
+
+def _init_worker(
+    flags: Any, ocr_cache_bytes: int, ocr_cache_dir: str, ocr_cache_disk_bytes: int
+) -> None:
+    cancellation.attach_shared_flags(flags)
+    _init_ocr_worker(ocr_cache_bytes, ocr_cache_dir, ocr_cache_disk_bytes)
+
+
+def _init_ocr_worker(
+    ocr_cache_bytes: int, ocr_cache_dir: str, ocr_cache_disk_bytes: int
+) -> None:
+    if ocr_cache_bytes or ocr_cache_dir:
+        ocr.set_cache(ResultCache(ocr_cache_bytes, ocr_cache_dir, ocr_cache_disk_bytes))
+
+
+def _call_in_worker(
+    token: cancellation.CancellationToken | None,
+    fn: Callable[..., Any],
+    /,
+    *args: Any,
+    **kwargs: Any,
+) -> tuple[Any, list[stages.StageSample]]:
+    """Run ``fn`` in a worker, returning its stage timings with the result."""
+    _close_finished_documents()
+    with cancellation.bind(token), stages.collect() as samples:
+        result = fn(*args, **kwargs)
+    return result, samples
+
+
+def build_engine(config: ServiceConfig) -> ExecutionEngine:
+    """Create the execution engine selected by ``config.engine``."""
+    if config.ocr_threads:
+        # Read by Tesseract when it is loaded, i.e. in worker processes
+        # started from here on; OCR in this process is not limited.
+        os.environ[OCR_THREAD_LIMIT_ENV] = str(config.ocr_threads)
+    if config.engine == "thread":
+        # OCR runs in this process, or in its own pool of workers.
+        if config.ocr_cache_bytes or config.ocr_cache_dir:
+            ocr.set_cache(
+                ResultCache(
+                    config.ocr_cache_bytes,
+                    config.ocr_cache_dir,
+                    config.ocr_cache_disk_bytes,
+                )
+            )
+        if not config.ocr_workers:
+            return InlineEngine()
+        ocr_pool = OcrPool(config.ocr_workers)
+        ocr.set_recognizer(ocr_pool.submit, config.ocr_pages_per_request)
+        return InlineEngine(ocr_pool)
+    if config.engine == "process":
+        ocr_cache = (
+            config.ocr_cache_bytes,
+            config.ocr_cache_dir,
+            config.ocr_cache_disk_bytes,
+        )
+        return ProcessPoolEngine(
+            max_workers=config.process_workers,
+            batch_pages=config.extract_batch_pages,
+            extract_window=config.extract_window or None,
+            ocr_cache_bytes=config.ocr_cache_bytes,
+            ocr_cache_dir=config.ocr_cache_dir,
+            ocr_cache_disk_bytes=config.ocr_cache_disk_bytes,
+            ocr_pool=OcrPool(config.ocr_workers, *ocr_cache)
+            if config.ocr_workers
+            else None,
+            ocr_pages_per_request=config.ocr_pages_per_request,
+            max_tasks_per_child=config.worker_max_tasks or None,
+        )
+    raise ValueError(f"Unknown execution engine: {config.engine!r}")
@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+from typing import TYPE_CHECKING
+
+import grpc
+
+from pdf_service import profiling
+from pdf_service.admission import AdmissionController, estimate_cost
+from pdf_service.cache import ResultCache, result_key
+from pdf_service.config import ServiceConfig
+from pdf_service.core import (
+    annotation,
+    cancellation,
+    document_info,
+    redaction,
+    text_extraction,
+)
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc import batch, messages
+from pdf_service.grpc.extraction import Extraction
+from pdf_service.sessions import DocumentSession, DocumentStore
+
+if TYPE_CHECKING:
+    from concurrent import futures
+
+    from pdf_service.engine import ExecutionEngine
+
+
+async def _abort(context, exc):
+    context.set_trailing_metadata(messages.error_metadata(exc))
+    await context.abort(*messages.status_for(exc))
+
+
+def _token(context):
+    """A token cancelled when the call ends early and expiring at its deadline."""
+    token = cancellation.CancellationToken.from_timeout(context.time_remaining())
+    context.add_done_callback(lambda _: token.cancel())
+    return token
+
+
+class AsyncPdfServiceServicer(pb2_grpc.PdfServiceServicer):
+    """grpc.aio servicer.
+
+    Handlers run on the event loop and await core work on a bounded thread
+    pool, so idle or slow-reading streams hold no thread between messages.
+    """
+
+    def __init__(
+        self,
+        engine: ExecutionEngine,
+        executor: futures.Executor,
+        config: ServiceConfig | None = None,
+        documents: DocumentStore | None = None,
+        results: ResultCache | None = None,
+        admission: AdmissionController | None = None,
+    ):
+        self._engine = engine
+        self._executor = executor
+        self._config = config or ServiceConfig()
+        # Not ``or``: an empty store is falsy.
+        if documents is None:
+            documents = DocumentStore(
+                self._config.session_cache_bytes, self._config.session_ttl_seconds
+            )
+        self._documents = documents
+        self._results = results or ResultCache(
+            self._config.result_cache_bytes,
+            self._config.result_cache_dir,
+            self._config.result_cache_disk_bytes,
+        )
+        self._admission = admission or AdmissionController(
+            self._config.admission_memory_bytes,
+            self._config.admission_cpu_slots,
+            self._config.admission_queue_timeout,
+        )
+
+    async def _to_thread(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    @contextlib.asynccontextmanager
+    async def _admit(self, source):
+        """Wait on the event loop until admission control admits ``source``."""
+        if not self._admission.enabled:
+            yield
+            return
+        cost = await self._to_thread(estimate_cost, source)
+        async with self._admission.admit_async(cost):
+            yield
+
+    async def _admitted(self, source, fn, *args, **kwargs):
+        async with self._admit(source):
+            return await self._to_thread(fn, *args, **kwargs)
+
+    def _profile_requested(self, context):
+        return self._config.profiling_enabled and profiling.requested(
+            context.invocation_metadata()
+        )
+
+    async def _run(self, context, source, fn, *args, **kwargs):
+        """``engine.run`` once admitted, under the profiler if requested."""
+        run = functools.partial(
+            cancellation.call_with, _token(context), self._engine.run
+        )
+        if not self._profile_requested(context):
+            return await self._admitted(source, run, fn, *args, **kwargs)
+        fn = profiling.profiled(fn, self._config.profile_dir)
+        result, summary = await self._admitted(source, run, fn, *args, **kwargs)
+        context.set_trailing_metadata(profiling.summary_metadata(summary))
+        return result
+
+    async def _run_document(self, context, source, bytes_fn, session_fn):
+        """``engine.run_document`` once admitted, profiled if requested."""
+        run_document = functools.partial(
+            cancellation.call_with, _token(context), self._engine.run_document
+        )
+        if not self._profile_requested(context):
+            return await self._admitted(
+                source, run_document, source, bytes_fn, session_fn
+            )
+        directory = self._config.profile_dir
+        result, summary = await self._admitted(
+            source,
+            run_document,
+            source,
+            profiling.profiled(bytes_fn, directory),
+            profiling.profiled(session_fn, directory),
+        )
+        context.set_trailing_metadata(profiling.summary_metadata(summary))
+        return result
+
+    async def _read_upload(self, request_iterator, header, context):
+        upload = messages.Upload(header, self._config.max_upload_size)
+        try:
+            async for message in request_iterator:
+                upload.add(message)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        return upload
+
+    async def OpenDocument(self, request, context):
+        try:
+            session = await self._admitted(
+                request.pdf_data, self._documents.open, request.pdf_data
+            )
+        except Exception as e:
+            await _abort(context, e)
+
+        return messages.open_document_response(session, self._documents.ttl_seconds)
+
+    async def CloseDocument(self, request, context):
+        return pb2.CloseDocumentResponse(closed=self._documents.close(request.doc_id))
+
+    async def GetDocumentInfo(self, request, context):
+        return await self._get_document_info(request, request.pdf_data, context)
+
+    async def GetDocumentInfoUpload(self, request_iterator, context):
+        upload = await self._read_upload(request_iterator, pb2.PdfInput(), context)
+        return await self._get_document_info(upload.header, upload.pdf_data, context)
+
+    async def _get_document_info(self, request, pdf_data, context):
+        try:
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            compute = functools.partial(
+                self._admitted,
+                source,
+                functools.partial(
+                    cancellation.call_with,
+                    _token(context),
+                    self._engine.analyze_document,
+                ),
+                source,
+            )
+            if self._profile_requested(context):
+                # Profiled calls always do the work they are asked to measure,
+                # in one worker so a single profile covers it.
+                result = await self._run_document(
+                    context,
+                    source,
+                    document_info.get_document_info,
+                    lambda s: document_info.analyze_document(s.doc, s.size),
+                )
+            else:
+                key, result = await self._to_thread(
+                    self._results.lookup, lambda: result_key("document_info", source)
+                )
+                if result is None:
+                    result = await compute()
+                    if key:
+                        await self._to_thread(self._results.put, key, result)
+        except Exception as e:
+            await _abort(context, e)
+
+        return messages.document_info_response(result)
+
+    async def StreamDocumentInfo(self, request, context):
+        try:
+            source = self._documents.resolve(request.doc_id, request.pdf_data)
+            async with self._admit(source):
+                results = self._engine.stream_document_info(
+                    source,
+                    request.start_page,
+                    request.end_page or None,
+                    self._config.info_batch_pages,
+                )
+                chunks = messages.document_info_chunks(results)
+                async for chunk in self._step(chunks, _token(context)):
+                    yield chunk
+        except Exception as e:
+            await _abort(context, e)
+
+    async def TriageDocument(self, request, context):
+        sample_pages = request.sample_pages
+
+        try:
+            source = self._documents.resolve(request.doc_id, request.pdf_data)
+            result = await self._run_document(
+                context,
+                source,
+                functools.partial(document_info.get_triage, sample_pages=sample_pages),
+                lambda s: document_info.triage_document(s.doc, s.size, sample_pages),
+            )
+        except Exception as e:
+            await _abort(context, e)
+
+        return messages.triage_response(result)
+
+    async def ExtractText(self, request, context):
+        async for response in self._extract_text(request, request.pdf_data, context):
+            yield response
+
+    async def ExtractTextUpload(self, request_iterator, context):
+        upload = await self._read_upload(
+            request_iterator, pb2.ExtractTextRequest(), context
+        )
+        async for response in self._extract_text(
+            upload.header, upload.pdf_data, context
+        ):
+            yield response
+
+    async def _extract_text(self, request, pdf_data, context):
+        try:
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            extraction = await self._to_thread(
+                Extraction, self._engine, self._results, source, request
+            )
+            if not extraction.pages:
+                return
+            if self._profile_requested(context):
+                # The profile covers every page, so extract them all up front.
+                page_results = await self._run_document(
+                    context,
+                    source,
+                    functools.partial(
+                        text_extraction.extract_all_text,
+                        pages=extraction.pages,
+                        include_positions=extraction.include_positions,
+                        ocr_options=extraction.ocr_options,
+                        packed_positions=extraction.packed_positions,
+                    ),
+                    lambda s: list(
+                        text_extraction.extract_document_text(
+                            s.doc,
+                            extraction.pages,
+                            extraction.include_positions,
+                            extraction.ocr_options,
+                            extraction.packed_positions,
+                        )
+                    ),
+                )
+                for response in extraction.responses(iter(page_results)):
+                    yield response
+                return
+        except Exception as e:
+            await _abort(context, e)
+
+        token = _token(context)
+        try:
+            # Cached pages are sent without waiting for admission.
+            cached = extraction.responses(extraction.cached())
+            async for response in self._step(cached, token):
+                yield response
+            if extraction.complete:
+                return
+            async with self._admit(source):
+                extracted = extraction.responses(
+                    extraction.extracted(extraction.extract)
+                )
+                async for response in self._step(extracted, token):
+                    yield response
+        except Exception as e:
+            await _abort(context, e)
+
+    async def _step(self, page_results, token):
+        step = None
+        try:
+            while True:
+                # Step the generator on the pool; the loop is free while the
+                # client drains the previous message.
+                step = self._executor.submit(
+                    cancellation.call_with, token, next, page_results, None
+                )
+                page_result = await asyncio.wrap_future(step)
+                if page_result is None:
+                    break
+                yield page_result
+        finally:
+            if step is not None and not step.done():
+                # Cancelled mid-step: close once the worker thread lets go.
+                step.add_done_callback(lambda _: page_results.close())
+            else:
+                page_results.close()
+
+    async def GetSuggestionAnnotations(self, request, context):
+        return await self._get_suggestion_annotations(
+            request, request.pdf_data, context
+        )
+
+    async def GetSuggestionAnnotationsUpload(self, request_iterator, context):
+        upload = await self._read_upload(
+            request_iterator, pb2.GetSuggestionAnnotationsRequest(), context
+        )
+        return await self._get_suggestion_annotations(
+            upload.header, upload.pdf_data, context
+        )
+
+    async def _get_suggestion_annotations(self, request, pdf_data, context):
+        texts = list(request.texts)
+
+        try:
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            result = await self._run_document(
+                context,
+                source,
+                functools.partial(annotation.get_suggestion_annotations, texts=texts),
+                lambda s: annotation.search_document(s.doc, texts),
+            )
+        except Exception as e:
+            await _abort(context, e)
+
+        return messages.suggestions_response(result)
+
+    async def ApplyRedactions(self, request, context):
+        result = await self._apply_redactions(request, request.pdf_data, context)
+        return messages.redactions_response(result)
+
+    async def ApplyRedactionsUpload(self, request_iterator, context):
+        upload = await self._read_upload(
+            request_iterator, pb2.ApplyRedactionsRequest(), context
+        )
+        result = await self._apply_redactions(upload.header, upload.pdf_data, context)
+        for response in messages.redaction_chunks(
+            result, self._config.stream_chunk_size
+        ):
+            yield response
+
+    async def _apply_redactions(self, request, pdf_data, context):
+        try:
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            # Redaction modifies the document, so sessions always work on a
+            # fresh copy opened from their bytes.
+            pdf_data = (
+                source.pdf_data if isinstance(source, DocumentSession) else source
+            )
+            return await self._run(
+                context,
+                source,
+                redaction.apply_redactions,
+                pdf_data,
+                request.xfdf,
+                style_config=messages.style_config(request),
+            )
+        except Exception as e:
+            await _abort(context, e)
+
+    async def AutoRedact(self, request, context):
+        try:
+            source = self._documents.resolve(request.doc_id, request.pdf_data)
+            # Sessions are redacted on a fresh copy, as in ApplyRedactions.
+            pdf_data = (
+                source.pdf_data if isinstance(source, DocumentSession) else source
+            )
+            result = await self._run(
+                context,
+                source,
+                redaction.auto_redact,
+                pdf_data,
+                list(request.texts),
+                style_config=messages.style_config(request),
+            )
+        except Exception as e:
+            await _abort(context, e)
+
+        return messages.auto_redact_response(result)
+
+    async def ProcessBatch(self, request_iterator, context):
+        token = _token(context)
+        done: asyncio.Queue[pb2.BatchResponse | batch.RequestsRead] = asyncio.Queue()
+        # Items in flight or waiting to be sent for this stream; reading waits
+        # for a free slot, so a client that stops reading results also stops
+        # new items from starting.
+        slots = asyncio.Semaphore(self._config.batch_concurrency)
+
+        async def run(item):
+            await done.put(await self._batch_item(item, token))
+
+        async def read():
+            tasks = set()
+            submitted, error = 0, None
+            try:
+                async for item in request_iterator:
+                    await slots.acquire()
+                    task = asyncio.create_task(run(item))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    submitted += 1
+            except Exception as e:
+                error = e
+            finally:
+                if tasks:
+                    await asyncio.wait(tasks)
+                await done.put(batch.RequestsRead(submitted, error))
+
+        reader = asyncio.create_task(read())
+        try:
+            while not isinstance(response := await done.get(), batch.RequestsRead):
+                yield response
+                slots.release()
+        finally:
+            reader.cancel()
+        if response.error is not None:
+            await _abort(context, response.error)
+
+    async def _batch_item(self, item, token):
+        try:
+            source = batch.source(self._documents, item)
+            async with self._admit(source):
+                return await self._to_thread(
+                    cancellation.call_with,
+                    token,
+                    batch.process,
+                    self._engine,
+                    self._results,
+                    item,
+                    source,
+                )
+        except Exception as e:
+            return batch.error_response(item, e)
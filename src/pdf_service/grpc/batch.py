@@ -0,0 +1,106 @@
+"""ProcessBatch items: one document and operation each.
+
+Shared by the synchronous and asyncio servicers, which run items in
+parallel (at most ``batch_concurrency`` per stream) under admission control
+and stream each result as soon as it completes. A failing item gets an
+error result; the batch carries on.
+"""
+
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING, NamedTuple
+
+from pdf_service.cache import result_key
+from pdf_service.core import annotation, document_info, redaction
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.grpc import messages
+from pdf_service.grpc.extraction import Extraction
+from pdf_service.sessions import DocumentSession
+
+if TYPE_CHECKING:
+    from pdf_service.cache import ResultCache
+    from pdf_service.engine import ExecutionEngine
+    from pdf_service.sessions import DocumentStore
+
+
+class RequestsRead(NamedTuple):
+    """End of a request stream: items read, and the error that ended it early."""
+
+    submitted: int
+    error: Exception | None
+
+
+def source(documents: DocumentStore, item: pb2.BatchRequest) -> bytes | DocumentSession:
+    """The PDF bytes or open session ``item`` operates on."""
+    operation = item.WhichOneof("operation")
+    if operation is None:
+        raise ValueError("Batch item has no operation")
+    request = getattr(item, operation)
+    return documents.resolve(request.doc_id, request.pdf_data)
+
+
+def process(
+    engine: ExecutionEngine,
+    results: ResultCache,
+    item: pb2.BatchRequest,
+    source: bytes | DocumentSession,
+) -> pb2.BatchResponse:
+    """Run ``item``'s operation on ``source``, blocking until it completes."""
+    response = pb2.BatchResponse(correlation_id=item.correlation_id)
+    operation = item.WhichOneof("operation")
+    if operation == "info":
+        info = results.cached(
+            lambda: result_key("document_info", source),
+            lambda: engine.analyze_document(source),
+        )
+        response.info.CopyFrom(messages.document_info_response(info))
+    elif operation == "extract":
+        extraction = Extraction(engine, results, source, item.extract)
+        page_results = extraction.page_results(extraction.extract)
+        response.extract.pages.extend(extraction.responses(page_results))
+    elif operation == "suggest":
+        texts = list(item.suggest.texts)
+        suggestions = engine.run_document(
+            source,
+            functools.partial(annotation.get_suggestion_annotations, texts=texts),
+            lambda s: annotation.search_document(s.doc, texts),
+        )
+        response.suggest.CopyFrom(messages.suggestions_response(suggestions))
+    elif operation == "triage":
+        sample_pages = item.triage.sample_pages
+        triage = engine.run_document(
+            source,
+            functools.partial(document_info.get_triage, sample_pages=sample_pages),
+            lambda s: document_info.triage_document(s.doc, s.size, sample_pages),
+        )
+        response.triage.CopyFrom(messages.triage_response(triage))
+    elif operation == "redact":
+        redacted = engine.run(
+            redaction.apply_redactions,
+            _fresh_copy(source),
+            item.redact.xfdf,
+            style_config=messages.style_config(item.redact),
+        )
+        response.redact.CopyFrom(messages.redactions_response(redacted))
+    else:
+        auto_redacted = engine.run(
+            redaction.auto_redact,
+            _fresh_copy(source),
+            list(item.auto_redact.texts),
+            style_config=messages.style_config(item.auto_redact),
+        )
+        response.auto_redact.CopyFrom(messages.auto_redact_response(auto_redacted))
+    return response
+
+
+def _fresh_copy(source: bytes | DocumentSession) -> bytes:
+    # Sessions are redacted on a fresh copy, as in ApplyRedactions.
+    return source.pdf_data if isinstance(source, DocumentSession) else source
+
+
+def error_response(item: pb2.BatchRequest, exc: Exception) -> pb2.BatchResponse:
+    code, message = messages.status_for(exc)
+    return pb2.BatchResponse(
+        correlation_id=item.correlation_id, code=code.value[0], error=message
+    )
@@ -0,0 +1,161 @@
+"""ExtractText requests resolved to pages, resume tokens and per-page caching.
+
+Shared by the synchronous and asyncio servicers and ProcessBatch. Every
+streamed page carries a resume token; a client whose stream broke sends the
+same request again with the last token it received and gets the pages after
+it. Pages are cached one by one as they are sent, so pages a broken stream
+already produced are not extracted again.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any
+
+from pdf_service.cache import result_keys
+from pdf_service.core import text_extraction
+from pdf_service.grpc import messages
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterator
+
+    from pdf_service.cache import ResultCache
+    from pdf_service.core.types import PageTextResult
+    from pdf_service.engine import ExecutionEngine
+    from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+    from pdf_service.sessions import DocumentSession
+
+
+class Extraction:
+    """The pages of an ExtractText request that are still to be sent.
+
+    Resolving the pages opens the document (in the engine), so construct it
+    off the event loop.
+    """
+
+    def __init__(
+        self,
+        engine: ExecutionEngine,
+        results: ResultCache,
+        source: bytes | DocumentSession,
+        request: pb2.ExtractTextRequest,
+    ) -> None:
+        self.engine = engine
+        self.results = results
+        self.source = source
+        self.include_positions = request.include_word_positions
+        self.ocr_options = messages.ocr_options(request)
+        self.packed_positions = self.include_positions and request.packed_positions
+        requested = list(request.pages) or None
+        start, stop = request.start_page, request.end_page or None
+        all_pages = engine.run_document(
+            source,
+            functools.partial(
+                text_extraction.select_pages, pages=requested, start=start, stop=stop
+            ),
+            lambda s: text_extraction.select_document_pages(
+                s.doc, requested, start, stop
+            ),
+        )
+        self._fingerprint = _fingerprint(
+            requested,
+            start,
+            stop,
+            self.include_positions,
+            self.ocr_options,
+            self.packed_positions,
+        )
+        self.position = _resume_position(
+            request.resume_token, self._fingerprint, len(all_pages)
+        )
+        self.pages = all_pages[self.position :]
+        self._keys = self._page_keys()
+        self._cached = 0
+        self._sent = 0
+
+    def extract(self, pages: list[int]) -> Iterator[PageTextResult]:
+        """Extract ``pages`` with the request's options."""
+        return self.engine.extract_document(
+            self.source,
+            pages,
+            self.include_positions,
+            self.ocr_options,
+            self.packed_positions,
+        )
+
+    def page_results(
+        self, produce: Callable[[list[int]], Iterator[PageTextResult]]
+    ) -> Generator[PageTextResult]:
+        """The pages to send: ``cached()``, then ``extracted(produce)``."""
+        yield from self.cached()
+        yield from self.extracted(produce)
+
+    def cached(self) -> Generator[PageTextResult]:
+        """Cached pages from the first to send up to the first one not cached."""
+        for page_result in self.results.cached_prefix(self._keys):
+            self._cached += 1
+            yield page_result
+
+    def extracted(
+        self, produce: Callable[[list[int]], Iterator[PageTextResult]]
+    ) -> Generator[PageTextResult]:
+        """The pages after ``cached()``, from ``produce``, caching each.
+
+        ``produce`` extracts the given pages in order; it is not called if
+        every page was cached.
+        """
+        if self._cached < len(self.pages):
+            yield from self.results.store_each(
+                self._keys[self._cached :], produce(self.pages[self._cached :])
+            )
+
+    @property
+    def complete(self) -> bool:
+        """Whether every page has been taken from the cache."""
+        return self._cached == len(self.pages)
+
+    def _page_keys(self) -> list[str]:
+        if not self.results.enabled:
+            return [""] * len(self.pages)
+        return result_keys(
+            "extract_page",
+            self.source,
+            self.pages,
+            include_positions=self.include_positions,
+            ocr=self.ocr_options,
+            packed_positions=self.packed_positions,
+        )
+
+    def responses(
+        self, page_results: Iterator[PageTextResult]
+    ) -> Generator[pb2.PageTextResponse]:
+        """``page_results`` as messages, each with the token to resume after it."""
+        for page_result in page_results:
+            self._sent += 1
+            position = self.position + self._sent
+            yield messages.page_text_response(
+                page_result, f"{position}.{self._fingerprint}"
+            )
+
+
+def _fingerprint(*options: Any) -> str:
+    # Ties a token to the request options, not to the document: hashing the
+    # PDF on every call only to check tokens is not worth it.
+    material = json.dumps(options, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+
+def _resume_position(token: str, fingerprint: str, page_count: int) -> int:
+    """Index in the requested pages to resume from; 0 without a token."""
+    if not token:
+        return 0
+    position, _, token_fingerprint = token.partition(".")
+    if (
+        token_fingerprint != fingerprint
+        or not position.isdigit()
+        or int(position) > page_count
+    ):
+        raise ValueError("Resume token does not match this request")
+    return int(position)
@@ -0,0 +1,409 @@
+"""Server interceptors recording per-RPC metrics and compressing responses.
+
+Metrics: latency (by method and status code), serialized request and response
+sizes, and page counts for the RPCs that report pages. Sizes are counted
+where gRPC (de)serializes each call's messages, as ``ByteSize()`` would
+serialize them once more.
+
+Compression: responses of at least ``min_bytes`` are compressed with the
+configured algorithm; smaller ones are sent as they are, decided from the
+serialized bytes. gRPC negotiates per call, so a client that does not
+accept the algorithm gets uncompressed responses.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import inspect
+import itertools
+import queue
+import threading
+import time
+import zlib
+from typing import TYPE_CHECKING, Any
+
+import grpc
+
+from pdf_service import metrics
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# Response messages that carry the document's page count.
+_PAGE_COUNT_RESPONSES = frozenset({"DocumentInfoResponse", "OpenDocumentResponse"})
+
+# grpcio implements no other algorithms (e.g. zstd).
+COMPRESSION_ALGORITHMS = {
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+# zlib window bits matching each algorithm's framing.
+_WBITS = {"gzip": 31, "deflate": 15}
+# gRPC's compressed size is not exposed, so the ratio metric re-compresses
+# one in this many compressed responses, in the background.
+RATIO_SAMPLE_EVERY = 10
+# Sampled responses waiting to be measured; further samples are dropped.
+RATIO_QUEUE_SIZE = 4
+
+
+class _Observation:
+    """Metrics of one call, whose messages pass ``deserializer``/``serializer``."""
+
+    def __init__(self, method: str, handler: grpc.RpcMethodHandler):
+        self.method = method
+        self.streaming_response = handler.response_streaming
+        self.start = time.perf_counter()
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.pages: int | None = None
+
+    def deserializer(
+        self, deserialize: Callable[[bytes], Any] | None
+    ) -> Callable[[bytes], Any] | None:
+        if deserialize is None:
+            return None
+
+        def deserialize_and_count(data: bytes) -> Any:
+            self.request_bytes += len(data)
+            return deserialize(data)
+
+        return deserialize_and_count
+
+    def serializer(
+        self, serialize: Callable[[Any], bytes] | None
+    ) -> Callable[[Any], bytes] | None:
+        if serialize is None:
+            return None
+
+        def serialize_and_count(message: Any) -> bytes:
+            data = serialize(message)
+            if self.streaming_response:
+                self.response_bytes += len(data)
+            else:
+                # Serialized once the call has finished.
+                metrics.RPC_RESPONSE_BYTES.observe(len(data), method=self.method)
+            return data
+
+        return serialize_and_count
+
+    def response(self, message: Any) -> None:
+        name = message.DESCRIPTOR.name
+        if name == "PageTextResponse":
+            self.pages = (self.pages or 0) + 1
+        elif name == "DocumentInfoChunk" and message.HasField("pages"):
+            self.pages = (self.pages or 0) + len(message.pages.pages)
+        elif name in _PAGE_COUNT_RESPONSES:
+            self.pages = message.page_count
+
+    def finish(self, code: grpc.StatusCode) -> None:
+        metrics.RPC_DURATION.observe(
+            time.perf_counter() - self.start, method=self.method, code=code.name
+        )
+        metrics.RPC_REQUEST_BYTES.observe(self.request_bytes, method=self.method)
+        if self.streaming_response:
+            metrics.RPC_RESPONSE_BYTES.observe(self.response_bytes, method=self.method)
+        if self.pages is not None:
+            metrics.RPC_PAGES.observe(self.pages, method=self.method)
+
+
+def _status(context: Any, error: BaseException | None) -> grpc.StatusCode:
+    code = context.code()
+    if isinstance(code, grpc.StatusCode):
+        return code
+    if isinstance(code, int):
+        # grpc.aio reports the code as its integer value.
+        for status in grpc.StatusCode:
+            if status.value[0] == code:
+                return status
+    if isinstance(error, GeneratorExit):
+        return grpc.StatusCode.CANCELLED
+    return grpc.StatusCode.OK if error is None else grpc.StatusCode.UNKNOWN
+
+
+def _method_name(handler_call_details: grpc.HandlerCallDetails) -> str:
+    return str(handler_call_details.method).rsplit("/", 1)[-1]
+
+
+def _handler_factory(handler: grpc.RpcMethodHandler) -> Any:
+    if handler.request_streaming and handler.response_streaming:
+        return grpc.stream_stream_rpc_method_handler
+    if handler.request_streaming:
+        return grpc.stream_unary_rpc_method_handler
+    if handler.response_streaming:
+        return grpc.unary_stream_rpc_method_handler
+    return grpc.unary_unary_rpc_method_handler
+
+
+def _behavior(handler: grpc.RpcMethodHandler) -> Any:
+    return (
+        handler.unary_unary
+        or handler.unary_stream
+        or handler.stream_unary
+        or handler.stream_stream
+    )
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):  # type: ignore[misc]
+    """Records RPC metrics for the synchronous grpc.server."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        behavior = _behavior(handler)
+        observation = _Observation(_method_name(handler_call_details), handler)
+
+        def unary_response(request_or_iterator, context):
+            error = None
+            try:
+                response = behavior(request_or_iterator, context)
+                if response is not None:
+                    observation.response(response)
+                return response
+            except BaseException as exc:
+                error = exc
+                raise
+            finally:
+                observation.finish(_status(context, error))
+
+        def stream_response(request_or_iterator, context):
+            error = None
+            try:
+                for response in behavior(request_or_iterator, context):
+                    observation.response(response)
+                    yield response
+            except BaseException as exc:
+                error = exc
+                raise
+            finally:
+                observation.finish(_status(context, error))
+
+        return _handler_factory(handler)(
+            stream_response if handler.response_streaming else unary_response,
+            request_deserializer=observation.deserializer(handler.request_deserializer),
+            response_serializer=observation.serializer(handler.response_serializer),
+        )
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):  # type: ignore[misc]
+    """Records RPC metrics for the grpc.aio server."""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        behavior = _behavior(handler)
+        observation = _Observation(_method_name(handler_call_details), handler)
+
+        async def unary_response(request_or_iterator, context):
+            error = None
+            try:
+                response = behavior(request_or_iterator, context)
+                if inspect.isawaitable(response):
+                    response = await response
+                if response is not None:
+                    observation.response(response)
+                return response
+            except BaseException as exc:
+                error = exc
+                raise
+            finally:
+                observation.finish(_status(context, error))
+
+        async def stream_response(request_or_iterator, context):
+            error = None
+            try:
+                responses = behavior(request_or_iterator, context)
+                if inspect.isawaitable(responses):
+                    # Handler writes with context.write() and returns None.
+                    await responses
+                elif hasattr(responses, "__aiter__"):
+                    async for response in responses:
+                        observation.response(response)
+                        yield response
+                else:
+                    for response in responses:
+                        observation.response(response)
+                        yield response
+            except BaseException as exc:
+                error = exc
+                raise
+            finally:
+                observation.finish(_status(context, error))
+
+        return _handler_factory(handler)(
+            stream_response if handler.response_streaming else unary_response,
+            request_deserializer=observation.deserializer(handler.request_deserializer),
+            response_serializer=observation.serializer(handler.response_serializer),
+        )
+
+
+class _RatioSampler:
+    """Compression ratios of sampled responses, measured off the call path.
+
+    Samples are the bytes gRPC serialized for sending. They are compressed
+    again on a background thread; zlib releases the GIL while it works.
+    """
+
+    def __init__(self, algorithm: str, every: int = RATIO_SAMPLE_EVERY) -> None:
+        self.algorithm = algorithm
+        self._every = every
+        self._offered = itertools.count()
+        self._queue: queue.Queue[tuple[str, bytes]] = queue.Queue(RATIO_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def offer(self, method: str, data: bytes) -> None:
+        if next(self._offered) % self._every:
+            return
+        if self._thread is None:
+            self._start()
+        with contextlib.suppress(queue.Full):
+            self._queue.put_nowait((method, data))
+
+    def join(self) -> None:
+        """Wait until the queued samples have been measured."""
+        self._queue.join()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._measure, name="compression-ratio", daemon=True
+                )
+                self._thread.start()
+
+    def _measure(self) -> None:
+        while True:
+            method, data = self._queue.get()
+            try:
+                compressor = zlib.compressobj(wbits=_WBITS[self.algorithm])
+                compressed = len(compressor.compress(data)) + len(compressor.flush())
+                metrics.RPC_COMPRESSION_RATIO.observe(
+                    compressed / len(data), method=method, algorithm=self.algorithm
+                )
+            finally:
+                self._queue.task_done()
+
+
+class _Compression:
+    """Compression settings and ratio sampling shared by both interceptors."""
+
+    def __init__(self, algorithm: str, min_bytes: int):
+        if algorithm not in COMPRESSION_ALGORITHMS:
+            raise ValueError(
+                f"Unknown compression algorithm: {algorithm!r}"
+                f" (supported: {', '.join(COMPRESSION_ALGORITHMS)})"
+            )
+        self.algorithm = algorithm
+        self.compression = COMPRESSION_ALGORITHMS[algorithm]
+        self.min_bytes = min_bytes
+        self.ratios = _RatioSampler(algorithm)
+
+    def call(self, method: str) -> _CompressedCall:
+        return _CompressedCall(self, method)
+
+
+class _CompressedCall:
+    """One call's compression: set up by ``start``, decided per message by
+    ``serializer``, which sees the bytes about to be sent.
+    """
+
+    def __init__(self, compression: _Compression, method: str):
+        self.compression = compression
+        self.method = method
+        self.context: Any = None
+
+    def start(self, context: Any) -> None:
+        self.context = context
+        context.set_compression(self.compression.compression)
+
+    def serializer(
+        self, serialize: Callable[[Any], bytes] | None
+    ) -> Callable[[Any], bytes] | None:
+        if serialize is None:
+            return None
+
+        def serialize_and_decide(message: Any) -> bytes:
+            data = serialize(message)
+            if len(data) < self.compression.min_bytes:
+                # gRPC reads the flag once the message is serialized.
+                if self.context is not None:
+                    self.context.disable_next_message_compression()
+            elif data:
+                self.compression.ratios.offer(self.method, data)
+            return data
+
+        return serialize_and_decide
+
+
+class CompressionInterceptor(grpc.ServerInterceptor):  # type: ignore[misc]
+    """Compresses large responses for the synchronous grpc.server."""
+
+    def __init__(self, algorithm, min_bytes):
+        self._compression = _Compression(algorithm, min_bytes)
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        behavior = _behavior(handler)
+        call = self._compression.call(_method_name(handler_call_details))
+
+        def unary_response(request_or_iterator, context):
+            call.start(context)
+            return behavior(request_or_iterator, context)
+
+        def stream_response(request_or_iterator, context):
+            call.start(context)
+            yield from behavior(request_or_iterator, context)
+
+        return _handler_factory(handler)(
+            stream_response if handler.response_streaming else unary_response,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=call.serializer(handler.response_serializer),
+        )
+
+
+class AsyncCompressionInterceptor(grpc.aio.ServerInterceptor):  # type: ignore[misc]
+    """Compresses large responses for the grpc.aio server."""
+
+    def __init__(self, algorithm, min_bytes):
+        self._compression = _Compression(algorithm, min_bytes)
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        behavior = _behavior(handler)
+        call = self._compression.call(_method_name(handler_call_details))
+
+        async def unary_response(request_or_iterator, context):
+            call.start(context)
+            response = behavior(request_or_iterator, context)
+            if inspect.isawaitable(response):
+                response = await response
+            return response
+
+        async def stream_response(request_or_iterator, context):
+            call.start(context)
+            responses = behavior(request_or_iterator, context)
+            if inspect.isawaitable(responses):
+                # Handler writes with context.write(), through the serializer.
+                await responses
+            elif hasattr(responses, "__aiter__"):
+                async for response in responses:
+                    yield response
+            else:
+                for response in responses:
+                    yield response
+
+        return _handler_factory(handler)(
+            stream_response if handler.response_streaming else unary_response,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=call.serializer(handler.response_serializer),
+        )
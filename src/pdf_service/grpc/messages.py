@@ -0,0 +1,329 @@
+"""Conversions between protobuf messages and core results.
+
+Shared by the synchronous and asyncio servicers.
+"""
+
+from __future__ import annotations
+
+import array
+import contextlib
+import sys
+from typing import TYPE_CHECKING, Any
+
+import grpc
+
+from pdf_service.admission import AdmissionRejectedError
+from pdf_service.core.cancellation import DeadlineExceeded, OperationCancelled
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.sessions import DocumentNotFoundError, DocumentTooLargeError
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterator
+
+    from pdf_service.core.types import (
+        AutoRedactResult,
+        DocumentInfoResult,
+        DocumentMetadataResult,
+        PageInfoResult,
+        PageTextResult,
+        RedactionResult,
+        RedactionStyleConfig,
+        SuggestionAnnotationsResult,
+        SuggestionResultItem,
+        TriageResult,
+    )
+    from pdf_service.sessions import DocumentSession
+
+
+def status_for(exc: Exception) -> tuple[grpc.StatusCode, str]:
+    """Map an exception raised by core processing to a gRPC status."""
+    if isinstance(exc, ValueError):
+        return grpc.StatusCode.INVALID_ARGUMENT, str(exc)
+    if isinstance(exc, DocumentNotFoundError):
+        return grpc.StatusCode.NOT_FOUND, str(exc)
+    if isinstance(exc, (DocumentTooLargeError, AdmissionRejectedError)):
+        return grpc.StatusCode.RESOURCE_EXHAUSTED, str(exc)
+    if isinstance(exc, DeadlineExceeded):
+        return grpc.StatusCode.DEADLINE_EXCEEDED, str(exc)
+    if isinstance(exc, OperationCancelled):
+        return grpc.StatusCode.CANCELLED, str(exc)
+    return grpc.StatusCode.INTERNAL, f"Processing failed: {exc}"
+
+
+def error_metadata(exc: Exception) -> tuple[tuple[str, str], ...]:
+    """Trailing metadata to send with the status for ``exc``."""
+    if isinstance(exc, AdmissionRejectedError):
+        # Honoured by gRPC clients with a retry policy; others can read it.
+        return (("grpc-retry-pushback-ms", str(int(exc.retry_after * 1000))),)
+    return ()
+
+
+class Upload:
+    """Reassembles a client-streamed upload: an optional header, then chunks.
+
+    ``header`` starts as the default (empty) request and is replaced by the
+    header message if the client sends one. Chunks are appended to a single
+    buffer so the PDF is held in memory once.
+    """
+
+    def __init__(self, header: Any, max_size: int = 0):
+        self.header = header
+        self.pdf_data = bytearray()
+        self._max_size = max_size
+        self._started = False
+
+    def add(self, message: Any) -> None:
+        if message.WhichOneof("payload") == "header":
+            if self._started:
+                raise ValueError("Upload header must be the first message")
+            self.header = message.header
+            chunk = self.header.pdf_data
+            self.header.ClearField("pdf_data")
+        else:
+            chunk = message.chunk
+        self._started = True
+        self.pdf_data += chunk
+        if self._max_size and len(self.pdf_data) > self._max_size:
+            raise ValueError(f"Upload exceeds {self._max_size} bytes")
+
+
+def ocr_options(request: pb2.ExtractTextRequest) -> dict[str, Any] | None:
+    if not request.HasField("ocr"):
+        return None
+    return {
+        "enabled": request.ocr.enabled,
+        "language": request.ocr.language or "eng",
+        "force": request.ocr.force,
+    }
+
+
+def style_config(
+    request: pb2.ApplyRedactionsRequest | pb2.AutoRedactRequest,
+) -> RedactionStyleConfig | None:
+    if not request.HasField("style"):
+        return None
+    s = request.style
+    sc: RedactionStyleConfig = {}
+    if s.fill_color:
+        sc["fill_color"] = s.fill_color
+    if s.border_color:
+        sc["border_color"] = s.border_color
+    if s.text_color:
+        sc["text_color"] = s.text_color
+    if s.icon_png:
+        sc["icon_png"] = s.icon_png
+    if s.label_prefix:
+        sc["label_prefix"] = s.label_prefix
+    return sc
+
+
+def open_document_response(
+    session: DocumentSession, idle_ttl_seconds: float
+) -> pb2.OpenDocumentResponse:
+    return pb2.OpenDocumentResponse(
+        doc_id=session.doc_id,
+        page_count=len(session.doc),
+        file_size_bytes=session.size,
+        idle_ttl_seconds=int(idle_ttl_seconds),
+    )
+
+
+def document_info_response(result: DocumentInfoResult) -> pb2.DocumentInfoResponse:
+    return pb2.DocumentInfoResponse(
+        page_count=result["page_count"],
+        file_size_bytes=result["file_size_bytes"],
+        is_encrypted=result["is_encrypted"],
+        has_text_content=result["has_text_content"],
+        has_annotations=result["has_annotations"],
+        existing_annotation_count=result["existing_annotation_count"],
+        metadata=_metadata(result["metadata"]),
+        pages=_page_infos(result["pages"]),
+    )
+
+
+def document_info_chunks(
+    results: Generator[DocumentInfoResult],
+) -> Generator[pb2.DocumentInfoChunk]:
+    """StreamDocumentInfo messages for a streamed analysis.
+
+    ``results`` is the header result, then one result per batch of pages
+    (see ``ExecutionEngine.stream_document_info``); the summary is totalled
+    here so no batch is kept.
+    """
+    with contextlib.closing(results):
+        header = next(results)
+        yield pb2.DocumentInfoChunk(
+            header=pb2.DocumentInfoHeader(
+                page_count=header["page_count"],
+                file_size_bytes=header["file_size_bytes"],
+                is_encrypted=header["is_encrypted"],
+                metadata=_metadata(header["metadata"]),
+            )
+        )
+        has_text_content = False
+        annotation_count = 0
+        for batch in results:
+            has_text_content = has_text_content or batch["has_text_content"]
+            annotation_count += batch["existing_annotation_count"]
+            yield pb2.DocumentInfoChunk(
+                pages=pb2.PageInfoBatch(pages=_page_infos(batch["pages"]))
+            )
+        yield pb2.DocumentInfoChunk(
+            summary=pb2.DocumentInfoSummary(
+                has_text_content=has_text_content,
+                has_annotations=annotation_count > 0,
+                existing_annotation_count=annotation_count,
+            )
+        )
+
+
+def triage_response(result: TriageResult) -> pb2.TriageResponse:
+    return pb2.TriageResponse(
+        page_count=result["page_count"],
+        file_size_bytes=result["file_size_bytes"],
+        is_encrypted=result["is_encrypted"],
+        metadata=_metadata(result["metadata"]),
+        sampled_pages=_page_infos(result["sampled_pages"]),
+        estimated_scanned_ratio=result["estimated_scanned_ratio"],
+        confidence=result["confidence"],
+    )
+
+
+def _metadata(meta: DocumentMetadataResult) -> pb2.DocumentMetadata:
+    return pb2.DocumentMetadata(
+        title=meta["title"],
+        author=meta["author"],
+        producer=meta["producer"],
+        creator=meta["creator"],
+    )
+
+
+def _page_infos(pages: list[PageInfoResult]) -> list[pb2.PageInfo]:
+    return [
+        pb2.PageInfo(
+            page_number=p["page_number"],
+            has_text=p["has_text"],
+            has_images=p["has_images"],
+            likely_scanned=p["likely_scanned"],
+            width=p["width"],
+            height=p["height"],
+        )
+        for p in pages
+    ]
+
+
+def page_text_response(
+    page_result: PageTextResult, resume_token: str = ""
+) -> pb2.PageTextResponse:
+    packed = page_result["packed_blocks"]
+    if packed is not None:
+        return pb2.PageTextResponse(
+            page_number=page_result["page_number"],
+            text=page_result["text"],
+            resume_token=resume_token,
+            packed_blocks=pb2.PackedTextBlocks(
+                line_offsets=_packed("i", packed["line_offsets"]),
+                bboxes=_packed("f", packed["bboxes"]),
+                block_line_counts=_packed("i", packed["block_line_counts"]),
+            ),
+        )
+    blocks = [
+        pb2.TextBlock(
+            text=b["text"],
+            x0=b["x0"],
+            y0=b["y0"],
+            x1=b["x1"],
+            y1=b["y1"],
+            block_number=b["block_number"],
+            line_number=b["line_number"],
+        )
+        for b in page_result["blocks"]
+    ]
+    return pb2.PageTextResponse(
+        page_number=page_result["page_number"],
+        text=page_result["text"],
+        blocks=blocks,
+        resume_token=resume_token,
+    )
+
+
+def _packed(typecode: str, values: list[int] | list[float]) -> bytes:
+    """``values`` as a little-endian int32 ("i") or float32 ("f") array."""
+    packed = array.array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _suggestion_results(
+    results: list[SuggestionResultItem],
+) -> list[pb2.SuggestionResult]:
+    return [
+        pb2.SuggestionResult(
+            text=r["text"],
+            page=r["page"],
+            occurrences_found=r["occurrences_found"],
+        )
+        for r in results
+    ]
+
+
+def _redaction_log(result: RedactionResult) -> list[pb2.RedactionLogEntry]:
+    return [
+        pb2.RedactionLogEntry(
+            redaction_id=entry["redaction_id"],
+            page=entry["page"],
+            x0=entry["x0"],
+            y0=entry["y0"],
+            x1=entry["x1"],
+            y1=entry["y1"],
+        )
+        for entry in result["redaction_log"]
+    ]
+
+
+def suggestions_response(
+    result: SuggestionAnnotationsResult,
+) -> pb2.GetSuggestionAnnotationsResponse:
+    return pb2.GetSuggestionAnnotationsResponse(
+        xfdf=result["xfdf"],
+        total_suggestions=result["total_suggestions"],
+        results=_suggestion_results(result["results"]),
+    )
+
+
+def redactions_response(
+    result: RedactionResult, include_pdf: bool = True
+) -> pb2.ApplyRedactionsResponse:
+    return pb2.ApplyRedactionsResponse(
+        pdf_data=result["pdf_data"] if include_pdf else b"",
+        redactions_applied=result["redactions_applied"],
+        content_hash=result["content_hash"],
+        redaction_log=_redaction_log(result),
+    )
+
+
+def auto_redact_response(result: AutoRedactResult) -> pb2.AutoRedactResponse:
+    return pb2.AutoRedactResponse(
+        pdf_data=result["pdf_data"],
+        redactions_applied=result["redactions_applied"],
+        content_hash=result["content_hash"],
+        redaction_log=_redaction_log(result),
+        total_suggestions=result["total_suggestions"],
+        results=_suggestion_results(result["results"]),
+        page_count=result["page_count"],
+    )
+
+
+def redaction_chunks(
+    result: RedactionResult, chunk_size: int
+) -> Iterator[pb2.ApplyRedactionsUploadResponse]:
+    """Yield the redaction summary, then the redacted PDF in chunks."""
+    yield pb2.ApplyRedactionsUploadResponse(
+        summary=redactions_response(result, include_pdf=False)
+    )
+    pdf_data = result["pdf_data"]
+    for start in range(0, len(pdf_data), chunk_size):
+        yield pb2.ApplyRedactionsUploadResponse(
+            chunk=pdf_data[start : start + chunk_size]
+        )
@@ -1,166 +1,422 @@
 from __future__ import annotations
 
+import functools
+import queue
+import threading
+from concurrent import futures
 from typing import TYPE_CHECKING
 
 import grpc
 
-from pdf_service.core import annotation, document_info, redaction, text_extraction
+from pdf_service import profiling
+from pdf_service.admission import AdmissionController, estimate_cost
+from pdf_service.cache import ResultCache, result_key
+from pdf_service.config import ServiceConfig
+from pdf_service.core import (
+    annotation,
+    cancellation,
+    document_info,
+    redaction,
+    text_extraction,
+)
+from pdf_service.engine import InlineEngine
 from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
 from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc import batch, messages
+from pdf_service.grpc.extraction import Extraction
+from pdf_service.sessions import DocumentSession, DocumentStore
 
 if TYPE_CHECKING:
-    from pdf_service.core.types import RedactionStyleConfig
+    from pdf_service.engine import ExecutionEngine
+
+
+def _abort(context, exc):
+    context.set_trailing_metadata(messages.error_metadata(exc))
+    context.abort(*messages.status_for(exc))
+
+
+def _token(context):
+    """A token cancelled when the call ends early and expiring at its deadline."""
+    token = cancellation.CancellationToken.from_timeout(context.time_remaining())
+    if not context.add_callback(token.cancel):
+        token.cancel()
+    return token
 
 
 class PdfServiceServicer(pb2_grpc.PdfServiceServicer):
-    def GetDocumentInfo(self, request, context):
+    def __init__(
+        self,
+        engine: ExecutionEngine | None = None,
+        config: ServiceConfig | None = None,
+        documents: DocumentStore | None = None,
+        results: ResultCache | None = None,
+        admission: AdmissionController | None = None,
+    ):
+        self._engine = engine or InlineEngine()
+        self._config = config or ServiceConfig()
+        # Not ``or``: an empty store is falsy.
+        if documents is None:
+            documents = DocumentStore(
+                self._config.session_cache_bytes, self._config.session_ttl_seconds
+            )
+        self._documents = documents
+        self._results = results or ResultCache(
+            self._config.result_cache_bytes,
+            self._config.result_cache_dir,
+            self._config.result_cache_disk_bytes,
+        )
+        self._admission = admission or AdmissionController(
+            self._config.admission_memory_bytes,
+            self._config.admission_cpu_slots,
+            self._config.admission_queue_timeout,
+        )
+        self._batch_executor = futures.ThreadPoolExecutor(
+            max_workers=self._config.batch_concurrency, thread_name_prefix="batch"
+        )
+
+    def _admitted(self, source, fn, *args, **kwargs):
+        """Call ``fn`` once admission control admits work on ``source``."""
+        if not self._admission.enabled:
+            return fn(*args, **kwargs)
+        with self._admission.admit(estimate_cost(source)):
+            return fn(*args, **kwargs)
+
+    def _admitted_stream(self, source, fn, *args, **kwargs):
+        if not self._admission.enabled:
+            yield from fn(*args, **kwargs)
+            return
+        with self._admission.admit(estimate_cost(source)):
+            yield from fn(*args, **kwargs)
+
+    def _profile_requested(self, context):
+        return self._config.profiling_enabled and profiling.requested(
+            context.invocation_metadata()
+        )
+
+    def _run(self, context, source, fn, *args, **kwargs):
+        """``engine.run`` once admitted, under the profiler if requested."""
+        run = functools.partial(
+            cancellation.call_with,
+            _token(context),
+            self._admitted,
+            source,
+            self._engine.run,
+        )
+        if not self._profile_requested(context):
+            return run(fn, *args, **kwargs)
+        fn = profiling.profiled(fn, self._config.profile_dir)
+        result, summary = run(fn, *args, **kwargs)
+        context.set_trailing_metadata(profiling.summary_metadata(summary))
+        return result
+
+    def _run_document(self, context, source, bytes_fn, session_fn):
+        """``engine.run_document`` once admitted, profiled if requested."""
+        run_document = functools.partial(
+            cancellation.call_with,
+            _token(context),
+            self._admitted,
+            source,
+            self._engine.run_document,
+            source,
+        )
+        if not self._profile_requested(context):
+            return run_document(bytes_fn, session_fn)
+        directory = self._config.profile_dir
+        result, summary = run_document(
+            profiling.profiled(bytes_fn, directory),
+            profiling.profiled(session_fn, directory),
+        )
+        context.set_trailing_metadata(profiling.summary_metadata(summary))
+        return result
+
+    def _read_upload(self, request_iterator, header, context):
+        upload = messages.Upload(header, self._config.max_upload_size)
         try:
-            result = document_info.get_document_info(request.pdf_data)
+            for message in request_iterator:
+                upload.add(message)
         except ValueError as e:
             context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        return upload
+
+    def OpenDocument(self, request, context):
+        try:
+            session = cancellation.call_with(
+                _token(context),
+                self._admitted,
+                request.pdf_data,
+                self._documents.open,
+                request.pdf_data,
+            )
+        except Exception as e:
+            _abort(context, e)
             return
+
+        return messages.open_document_response(session, self._documents.ttl_seconds)
+
+    def CloseDocument(self, request, context):
+        return pb2.CloseDocumentResponse(closed=self._documents.close(request.doc_id))
+
+    def GetDocumentInfo(self, request, context):
+        return self._get_document_info(request, request.pdf_data, context)
+
+    def GetDocumentInfoUpload(self, request_iterator, context):
+        upload = self._read_upload(request_iterator, pb2.PdfInput(), context)
+        return self._get_document_info(upload.header, upload.pdf_data, context)
+
+    def _get_document_info(self, request, pdf_data, context):
+        try:
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            compute = functools.partial(
+                cancellation.call_with,
+                _token(context),
+                self._admitted,
+                source,
+                self._engine.analyze_document,
+                source,
+            )
+            if self._profile_requested(context):
+                # Profiled calls always do the work they are asked to measure,
+                # in one worker so a single profile covers it.
+                result = self._run_document(
+                    context,
+                    source,
+                    document_info.get_document_info,
+                    lambda s: document_info.analyze_document(s.doc, s.size),
+                )
+            else:
+                result = self._results.cached(
+                    lambda: result_key("document_info", source), compute
+                )
         except Exception as e:
-            context.abort(grpc.StatusCode.INTERNAL, f"Processing failed: {e}")
+            _abort(context, e)
             return
 
-        meta = result["metadata"]
-        pages = [
-            pb2.PageInfo(
-                page_number=p["page_number"],
-                has_text=p["has_text"],
-                has_images=p["has_images"],
-                likely_scanned=p["likely_scanned"],
-                width=p["width"],
-                height=p["height"],
+        return messages.document_info_response(result)
+
+    def StreamDocumentInfo(self, request, context):
+        try:
+            source = self._documents.resolve(request.doc_id, request.pdf_data)
+            results = self._admitted_stream(
+                source,
+                self._engine.stream_document_info,
+                source,
+                request.start_page,
+                request.end_page or None,
+                self._config.info_batch_pages,
             )
-            for p in result["pages"]
-        ]
-
-        return pb2.DocumentInfoResponse(
-            page_count=result["page_count"],
-            file_size_bytes=result["file_size_bytes"],
-            is_encrypted=result["is_encrypted"],
-            has_text_content=result["has_text_content"],
-            has_annotations=result["has_annotations"],
-            existing_annotation_count=result["existing_annotation_count"],
-            metadata=pb2.DocumentMetadata(
-                title=meta["title"],
-                author=meta["author"],
-                producer=meta["producer"],
-                creator=meta["creator"],
-            ),
-            pages=pages,
-        )
+            # Pages are analyzed as the client reads them; stop if it leaves.
+            yield from cancellation.bound_steps(
+                _token(context), messages.document_info_chunks(results)
+            )
+        except Exception as e:
+            _abort(context, e)
+
+    def TriageDocument(self, request, context):
+        sample_pages = request.sample_pages
+
+        try:
+            source = self._documents.resolve(request.doc_id, request.pdf_data)
+            result = self._run_document(
+                context,
+                source,
+                functools.partial(document_info.get_triage, sample_pages=sample_pages),
+                lambda s: document_info.triage_document(s.doc, s.size, sample_pages),
+            )
+        except Exception as e:
+            _abort(context, e)
+            return
+
+        return messages.triage_response(result)
 
     def ExtractText(self, request, context):
-        pages = list(request.pages) if request.pages else None
-        ocr_options = None
-        if request.HasField("ocr"):
-            ocr_options = {
-                "enabled": request.ocr.enabled,
-                "language": request.ocr.language or "eng",
-                "force": request.ocr.force,
-            }
+        yield from self._extract_text(request, request.pdf_data, context)
 
+    def ExtractTextUpload(self, request_iterator, context):
+        upload = self._read_upload(request_iterator, pb2.ExtractTextRequest(), context)
+        yield from self._extract_text(upload.header, upload.pdf_data, context)
+
+    def _extract_text(self, request, pdf_data, context):
         try:
-            for page_result in text_extraction.extract_text(
-                request.pdf_data,
-                pages,
-                request.include_word_positions,
-                ocr_options,
-            ):
-                blocks = [
-                    pb2.TextBlock(
-                        text=b["text"],
-                        x0=b["x0"],
-                        y0=b["y0"],
-                        x1=b["x1"],
-                        y1=b["y1"],
-                        block_number=b["block_number"],
-                        line_number=b["line_number"],
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            extraction = Extraction(self._engine, self._results, source, request)
+            if not extraction.pages:
+                return
+            if self._profile_requested(context):
+                # The profile covers every page, so extract them all up front.
+                page_results = self._run_document(
+                    context,
+                    source,
+                    functools.partial(
+                        text_extraction.extract_all_text,
+                        pages=extraction.pages,
+                        include_positions=extraction.include_positions,
+                        ocr_options=extraction.ocr_options,
+                        packed_positions=extraction.packed_positions,
+                    ),
+                    lambda s: list(
+                        text_extraction.extract_document_text(
+                            s.doc,
+                            extraction.pages,
+                            extraction.include_positions,
+                            extraction.ocr_options,
+                            extraction.packed_positions,
+                        )
+                    ),
+                )
+            else:
+                page_results = extraction.page_results(
+                    lambda pages: self._admitted_stream(
+                        source, extraction.extract, pages
                     )
-                    for b in page_result["blocks"]
-                ]
-                yield pb2.PageTextResponse(
-                    page_number=page_result["page_number"],
-                    text=page_result["text"],
-                    blocks=blocks,
                 )
-        except ValueError as e:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            # Pages are computed as the client reads them; stop if it leaves.
+            page_results = cancellation.bound_steps(_token(context), iter(page_results))
+            yield from extraction.responses(page_results)
         except Exception as e:
-            context.abort(grpc.StatusCode.INTERNAL, f"Processing failed: {e}")
+            _abort(context, e)
 
     def GetSuggestionAnnotations(self, request, context):
+        return self._get_suggestion_annotations(request, request.pdf_data, context)
+
+    def GetSuggestionAnnotationsUpload(self, request_iterator, context):
+        upload = self._read_upload(
+            request_iterator, pb2.GetSuggestionAnnotationsRequest(), context
+        )
+        return self._get_suggestion_annotations(upload.header, upload.pdf_data, context)
+
+    def _get_suggestion_annotations(self, request, pdf_data, context):
+        texts = list(request.texts)
+
         try:
-            result = annotation.get_suggestion_annotations(
-                request.pdf_data, list(request.texts)
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            result = self._run_document(
+                context,
+                source,
+                functools.partial(annotation.get_suggestion_annotations, texts=texts),
+                lambda s: annotation.search_document(s.doc, texts),
             )
-        except ValueError as e:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
-            return
         except Exception as e:
-            context.abort(grpc.StatusCode.INTERNAL, f"Processing failed: {e}")
+            _abort(context, e)
             return
 
-        results = [
-            pb2.SuggestionResult(
-                text=r["text"],
-                page=r["page"],
-                occurrences_found=r["occurrences_found"],
-            )
-            for r in result["results"]
-        ]
+        return messages.suggestions_response(result)
+
+    def ApplyRedactions(self, request, context):
+        result = self._apply_redactions(request, request.pdf_data, context)
+        return messages.redactions_response(result)
 
-        return pb2.GetSuggestionAnnotationsResponse(
-            xfdf=result["xfdf"],
-            total_suggestions=result["total_suggestions"],
-            results=results,
+    def ApplyRedactionsUpload(self, request_iterator, context):
+        upload = self._read_upload(
+            request_iterator, pb2.ApplyRedactionsRequest(), context
         )
+        result = self._apply_redactions(upload.header, upload.pdf_data, context)
+        yield from messages.redaction_chunks(result, self._config.stream_chunk_size)
 
-    def ApplyRedactions(self, request, context):
-        style_config: RedactionStyleConfig | None = None
-        if request.HasField("style"):
-            s = request.style
-            sc: RedactionStyleConfig = {}
-            if s.fill_color:
-                sc["fill_color"] = s.fill_color
-            if s.border_color:
-                sc["border_color"] = s.border_color
-            if s.text_color:
-                sc["text_color"] = s.text_color
-            if s.icon_png:
-                sc["icon_png"] = s.icon_png
-            if s.label_prefix:
-                sc["label_prefix"] = s.label_prefix
-            style_config = sc
+    def _apply_redactions(self, request, pdf_data, context):
+        try:
+            source = self._documents.resolve(request.doc_id, pdf_data)
+            # Redaction modifies the document, so sessions always work on a
+            # fresh copy opened from their bytes.
+            pdf_data = (
+                source.pdf_data if isinstance(source, DocumentSession) else source
+            )
+            return self._run(
+                context,
+                source,
+                redaction.apply_redactions,
+                pdf_data,
+                request.xfdf,
+                style_config=messages.style_config(request),
+            )
+        except Exception as e:
+            _abort(context, e)
 
+    def AutoRedact(self, request, context):
         try:
-            result = redaction.apply_redactions(
-                request.pdf_data, request.xfdf, style_config=style_config
+            source = self._documents.resolve(request.doc_id, request.pdf_data)
+            # Sessions are redacted on a fresh copy, as in ApplyRedactions.
+            pdf_data = (
+                source.pdf_data if isinstance(source, DocumentSession) else source
+            )
+            result = self._run(
+                context,
+                source,
+                redaction.auto_redact,
+                pdf_data,
+                list(request.texts),
+                style_config=messages.style_config(request),
             )
-        except ValueError as e:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
-            return
         except Exception as e:
-            context.abort(grpc.StatusCode.INTERNAL, f"Processing failed: {e}")
+            _abort(context, e)
             return
 
-        log_entries = [
-            pb2.RedactionLogEntry(
-                redaction_id=entry["redaction_id"],
-                page=entry["page"],
-                x0=entry["x0"],
-                y0=entry["y0"],
-                x1=entry["x1"],
-                y1=entry["y1"],
-            )
-            for entry in result["redaction_log"]
-        ]
-
-        return pb2.ApplyRedactionsResponse(
-            pdf_data=result["pdf_data"],
-            redactions_applied=result["redactions_applied"],
-            content_hash=result["content_hash"],
-            redaction_log=log_entries,
+        return messages.auto_redact_response(result)
+
+    def ProcessBatch(self, request_iterator, context):
+        token = _token(context)
+        done: queue.SimpleQueue[pb2.BatchResponse | batch.RequestsRead | None] = (
+            queue.SimpleQueue()
         )
+        # Items in flight or waiting to be sent for this stream; reading waits
+        # for a free slot, so a client that stops reading results also stops
+        # new items from starting.
+        slots = threading.Semaphore(self._config.batch_concurrency)
+        stopped = threading.Event()
+
+        def finished(item, future):
+            try:
+                response = future.result()
+            except Exception as e:
+                response = batch.error_response(item, e)
+            done.put(response)
+
+        def read():
+            submitted, error = 0, None
+            try:
+                for item in request_iterator:
+                    slots.acquire()
+                    if stopped.is_set():
+                        break
+                    future = self._batch_executor.submit(
+                        cancellation.call_with, token, self._batch_item, item
+                    )
+                    future.add_done_callback(functools.partial(finished, item))
+                    submitted += 1
+            except Exception as e:
+                error = e
+            finally:
+                done.put(batch.RequestsRead(submitted, error))
+
+        def cancelled():
+            done.put(None)
+
+        token.add_callback(cancelled)
+        threading.Thread(target=read, name="batch-reader", daemon=True).start()
+        sent, end = 0, None
+        try:
+            while end is None or sent < end.submitted:
+                response = done.get()
+                if response is None:
+                    return
+                if isinstance(response, batch.RequestsRead):
+                    end = response
+                    continue
+                yield response
+                sent += 1
+                slots.release()
+        finally:
+            token.remove_callback(cancelled)
+            # Wake the reader if it waits for a slot.
+            stopped.set()
+            slots.release()
+        if end.error is not None and context.is_active():
+            _abort(context, end.error)
+
+    def _batch_item(self, item):
+        try:
+            source = batch.source(self._documents, item)
+            return self._admitted(
+                source, batch.process, self._engine, self._results, item, source
+            )
+        except Exception as e:
+            return batch.error_response(item, e)
@@ -0,0 +1,386 @@
+"""In-process metrics with a Prometheus text exporter.
+
+Dependency-free counters, gauges and histograms, rendered in the Prometheus
+text exposition format by ``REGISTRY.render()`` and served on
+``/metrics`` by ``start_http_server``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import math
+import os
+import resource
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, TypeVar
+
+from pdf_service.core import stages
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    from pdf_service.admission import AdmissionController
+    from pdf_service.cache import ResultCache
+    from pdf_service.engine import ExecutionEngine
+    from pdf_service.sessions import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+LabelValues = tuple[str, ...]
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+SIZE_BUCKETS = tuple(float(4**n * 1024) for n in range(10))  # 1 KiB .. 256 GiB
+PAGE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+RATIO_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0)
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"'
+            for name, value in zip(self.labels, values, strict=True)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    """A counter incremented with inc(), or read from a callback at scrape time."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[LabelValues, float] = {}
+        self._callback: Callable[[], float] | None = None
+
+    def set_function(self, callback: Callable[[], float] | None) -> None:
+        self._callback = callback
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        if self._callback is not None:
+            yield f"{self.name} {_number(self._callback())}"
+            return
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{self._format_labels(key)} {_number(value)}"
+
+
+class Gauge(_Metric):
+    """A gauge read from ``callback`` at scrape time, or set explicitly."""
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        callback: Callable[[], float] | None = None,
+    ):
+        super().__init__(name, help_text)
+        self._callback = callback
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def set_function(self, callback: Callable[[], float] | None) -> None:
+        self._callback = callback
+
+    def value(self) -> float:
+        return self._callback() if self._callback is not None else self._value
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name} {_number(self.value())}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (last is +Inf), sum.
+        self._series: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def sum(self, **labels: str) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1][0] if series else 0.0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted(
+                (key, list(counts), total[0])
+                for key, (counts, total) in self._series.items()
+            )
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                le = 'le="' + ("+Inf" if bound == math.inf else _number(bound)) + '"'
+                yield f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(key)} {_number(total)}"
+            yield f"{self.name}_count{self._format_labels(key)} {cumulative}"
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if math.isfinite(value) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def resident_memory_bytes(pid: int | str = "self") -> float:
+    """Current resident set size of a process (this one by default)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if pid != "self":
+            return 0.0
+        # Not Linux: fall back to the peak (kilobytes on Linux, bytes on macOS).
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+REGISTRY = Registry()
+
+RPC_DURATION = REGISTRY.register(
+    Histogram(
+        "pdfcore_rpc_duration_seconds",
+        "RPC latency from first request message to final status.",
+        labels=("method", "code"),
+    )
+)
+RPC_REQUEST_BYTES = REGISTRY.register(
+    Histogram(
+        "pdfcore_rpc_request_bytes",
+        "Serialized size of all request messages of an RPC.",
+        labels=("method",),
+        buckets=SIZE_BUCKETS,
+    )
+)
+RPC_RESPONSE_BYTES = REGISTRY.register(
+    Histogram(
+        "pdfcore_rpc_response_bytes",
+        "Serialized size of all response messages of an RPC.",
+        labels=("method",),
+        buckets=SIZE_BUCKETS,
+    )
+)
+RPC_PAGES = REGISTRY.register(
+    Histogram(
+        "pdfcore_rpc_pages",
+        "Pages reported (document info) or streamed (ExtractText) per RPC.",
+        labels=("method",),
+        buckets=PAGE_BUCKETS,
+    )
+)
+RPC_COMPRESSION_RATIO = REGISTRY.register(
+    Histogram(
+        "pdfcore_rpc_compression_ratio",
+        "Compressed to uncompressed size of compressed response messages (sampled).",
+        labels=("method", "algorithm"),
+        buckets=RATIO_BUCKETS,
+    )
+)
+STAGE_DURATION = REGISTRY.register(
+    Histogram(
+        "pdfcore_stage_duration_seconds",
+        "Duration of core processing stages (per page for page-level stages).",
+        labels=("stage",),
+    )
+)
+RESIDENT_MEMORY = REGISTRY.register(
+    Gauge(
+        "pdfcore_process_resident_memory_bytes",
+        "Resident memory of the server process.",
+        callback=resident_memory_bytes,
+    )
+)
+WORKER_RESIDENT_MEMORY = REGISTRY.register(
+    Gauge(
+        "pdfcore_worker_resident_memory_bytes",
+        "Resident memory summed over execution engine worker processes.",
+    )
+)
+RESULT_CACHE_HITS = REGISTRY.register(
+    Counter("pdfcore_result_cache_hits_total", "Result cache hits (memory or disk).")
+)
+RESULT_CACHE_MISSES = REGISTRY.register(
+    Counter("pdfcore_result_cache_misses_total", "Result cache misses.")
+)
+RESULT_CACHE_BYTES = REGISTRY.register(
+    Gauge("pdfcore_result_cache_bytes", "Encoded size of the in-memory result cache.")
+)
+SESSIONS_OPEN = REGISTRY.register(
+    Gauge("pdfcore_sessions_open", "Open document sessions.")
+)
+SESSIONS_BYTES = REGISTRY.register(
+    Gauge("pdfcore_sessions_bytes", "PDF bytes held by open document sessions.")
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.register(
+    Gauge("pdfcore_admission_queue_depth", "Requests waiting for admission.")
+)
+ADMISSION_MEMORY_IN_USE = REGISTRY.register(
+    Gauge(
+        "pdfcore_admission_memory_in_use_bytes",
+        "Estimated working-set bytes of admitted requests.",
+    )
+)
+ADMISSION_CPU_IN_USE = REGISTRY.register(
+    Gauge("pdfcore_admission_cpu_in_use", "CPU slots held by admitted requests.")
+)
+OCR_QUEUE_DEPTH = REGISTRY.register(
+    Gauge("pdfcore_ocr_queue_depth", "Pages waiting for an OCR worker.")
+)
+
+
+def track_service(
+    engine: ExecutionEngine,
+    documents: DocumentStore,
+    results: ResultCache,
+    admission: AdmissionController,
+) -> None:
+    """Read the service components' state into gauges at scrape time."""
+    WORKER_RESIDENT_MEMORY.set_function(
+        lambda: sum(resident_memory_bytes(pid) for pid in engine.worker_pids())
+    )
+    RESULT_CACHE_HITS.set_function(lambda: results.hits + results.disk_hits)
+    RESULT_CACHE_MISSES.set_function(lambda: results.misses)
+    RESULT_CACHE_BYTES.set_function(lambda: results.stats()["bytes"])
+    SESSIONS_OPEN.set_function(lambda: len(documents))
+    SESSIONS_BYTES.set_function(lambda: documents.total_bytes)
+    ADMISSION_QUEUE_DEPTH.set_function(lambda: admission.queue_depth)
+    ADMISSION_MEMORY_IN_USE.set_function(lambda: admission.memory_in_use)
+    ADMISSION_CPU_IN_USE.set_function(lambda: admission.cpu_in_use)
+    OCR_QUEUE_DEPTH.set_function(engine.ocr_queue_depth)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_DURATION.observe(seconds, stage=name)
+
+
+stages.add_observer(observe_stage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        return None
+
+
+def start_http_server(port: int, host: str = "") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread; returns the HTTP server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics-http", daemon=True
+    )
+    thread.start()
+    logger.info("Metrics endpoint on port %d", server.server_address[1])
+    return server
@@ -0,0 +1,124 @@
+"""Opt-in per-request profiling.
+
+A client sends ``x-pdfcore-profile: 1`` and, if the server allows it, the
+core call runs under cProfile wherever it executes (gRPC thread or worker
+process). A compact JSON summary is returned in the
+``x-pdfcore-profile-summary`` trailer; the full profile can be written to a
+directory for ``pstats``/snakeviz.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any
+
+from pdf_service.core import stages
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+REQUEST_KEY = "x-pdfcore-profile"
+SUMMARY_KEY = "x-pdfcore-profile-summary"
+
+# Keep the summary well below gRPC's default 8 KiB metadata limit.
+TOP_FUNCTIONS = 10
+SLOWEST_PAGES = 10
+
+# cProfile hooks are interpreter-wide on recent Pythons, so only one call
+# per process is profiled at a time.
+_lock = threading.Lock()
+
+
+def requested(metadata: Iterable[tuple[str, Any]] | None) -> bool:
+    """Whether the call's invocation metadata asks for profiling."""
+    for key, value in metadata or ():
+        if key == REQUEST_KEY:
+            return str(value).strip().lower() in ("1", "true", "yes", "on")
+    return False
+
+
+def profiled(fn: Callable[..., Any], directory: str = "") -> Callable[..., Any]:
+    """Wrap ``fn`` so it returns ``(result, summary)``; picklable if fn is."""
+    return functools.partial(profile_call, fn, directory)
+
+
+def profile_call(
+    fn: Callable[..., Any], directory: str, /, *args: Any, **kwargs: Any
+) -> tuple[Any, dict[str, Any]]:
+    """Run ``fn`` under cProfile and summarize where the time went."""
+    profiler = cProfile.Profile()
+    with _lock, stages.collect_pages() as pages:
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+
+    summary = summarize(profiler, wall, cpu, pages)
+    if directory:
+        path = os.path.join(directory, f"pdfcore-{uuid.uuid4().hex}.prof")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(path)
+            summary["file"] = path
+        except OSError:
+            logger.warning("Failed to write profile to %s", path, exc_info=True)
+    return result, summary
+
+
+def summarize(
+    profiler: cProfile.Profile,
+    wall: float,
+    cpu: float,
+    pages: list[tuple[int, float]],
+) -> dict[str, Any]:
+    stats = pstats.Stats(profiler).stats  # type: ignore[attr-defined]
+    top = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)
+    functions = [
+        {
+            "fn": _function_label(*key),
+            "calls": calls,
+            "self_s": round(tottime, 6),
+            "cum_s": round(cumtime, 6),
+        }
+        for key, (_, calls, tottime, cumtime, _) in top[:TOP_FUNCTIONS]
+    ]
+
+    # A page can be visited more than once (e.g. one search per text).
+    per_page: dict[int, float] = {}
+    for number, seconds in pages:
+        per_page[number] = per_page.get(number, 0.0) + seconds
+    slowest = sorted(per_page.items(), key=lambda item: item[1], reverse=True)
+
+    return {
+        "wall_s": round(wall, 6),
+        "cpu_s": round(cpu, 6),
+        "pages": len(per_page),
+        "page_total_s": round(sum(per_page.values()), 6),
+        "slowest_pages": [[n, round(s, 6)] for n, s in slowest[:SLOWEST_PAGES]],
+        "functions": functions,
+    }
+
+
+def summary_metadata(summary: dict[str, Any]) -> tuple[tuple[str, str], ...]:
+    return ((SUMMARY_KEY, json.dumps(summary, separators=(",", ":"))),)
+
+
+def _function_label(filename: str, line: int, name: str) -> str:
+    if filename == "~":  # built-in or C function
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
@@ -1,14 +1,30 @@
+import asyncio
+import dataclasses
 import logging
 import signal
+import threading
 from concurrent import futures
 
 import grpc
 from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 from grpc_reflection.v1alpha import reflection
 
+from pdf_service import metrics
+from pdf_service.admission import AdmissionController
+from pdf_service.cache import ResultCache
 from pdf_service.config import ServiceConfig
+from pdf_service.engine import build_engine
 from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2, pdf_service_pb2_grpc
+from pdf_service.grpc.aio_servicer import AsyncPdfServiceServicer
+from pdf_service.grpc.interceptors import (
+    AsyncCompressionInterceptor,
+    AsyncMetricsInterceptor,
+    CompressionInterceptor,
+    MetricsInterceptor,
+)
 from pdf_service.grpc.servicer import PdfServiceServicer
+from pdf_service.sessions import DocumentStore
+from pdf_service.supervisor import Supervisor
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,55 +32,262 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SERVICE_NAME = "redactr.pdf.v1.PdfService"
+
+# How often a server process under the supervisor reads its shared health.
+SHARED_HEALTH_INTERVAL = 0.5
+
+
+def _server_options(config):
+    options = [
+        ("grpc.max_send_message_length", config.max_message_size),
+        ("grpc.max_receive_message_length", config.max_message_size),
+    ]
+    if config.server_processes > 1:
+        # The processes of a multi-process server all bind the same port.
+        options.append(("grpc.so_reuseport", 1))
+    return options
+
+
+def _interceptors(config, asynchronous=False):
+    interceptors = []
+    if config.metrics_port:
+        # RPC metrics are only recorded when something can scrape them.
+        interceptors.append(
+            AsyncMetricsInterceptor() if asynchronous else MetricsInterceptor()
+        )
+    if config.compression != "none":
+        compression = (
+            AsyncCompressionInterceptor if asynchronous else CompressionInterceptor
+        )
+        interceptors.append(
+            compression(config.compression, config.compression_min_bytes)
+        )
+    return interceptors
+
+
+def _enable_reflection(server):
+    service_names = (
+        pdf_service_pb2.DESCRIPTOR.services_by_name["PdfService"].full_name,
+        reflection.SERVICE_NAME,
+        health.SERVICE_NAME,
+    )
+    reflection.enable_server_reflection(service_names, server)
+
 
 def serve():
     config = ServiceConfig()
+    if config.server_processes > 1:
+        logger.info(
+            "Starting %d server processes on port %d",
+            config.server_processes,
+            config.port,
+        )
+        Supervisor(serve_process, config.server_processes).run()
+        return
+    _serve(config)
+
+
+def serve_process(index, shared_health):
+    """Entry point of server process ``index`` under the supervisor."""
+    _serve(_process_config(ServiceConfig(), index), index, shared_health)
+
+
+def _process_config(config, index):
+    """Configuration of server process ``index`` of ``config.server_processes``."""
+    processes = config.server_processes
+    # The worker pools are sized for the whole server, not for each process.
+    config = dataclasses.replace(
+        config,
+        process_workers=max(1, config.process_workers // processes),
+        ocr_workers=config.ocr_workers and max(1, config.ocr_workers // processes),
+    )
+    if config.metrics_port:
+        # Each process serves its own metrics.
+        config = dataclasses.replace(config, metrics_port=config.metrics_port + index)
+    return config
+
+
+def _serve(config, process_index=None, shared_health=None):
+    engine = build_engine(config)
+    documents = DocumentStore(
+        config.session_cache_bytes,
+        config.session_ttl_seconds,
+        process_index=process_index,
+    )
+    results = ResultCache(
+        config.result_cache_bytes,
+        config.result_cache_dir,
+        config.result_cache_disk_bytes,
+    )
+    admission = AdmissionController(
+        config.admission_memory_bytes,
+        config.admission_cpu_slots,
+        config.admission_queue_timeout,
+    )
+
+    metrics.track_service(engine, documents, results, admission)
+    if config.metrics_port:
+        metrics.start_http_server(config.metrics_port)
+
+    if config.async_server:
+        try:
+            asyncio.run(
+                _serve_async(
+                    config,
+                    engine,
+                    documents,
+                    results,
+                    admission,
+                    process_index,
+                    shared_health,
+                )
+            )
+        finally:
+            engine.shutdown()
+        return
 
     server = grpc.server(
         futures.ThreadPoolExecutor(max_workers=config.max_workers),
-        options=[
-            ("grpc.max_send_message_length", config.max_message_size),
-            ("grpc.max_receive_message_length", config.max_message_size),
-        ],
+        interceptors=_interceptors(config),
+        options=_server_options(config),
     )
 
     # Register PDF service
-    pdf_service_pb2_grpc.add_PdfServiceServicer_to_server(PdfServiceServicer(), server)
+    pdf_service_pb2_grpc.add_PdfServiceServicer_to_server(
+        PdfServiceServicer(engine, config, documents, results, admission), server
+    )
 
     # Health checking
     health_servicer = health.HealthServicer()
     health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
-    health_servicer.set(
-        "redactr.pdf.v1.PdfService",
-        health_pb2.HealthCheckResponse.SERVING,
-    )
+    health_servicer.set(SERVICE_NAME, health_pb2.HealthCheckResponse.SERVING)
 
     # Reflection
-    service_names = (
-        pdf_service_pb2.DESCRIPTOR.services_by_name["PdfService"].full_name,
-        reflection.SERVICE_NAME,
-        health.SERVICE_NAME,
-    )
-    reflection.enable_server_reflection(service_names, server)
+    _enable_reflection(server)
 
     listen_addr = f"[::]:{config.port}"
     server.add_insecure_port(listen_addr)
     server.start()
-    logger.info("pdf-core gRPC server listening on %s", listen_addr)
+    logger.info(
+        "pdf-core gRPC server listening on %s (%s engine)", listen_addr, config.engine
+    )
 
     # Graceful shutdown
+    stopping = threading.Event()
+    health_lock = threading.Lock()
+
     def shutdown(signum, frame):
         logger.info("Received signal %s, shutting down...", signum)
-        health_servicer.set(
-            "redactr.pdf.v1.PdfService",
-            health_pb2.HealthCheckResponse.NOT_SERVING,
-        )
+        with health_lock:
+            stopping.set()
+            health_servicer.set(
+                SERVICE_NAME, health_pb2.HealthCheckResponse.NOT_SERVING
+            )
         server.stop(grace=5)
 
+    if shared_health is not None:
+        threading.Thread(
+            target=_follow_shared_health,
+            args=(shared_health, process_index, health_servicer, stopping, health_lock),
+            name="shared-health",
+            daemon=True,
+        ).start()
+
     signal.signal(signal.SIGTERM, shutdown)
     signal.signal(signal.SIGINT, shutdown)
 
     server.wait_for_termination()
+    engine.shutdown()
+
+
+def _follow_shared_health(shared_health, index, health_servicer, stopping, lock):
+    """Report this process's health as the supervisor records it."""
+    serving = True
+    while True:
+        with lock:
+            if stopping.is_set():
+                return
+            if shared_health.serving(index) != serving:
+                serving = shared_health.serving(index)
+                health_servicer.set(SERVICE_NAME, _health_status(serving))
+        if stopping.wait(SHARED_HEALTH_INTERVAL):
+            return
+
+
+async def _follow_shared_health_async(shared_health, index, health_servicer):
+    serving = True
+    while True:
+        if shared_health.serving(index) != serving:
+            serving = shared_health.serving(index)
+            await health_servicer.set(SERVICE_NAME, _health_status(serving))
+        await asyncio.sleep(SHARED_HEALTH_INTERVAL)
+
+
+def _health_status(serving):
+    if serving:
+        return health_pb2.HealthCheckResponse.SERVING
+    return health_pb2.HealthCheckResponse.NOT_SERVING
+
+
+async def _serve_async(
+    config, engine, documents, results, admission, process_index, shared_health
+):
+    server = grpc.aio.server(
+        interceptors=_interceptors(config, asynchronous=True),
+        options=_server_options(config),
+    )
+    # Bounds concurrent core work; idle streams do not hold a thread.
+    executor = futures.ThreadPoolExecutor(max_workers=config.max_workers)
+
+    # Register PDF service
+    pdf_service_pb2_grpc.add_PdfServiceServicer_to_server(
+        AsyncPdfServiceServicer(
+            engine, executor, config, documents, results, admission
+        ),
+        server,
+    )
+
+    # Health checking
+    health_servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    await health_servicer.set(SERVICE_NAME, health_pb2.HealthCheckResponse.SERVING)
+
+    # Reflection
+    _enable_reflection(server)
+
+    listen_addr = f"[::]:{config.port}"
+    server.add_insecure_port(listen_addr)
+    await server.start()
+    logger.info(
+        "pdf-core gRPC aio server listening on %s (%s engine)",
+        listen_addr,
+        config.engine,
+    )
+
+    # Graceful shutdown
+    stop = asyncio.Event()
+
+    def request_shutdown(signum):
+        logger.info("Received signal %s, shutting down...", signum)
+        stop.set()
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, request_shutdown, signum)
+
+    following = None
+    if shared_health is not None:
+        following = asyncio.create_task(
+            _follow_shared_health_async(shared_health, process_index, health_servicer)
+        )
+
+    await stop.wait()
+    if following is not None:
+        following.cancel()
+    await health_servicer.set(SERVICE_NAME, health_pb2.HealthCheckResponse.NOT_SERVING)
+    await server.stop(grace=5)
+    executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
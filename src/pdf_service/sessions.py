@@ -0,0 +1,162 @@
+"""Server-side document sessions: upload a PDF once, run many RPCs on it."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from pdf_service.core.pdf import open_pdf
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    import fitz
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentNotFoundError(LookupError):
+    """The doc_id is unknown, closed, expired or evicted."""
+
+
+class DocumentTooLargeError(Exception):
+    """The document alone exceeds the session byte budget."""
+
+
+@dataclass(eq=False)
+class DocumentSession:
+    doc_id: str
+    pdf_data: bytes
+    doc: fitz.Document
+    sha256: str
+    last_used: float = 0.0
+    # fitz documents are not safe for concurrent use.
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def size(self) -> int:
+        return len(self.pdf_data)
+
+
+class DocumentStore:
+    """Open documents kept in memory with byte-budgeted LRU eviction.
+
+    The budget counts PDF bytes, which approximates the memory held by each
+    session. Sessions idle for longer than ``ttl_seconds`` expire. Evicted
+    documents are released once in-flight calls using them finish. In server
+    process ``process_index`` of a multi-process server, doc_ids start with
+    ``p<index>-`` so that one used on another process can be told apart
+    from an expired one.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        process_index: int | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._process_index = process_index
+        self._prefix = f"p{process_index}-" if process_index is not None else ""
+        self._lock = threading.Lock()
+        self._sessions: OrderedDict[str, DocumentSession] = OrderedDict()
+        self._total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def open(self, pdf_data: bytes) -> DocumentSession:
+        if len(pdf_data) > self.max_bytes:
+            raise DocumentTooLargeError(
+                f"Document ({len(pdf_data)} bytes) exceeds the session budget "
+                f"({self.max_bytes} bytes)"
+            )
+
+        pdf_data = bytes(pdf_data)
+        session = DocumentSession(
+            doc_id=self._prefix + uuid.uuid4().hex,
+            pdf_data=pdf_data,
+            doc=open_pdf(pdf_data),
+            sha256=hashlib.sha256(pdf_data).hexdigest(),
+        )
+
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session.last_used = now
+            self._sessions[session.doc_id] = session
+            self._total_bytes += session.size
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._sessions.popitem(last=False)
+                self._total_bytes -= evicted.size
+                logger.info("Evicted document session %s", evicted.doc_id)
+
+        logger.info(
+            "Opened document session %s (%d bytes, %d pages)",
+            session.doc_id,
+            session.size,
+            len(session.doc),
+        )
+        return session
+
+    def get(self, doc_id: str) -> DocumentSession:
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session = self._sessions.get(doc_id)
+            if session is None:
+                raise DocumentNotFoundError(self._not_found_message(doc_id))
+            self._sessions.move_to_end(doc_id)
+            session.last_used = now
+            return session
+
+    def close(self, doc_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(doc_id, None)
+            if session is None:
+                return False
+            self._total_bytes -= session.size
+            return True
+
+    def resolve(self, doc_id: str, pdf_data: bytes) -> bytes | DocumentSession:
+        """Return the session for ``doc_id`` if set, otherwise ``pdf_data``."""
+        if not doc_id:
+            return pdf_data
+        if pdf_data:
+            raise ValueError("Set either pdf_data or doc_id, not both")
+        return self.get(doc_id)
+
+    def _not_found_message(self, doc_id: str) -> str:
+        owner, _, rest = doc_id.partition("-")
+        if self._prefix and rest and owner + "-" != self._prefix:
+            return (
+                f"doc_id {doc_id} was opened by server process "
+                f"{owner.removeprefix('p')}, not by this one "
+                f"({self._process_index}); with SERVER_PROCESSES > 1, use a "
+                "doc_id only on the channel that opened it"
+            )
+        return f"Unknown or expired doc_id: {doc_id}"
+
+    def _expire(self, now: float) -> None:
+        # The dict is in least-recently-used order, so stop at the first
+        # session that is still fresh.
+        while self._sessions:
+            doc_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.ttl_seconds:
+                break
+            del self._sessions[doc_id]
+            self._total_bytes -= session.size
+            logger.info("Expired document session %s", doc_id)
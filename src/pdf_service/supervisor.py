@@ -0,0 +1,166 @@
+"""Multi-process serving: N server processes sharing one port.
+
+Each child runs a complete gRPC server bound to the same port with
+``SO_REUSEPORT``, so the kernel spreads incoming connections across them.
+The supervisor forwards SIGTERM/SIGINT to every child, waits for their
+graceful shutdown and restarts children that exit unexpectedly. A
+``SharedHealth`` holds one flag per child, set by the supervisor: a
+restarted child reports NOT_SERVING until it has stayed up, while the other
+children keep serving.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from multiprocessing.context import SpawnContext
+    from multiprocessing.process import BaseProcess
+    from types import FrameType
+
+logger = logging.getLogger(__name__)
+
+# How long children get to finish in-flight calls after SIGTERM (the server's
+# own grace period plus margin) before they are killed.
+SHUTDOWN_TIMEOUT = 10.0
+# Minimum delay between restarts of the same child, to avoid crash loops.
+RESTART_BACKOFF = 1.0
+
+
+class SharedHealth:
+    """Whether each server process is up, one flag per process."""
+
+    def __init__(self, context: SpawnContext, processes: int) -> None:
+        self._values = context.RawArray("b", [1] * processes)
+
+    def serving(self, index: int) -> bool:
+        return bool(self._values[index])
+
+    @property
+    def all_serving(self) -> bool:
+        return all(self._values)
+
+    def set(self, index: int, serving: bool) -> None:
+        self._values[index] = int(serving)
+
+
+class Supervisor:
+    """Starts ``processes`` children running ``target(index, health)``.
+
+    A child's flag in ``health`` is cleared when it exits unexpectedly, and
+    set again once its replacement has been running for ``restart_backoff``.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[int, SharedHealth], None],
+        processes: int,
+        shutdown_timeout: float = SHUTDOWN_TIMEOUT,
+        restart_backoff: float = RESTART_BACKOFF,
+    ):
+        self._target = target
+        self._processes = processes
+        self._shutdown_timeout = shutdown_timeout
+        self._restart_backoff = restart_backoff
+        # spawn, like the process engine: children start without inherited
+        # gRPC or MuPDF state.
+        self._context = multiprocessing.get_context("spawn")
+        self.health = SharedHealth(self._context, processes)
+        self._children: dict[int, BaseProcess] = {}
+        self._started: dict[int, float] = {}
+        self._stopping = False
+        self.restarts = 0
+
+    @property
+    def children(self) -> dict[int, BaseProcess]:
+        return dict(self._children)
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=self._target, args=(index, self.health), name=f"pdf-core-{index}"
+        )
+        process.start()
+        self._children[index] = process
+        self._started[index] = time.monotonic()
+        logger.info("Started server process %d (pid %s)", index, process.pid)
+
+    def stop(self, signum: int = signal.SIGTERM) -> None:
+        """Ask every child to shut down gracefully."""
+        self._stopping = True
+        for process in self._children.values():
+            if process.is_alive() and process.pid is not None:
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(process.pid, signum)
+
+    def _handle_signal(self, signum: int, frame: FrameType | None) -> None:
+        logger.info("Received signal %s, stopping server processes...", signum)
+        self.stop(signum)
+
+    def run(self, install_signal_handlers: bool = True) -> None:
+        """Start the children and supervise them until they have all exited."""
+        if install_signal_handlers:
+            signal.signal(signal.SIGTERM, self._handle_signal)
+            signal.signal(signal.SIGINT, self._handle_signal)
+        for index in range(self._processes):
+            self._start(index)
+
+        while not self._stopping:
+            sentinels = [p.sentinel for p in self._children.values()]
+            # Poll faster while waiting to report a process healthy again.
+            timeout = (
+                1.0 if self.health.all_serving else min(1.0, self._restart_backoff)
+            )
+            wait(sentinels, timeout=timeout)
+            if self._stopping:
+                break
+            self._update_health()
+            for index, process in list(self._children.items()):
+                if process.is_alive():
+                    continue
+                self.health.set(index, False)
+                uptime = time.monotonic() - self._started[index]
+                logger.error(
+                    "Server process %d (pid %s) exited with code %s, restarting",
+                    index,
+                    process.pid,
+                    process.exitcode,
+                )
+                del self._children[index]
+                process.close()
+                if uptime < self._restart_backoff:
+                    time.sleep(self._restart_backoff - uptime)
+                if self._stopping:
+                    break
+                self.restarts += 1
+                self._start(index)
+
+        self._join()
+
+    def _update_health(self) -> None:
+        now = time.monotonic()
+        for index, process in self._children.items():
+            if self.health.serving(index) or not process.is_alive():
+                continue
+            if now - self._started[index] >= self._restart_backoff:
+                logger.info("Server process %d is up again", index)
+                self.health.set(index, True)
+
+    def _join(self) -> None:
+        # Again, for a child started while the signal was being forwarded.
+        self.stop()
+        deadline = time.monotonic() + self._shutdown_timeout
+        for index, process in self._children.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Server process %d did not stop, killing it", index)
+                process.kill()
+                process.join()
+        logger.info("All server processes stopped")
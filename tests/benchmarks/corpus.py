@@ -0,0 +1,151 @@
+"""Synthetic benchmark corpus.
+
+Scaled-up versions of the ``tests/conftest.py`` fixtures in the shapes real
+traffic has: long text documents, image-only scans, mixed documents, dense
+tables and XFDF files with thousands of highlights. Generation is seeded, so
+the same sizes always produce the same content.
+"""
+
+from __future__ import annotations
+
+import random
+import xml.etree.ElementTree as ET
+
+import fitz
+
+from pdf_service.core.annotation import XFDF_NS
+
+FIRST_NAMES = ("John", "Maria", "Wei", "Fatima", "Olga", "Kwame", "Aiko", "Luis")
+LAST_NAMES = ("Smith", "Garcia", "Chen", "Khan", "Ivanova", "Mensah", "Sato")
+PROSE = (
+    "agreement party shall payment invoice account pursuant thereof notice "
+    "services period amount confidential hereby clause records employee "
+    "department schedule total balance report review signature dated"
+)
+WORDS = PROSE.split()
+
+MARGIN = 72
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _line(rng: random.Random) -> str:
+    """A line of filler prose, sometimes carrying PII to search for."""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 12))]
+    roll = rng.random()
+    if roll < 0.15:
+        words.insert(rng.randrange(len(words)), _name(rng))
+    elif roll < 0.2:
+        ssn = f"{rng.randint(100, 899)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}"
+        words.insert(rng.randrange(len(words)), "SSN: " + ssn)
+    return " ".join(words)
+
+
+def _text_page(doc: fitz.Document, rng: random.Random, lines: int) -> fitz.Page:
+    page = doc.new_page()
+    text = "\n".join(_line(rng) for _ in range(lines))
+    page.insert_text((MARGIN, MARGIN), text, fontsize=10, lineheight=1.4)
+    return page
+
+
+def _scan_of(page: fitz.Page, dpi: int) -> bytes:
+    """Rasterize a page to a grayscale PNG, like a scanner would."""
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes("png")
+
+
+def text_document(pages: int = 1000, lines: int = 45, seed: int = 0) -> bytes:
+    """Long born-digital document with a full text layer on every page."""
+    rng = random.Random(seed)
+    with fitz.open() as doc:
+        for _ in range(pages):
+            _text_page(doc, rng, lines)
+        return doc.tobytes(garbage=1, deflate=True)
+
+
+def scanned_document(pages: int = 20, dpi: int = 150, seed: int = 0) -> bytes:
+    """Image-only pages: rendered text with no text layer."""
+    rng = random.Random(seed)
+    with fitz.open() as source, fitz.open() as doc:
+        for _ in range(pages):
+            png = _scan_of(_text_page(source, rng, 45), dpi)
+            page = doc.new_page()
+            page.insert_image(page.rect, stream=png)
+        return doc.tobytes(garbage=1, deflate=True)
+
+
+def mixed_document(pages: int = 100, scanned_every: int = 4, seed: int = 0) -> bytes:
+    """Text pages interleaved with scans and text pages carrying a figure."""
+    rng = random.Random(seed)
+    with fitz.open() as source, fitz.open() as doc:
+        for number in range(pages):
+            if number % scanned_every == scanned_every - 1:
+                png = _scan_of(_text_page(source, rng, 45), 100)
+                page = doc.new_page()
+                page.insert_image(page.rect, stream=png)
+                continue
+            page = _text_page(doc, rng, 30)
+            if number % 2:
+                figure = _scan_of(_text_page(source, rng, 10), 72)
+                page.insert_image(fitz.Rect(72, 520, 540, 760), stream=figure)
+        return doc.tobytes(garbage=1, deflate=True)
+
+
+def table_document(
+    pages: int = 50, rows: int = 40, columns: int = 8, seed: int = 0
+) -> bytes:
+    """Ruled tables with a short value in every cell (many small spans)."""
+    rng = random.Random(seed)
+    with fitz.open() as doc:
+        for _ in range(pages):
+            page = doc.new_page()
+            width = (page.rect.width - 2 * MARGIN) / columns
+            height = (page.rect.height - 2 * MARGIN) / rows
+            shape = page.new_shape()
+            writer = fitz.TextWriter(page.rect)
+            for row in range(rows):
+                for column in range(columns):
+                    x = MARGIN + column * width
+                    y = MARGIN + row * height
+                    shape.draw_rect(fitz.Rect(x, y, x + width, y + height))
+                    if column == 0:
+                        value = _name(rng).split()[1]
+                    else:
+                        value = f"{rng.uniform(0, 99999):,.2f}"
+                    writer.append((x + 2, y + height - 3), value, fontsize=6)
+            shape.finish(color=(0, 0, 0), width=0.3)
+            shape.commit()
+            writer.write_text(page)
+        return doc.tobytes(garbage=1, deflate=True)
+
+
+def highlights_xfdf(
+    pdf_data: bytes,
+    count: int = 10_000,
+    seed: int = 0,
+    width: tuple[float, float] = (20.0, 160.0),
+    height: tuple[float, float] = (8.0, 24.0),
+) -> str:
+    """XFDF with ``count`` highlights spread over the pages of ``pdf_data``.
+
+    Sizes cover all branding tiers (small, medium and large frames).
+    """
+    rng = random.Random(seed)
+    with fitz.open(stream=pdf_data, filetype="pdf") as doc:
+        sizes = [(page.rect.width, page.rect.height) for page in doc]
+
+    root = ET.Element("xfdf", xmlns=XFDF_NS)
+    annots = ET.SubElement(root, "annots")
+    for index in range(count):
+        page_num = index % len(sizes)
+        page_width, page_height = sizes[page_num]
+        w = rng.uniform(*width)
+        h = rng.uniform(*height)
+        x0 = rng.uniform(MARGIN, page_width - MARGIN - w)
+        y0 = rng.uniform(MARGIN, page_height - MARGIN - h)
+        highlight = ET.SubElement(annots, "highlight")
+        highlight.set("name", f"bench-{index}")
+        highlight.set("page", str(page_num))
+        highlight.set("rect", f"{x0:.2f},{y0:.2f},{x0 + w:.2f},{y0 + h:.2f}")
+    return ET.tostring(root, encoding="unicode", xml_declaration=True)
@@ -0,0 +1,253 @@
+"""Benchmark runner for the core functions.
+
+    python -m tests.benchmarks.run [--full] [--save] [--filter NAME]
+
+Each benchmark runs ``--repeat`` times on the synthetic corpus and its
+median is compared with the recorded baseline; the run fails (exit 1) when a
+benchmark is more than ``--threshold`` slower. Baselines are machine-specific,
+so record them with ``--save`` on the machine that compares against them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import fitz
+
+from pdf_service.core import text_extraction
+from pdf_service.core.annotation import get_suggestion_annotations
+from pdf_service.core.branding import BrandingStyle, draw_branding
+from pdf_service.core.document_info import get_document_info
+from pdf_service.core.ocr import ocr_page
+from pdf_service.core.redaction import apply_redactions
+from tests.benchmarks import corpus
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+DEFAULT_BASELINE = ".benchmarks/baseline.json"
+DEFAULT_THRESHOLD = 0.25
+# Differences below this are noise, whatever the ratio.
+MIN_DELTA_SECONDS = 0.005
+
+# Corpus sizes: "full" is the realistic shape, "quick" a tenth of it.
+SCALES = {"full": 1.0, "quick": 0.1}
+
+BRANDED_STYLE = {"fill_color": "#005941", "border_color": "#00A676"}
+SEARCH_TEXTS = ["John Smith", "Maria Garcia", "SSN:"]
+
+
+class Corpus:
+    """Benchmark inputs, generated on first use."""
+
+    def __init__(self, scale: float):
+        self.scale = scale
+
+    def size(self, full: int) -> int:
+        return max(1, round(full * self.scale))
+
+    @functools.cached_property
+    def text(self) -> bytes:
+        return corpus.text_document(pages=self.size(1000))
+
+    @functools.cached_property
+    def scanned(self) -> bytes:
+        return corpus.scanned_document(pages=self.size(20))
+
+    @functools.cached_property
+    def mixed(self) -> bytes:
+        return corpus.mixed_document(pages=self.size(100))
+
+    @functools.cached_property
+    def tables(self) -> bytes:
+        return corpus.table_document(pages=self.size(50))
+
+    @functools.cached_property
+    def highlights(self) -> str:
+        return corpus.highlights_xfdf(self.text, count=self.size(10_000))
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    fn: Callable[[Corpus], object]
+
+
+def _draw_branding(inputs: Corpus) -> None:
+    style = BrandingStyle.from_config(BRANDED_STYLE)
+    assert style is not None
+    count = inputs.size(1000)
+    with fitz.open() as doc:
+        page = doc.new_page()
+        for index in range(count):
+            x = 72 + (index % 4) * 120
+            y = 72 + (index // 4 % 30) * 22
+            draw_branding(
+                page, fitz.Rect(x, y, x + 100, y + 18), f"{index:012x}", style
+            )
+
+
+def _extract(
+    name: str, include_positions: bool = False, ocr: bool = False
+) -> Callable[[Corpus], object]:
+    ocr_options = {"enabled": True, "language": "eng", "force": True} if ocr else None
+
+    def run(inputs: Corpus) -> object:
+        return text_extraction.extract_all_text(
+            getattr(inputs, name), None, include_positions, ocr_options
+        )
+
+    return run
+
+
+BENCHMARKS = [
+    Benchmark("document_info.text", lambda c: get_document_info(c.text)),
+    Benchmark("document_info.scanned", lambda c: get_document_info(c.scanned)),
+    Benchmark("document_info.mixed", lambda c: get_document_info(c.mixed)),
+    Benchmark("document_info.tables", lambda c: get_document_info(c.tables)),
+    Benchmark("extract_text.text", _extract("text")),
+    Benchmark("extract_text.text_positions", _extract("text", include_positions=True)),
+    Benchmark("extract_text.mixed", _extract("mixed")),
+    Benchmark("extract_text.tables_positions", _extract("tables", True)),
+    Benchmark("extract_text.scanned_ocr", _extract("scanned", ocr=True)),
+    Benchmark(
+        "suggestions.text",
+        lambda c: get_suggestion_annotations(c.text, SEARCH_TEXTS),
+    ),
+    Benchmark(
+        "redactions.highlights", lambda c: apply_redactions(c.text, c.highlights)
+    ),
+    Benchmark(
+        "redactions.highlights_branded",
+        lambda c: apply_redactions(c.text, c.highlights, BRANDED_STYLE),
+    ),
+    Benchmark("branding.draw", _draw_branding),
+]
+
+
+def tesseract_available() -> bool:
+    with fitz.open() as doc:
+        try:
+            ocr_page(doc.new_page())
+        except RuntimeError:
+            return False
+    return True
+
+
+def measure(benchmark: Benchmark, inputs: Corpus, repeat: int) -> dict[str, Any]:
+    benchmark.fn(inputs)  # warm up and generate the inputs it needs
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        benchmark.fn(inputs)
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_s": round(statistics.median(timings), 6),
+        "min_s": round(min(timings), 6),
+        "runs": repeat,
+    }
+
+
+def compare(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    threshold: float,
+) -> list[str]:
+    """Names of benchmarks slower than baseline by more than ``threshold``."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        current, reference = result["median_s"], previous["median_s"]
+        if (
+            current > reference * (1 + threshold)
+            and current - reference > MIN_DELTA_SECONDS
+        ):
+            regressions.append(name)
+    return regressions
+
+
+def environment(scale: str) -> dict[str, Any]:
+    return {
+        "scale": scale,
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--full", action="store_true", help="use the full-size corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--filter", default="", help="run benchmarks matching this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save", action="store_true", help="record results as the new baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed slowdown as a fraction of the baseline (default 0.25)",
+    )
+    args = parser.parse_args(argv)
+
+    scale = "full" if args.full else "quick"
+    inputs = Corpus(SCALES[scale])
+    selected = [b for b in BENCHMARKS if args.filter in b.name]
+    if not tesseract_available():
+        print("Tesseract not installed: skipping OCR benchmarks")
+        selected = [b for b in selected if not b.name.endswith("_ocr")]
+
+    baseline: dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            recorded = json.load(f)
+        if recorded["environment"]["scale"] == scale:
+            baseline = recorded["results"]
+        else:
+            print(f"Baseline is for the {recorded['environment']['scale']} corpus")
+
+    results: dict[str, dict[str, Any]] = {}
+    print(f"{'benchmark':<36} {'median':>10} {'min':>10} {'change':>10}")
+    for benchmark in selected:
+        result = results[benchmark.name] = measure(benchmark, inputs, args.repeat)
+        reference = baseline.get(benchmark.name, {}).get("median_s")
+        change = f"{result['median_s'] / reference - 1:+.0%}" if reference else "-"
+        print(
+            f"{benchmark.name:<36} {result['median_s']:>9.3f}s"
+            f" {result['min_s']:>9.3f}s {change:>10}",
+            flush=True,
+        )
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            # Keep baselines of benchmarks that were filtered out of this run.
+            merged = {**baseline, **results}
+            json.dump(
+                {"environment": environment(scale), "results": merged}, f, indent=2
+            )
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name in regressions:
+        print(f"REGRESSION: {name} is more than {args.threshold:.0%} slower")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 import fitz
 import pytest
 
+from pdf_service.core import ocr
+
 SENSITIVE_TEXT = (
     "Name: John Smith\n"
     "SSN: 123-45-6789\n"
@@ -168,3 +170,48 @@ def large_text_pdf() -> bytes:
     data = doc.tobytes()
     doc.close()
     return data
+
+
+@pytest.fixture
+def edge_case_pdf() -> bytes:
+    """Pages where only some kinds of text and annotations count."""
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "   ")
+    doc.new_page().insert_text((72, -100), "Above the page")
+    doc.new_page().insert_text((72, 72), "Invisible OCR layer", render_mode=3)
+    doc.new_page().insert_text((72, 72), "Outlined", render_mode=1)
+    rotated = doc.new_page()
+    rotated.set_rotation(90)
+    rotated.insert_text((72, 72), "Rotated")
+    page = doc.new_page()
+    page.add_freetext_annot(fitz.Rect(72, 72, 200, 100), "Note")
+    page.add_text_annot((10, 10), "Comment")
+    page.insert_link(
+        {"kind": fitz.LINK_URI, "from": fitz.Rect(0, 0, 10, 10), "uri": "https://x"}
+    )
+    widget = fitz.Widget()
+    widget.field_name = "name"
+    widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+    widget.rect = fitz.Rect(72, 300, 200, 320)
+    widget.field_value = "Value"
+    doc.new_page().add_widget(widget)
+    pdf_data = doc.tobytes()
+    doc.close()
+    return pdf_data
+
+
+@pytest.fixture
+def fake_tesseract(monkeypatch):
+    """Replaces Tesseract with a text layer reading "Recognized"; counts calls."""
+    calls = []
+
+    def recognize(pix, language):
+        calls.append(language)
+        with fitz.open() as doc:
+            page = doc.new_page(width=pix.width, height=pix.height)
+            page.insert_text((100, 100), "Recognized", render_mode=3)
+            return doc.tobytes()
+
+    monkeypatch.setattr(ocr, "_recognize", recognize)
+    yield calls
+    ocr.set_cache(None)
@@ -0,0 +1,78 @@
+import grpc
+
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+
+
+class TestProcessBatch:
+    def test_mixed_operations(self, stub, text_pdf, multi_page_pdf):
+        suggestions = stub.GetSuggestionAnnotations(
+            pb2.GetSuggestionAnnotationsRequest(pdf_data=text_pdf, texts=["John Smith"])
+        )
+        requests = [
+            pb2.BatchRequest(
+                correlation_id="info", info=pb2.PdfInput(pdf_data=multi_page_pdf)
+            ),
+            pb2.BatchRequest(
+                correlation_id="extract",
+                extract=pb2.ExtractTextRequest(pdf_data=multi_page_pdf, pages=[1]),
+            ),
+            pb2.BatchRequest(
+                correlation_id="suggest",
+                suggest=pb2.GetSuggestionAnnotationsRequest(
+                    pdf_data=text_pdf, texts=["John Smith"]
+                ),
+            ),
+            pb2.BatchRequest(
+                correlation_id="redact",
+                redact=pb2.ApplyRedactionsRequest(
+                    pdf_data=text_pdf, xfdf=suggestions.xfdf
+                ),
+            ),
+            pb2.BatchRequest(
+                correlation_id="auto",
+                auto_redact=pb2.AutoRedactRequest(
+                    pdf_data=text_pdf, texts=["John Smith"]
+                ),
+            ),
+            pb2.BatchRequest(
+                correlation_id="triage",
+                triage=pb2.TriageRequest(pdf_data=multi_page_pdf, sample_pages=1),
+            ),
+        ]
+        results = {r.correlation_id: r for r in stub.ProcessBatch(iter(requests))}
+        assert set(results) == {
+            "info",
+            "extract",
+            "suggest",
+            "redact",
+            "auto",
+            "triage",
+        }
+        assert all(r.code == grpc.StatusCode.OK.value[0] for r in results.values())
+        assert results["info"].info.page_count == 3
+        assert [p.page_number for p in results["extract"].extract.pages] == [1]
+        assert results["suggest"].suggest.total_suggestions >= 1
+        assert results["redact"].redact.redactions_applied >= 1
+        assert results["auto"].auto_redact.redactions_applied == (
+            results["redact"].redact.redactions_applied
+        )
+        assert [p.page_number for p in results["triage"].triage.sampled_pages] == [1]
+
+    def test_failed_item_does_not_fail_batch(self, stub, text_pdf):
+        requests = [
+            pb2.BatchRequest(correlation_id="bad", info=pb2.PdfInput(pdf_data=b"x")),
+            pb2.BatchRequest(correlation_id="none"),
+            pb2.BatchRequest(
+                correlation_id="good", info=pb2.PdfInput(pdf_data=text_pdf)
+            ),
+        ]
+        results = {r.correlation_id: r for r in stub.ProcessBatch(iter(requests))}
+        invalid = grpc.StatusCode.INVALID_ARGUMENT.value[0]
+        assert results["bad"].code == invalid
+        assert results["bad"].error
+        assert results["none"].code == invalid
+        assert results["good"].code == 0
+        assert results["good"].info.page_count == 1
+
+    def test_empty_batch(self, stub):
+        assert list(stub.ProcessBatch(iter([]))) == []
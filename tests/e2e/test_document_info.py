@@ -32,3 +32,50 @@ class TestGetDocumentInfo:
         with pytest.raises(grpc.RpcError) as exc_info:
             stub.GetDocumentInfo(pb2.PdfInput(pdf_data=b""))
         assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+
+class TestStreamDocumentInfo:
+    def test_streams_header_pages_and_summary(self, stub, multi_page_pdf):
+        request = pb2.StreamDocumentInfoRequest(pdf_data=multi_page_pdf)
+        chunks = list(stub.StreamDocumentInfo(request))
+        assert chunks[0].WhichOneof("chunk") == "header"
+        assert chunks[0].header.page_count == 3
+        assert chunks[-1].WhichOneof("chunk") == "summary"
+        assert chunks[-1].summary.has_text_content is True
+        pages = [p for c in chunks[1:-1] for p in c.pages.pages]
+        assert [p.page_number for p in pages] == [0, 1, 2]
+
+    def test_page_range(self, stub, multi_page_pdf):
+        request = pb2.StreamDocumentInfoRequest(
+            pdf_data=multi_page_pdf, start_page=1, end_page=2
+        )
+        chunks = list(stub.StreamDocumentInfo(request))
+        pages = [p for c in chunks[1:-1] for p in c.pages.pages]
+        assert [p.page_number for p in pages] == [1]
+
+    def test_invalid_range(self, stub, multi_page_pdf):
+        request = pb2.StreamDocumentInfoRequest(pdf_data=multi_page_pdf, start_page=5)
+        with pytest.raises(grpc.RpcError) as exc_info:
+            list(stub.StreamDocumentInfo(request))
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+
+class TestTriageDocument:
+    def test_metadata_only(self, stub, multi_page_pdf):
+        response = stub.TriageDocument(pb2.TriageRequest(pdf_data=multi_page_pdf))
+        assert response.page_count == 3
+        assert not response.sampled_pages
+        assert response.confidence == 0
+
+    def test_sampled_estimate(self, stub, mixed_pdf):
+        response = stub.TriageDocument(
+            pb2.TriageRequest(pdf_data=mixed_pdf, sample_pages=2)
+        )
+        assert [p.page_number for p in response.sampled_pages] == [0, 1]
+        assert response.estimated_scanned_ratio == 0.5
+        assert response.confidence == 1
+
+    def test_negative_sample(self, stub, text_pdf):
+        with pytest.raises(grpc.RpcError) as exc_info:
+            stub.TriageDocument(pb2.TriageRequest(pdf_data=text_pdf, sample_pages=-1))
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
@@ -83,3 +83,38 @@ class TestApplyRedactions:
                 )
             )
         assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+
+class TestAutoRedact:
+    def test_redacts_matches_in_one_call(self, stub, text_pdf):
+        response = stub.AutoRedact(
+            pb2.AutoRedactRequest(pdf_data=text_pdf, texts=["John Smith"])
+        )
+        assert response.page_count == 1
+        assert response.total_suggestions >= 1
+        assert response.redactions_applied == response.total_suggestions
+        assert len(response.redaction_log) == response.redactions_applied
+        assert response.results[0].text == "John Smith"
+        assert response.pdf_data.startswith(b"%PDF")
+
+    def test_with_doc_id(self, stub, text_pdf):
+        session = stub.OpenDocument(pb2.OpenDocumentRequest(pdf_data=text_pdf))
+        response = stub.AutoRedact(
+            pb2.AutoRedactRequest(
+                doc_id=session.doc_id,
+                texts=["John Smith"],
+                style=pb2.RedactionStyle(fill_color="#005941"),
+            )
+        )
+        assert response.redactions_applied >= 1
+        # The open document is left unredacted.
+        again = stub.AutoRedact(
+            pb2.AutoRedactRequest(doc_id=session.doc_id, texts=["John Smith"])
+        )
+        assert again.redactions_applied == response.redactions_applied
+        stub.CloseDocument(pb2.CloseDocumentRequest(doc_id=session.doc_id))
+
+    def test_invalid_pdf(self, stub):
+        with pytest.raises(grpc.RpcError) as exc_info:
+            stub.AutoRedact(pb2.AutoRedactRequest(pdf_data=b"junk", texts=["x"]))
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
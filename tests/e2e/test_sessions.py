@@ -0,0 +1,62 @@
+import grpc
+import pytest
+
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+
+
+class TestDocumentSessions:
+    def test_review_workflow_with_doc_id(self, stub, multi_page_pdf):
+        opened = stub.OpenDocument(pb2.OpenDocumentRequest(pdf_data=multi_page_pdf))
+        assert opened.doc_id
+        assert opened.page_count == 3
+        assert opened.file_size_bytes == len(multi_page_pdf)
+        doc_id = opened.doc_id
+
+        info = stub.GetDocumentInfo(pb2.PdfInput(doc_id=doc_id))
+        assert info.page_count == 3
+        assert info.file_size_bytes == len(multi_page_pdf)
+
+        pages = list(stub.ExtractText(pb2.ExtractTextRequest(doc_id=doc_id)))
+        assert "Project Alpha" in pages[1].text
+
+        suggestions = stub.GetSuggestionAnnotations(
+            pb2.GetSuggestionAnnotationsRequest(doc_id=doc_id, texts=["John Smith"])
+        )
+        assert suggestions.total_suggestions == 1
+
+        redacted = stub.ApplyRedactions(
+            pb2.ApplyRedactionsRequest(doc_id=doc_id, xfdf=suggestions.xfdf)
+        )
+        assert redacted.redactions_applied == 1
+
+        # The open document itself is left unredacted.
+        again = stub.GetSuggestionAnnotations(
+            pb2.GetSuggestionAnnotationsRequest(doc_id=doc_id, texts=["John Smith"])
+        )
+        assert again.total_suggestions == 1
+
+        closed = stub.CloseDocument(pb2.CloseDocumentRequest(doc_id=doc_id))
+        assert closed.closed is True
+
+    def test_closed_doc_id_not_found(self, stub, text_pdf):
+        doc_id = stub.OpenDocument(pb2.OpenDocumentRequest(pdf_data=text_pdf)).doc_id
+        stub.CloseDocument(pb2.CloseDocumentRequest(doc_id=doc_id))
+
+        with pytest.raises(grpc.RpcError) as exc_info:
+            stub.GetDocumentInfo(pb2.PdfInput(doc_id=doc_id))
+        assert exc_info.value.code() == grpc.StatusCode.NOT_FOUND
+
+    def test_doc_id_and_pdf_data_rejected(self, stub, text_pdf):
+        doc_id = stub.OpenDocument(pb2.OpenDocumentRequest(pdf_data=text_pdf)).doc_id
+        with pytest.raises(grpc.RpcError) as exc_info:
+            list(
+                stub.ExtractText(
+                    pb2.ExtractTextRequest(doc_id=doc_id, pdf_data=text_pdf)
+                )
+            )
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    def test_open_invalid_pdf(self, stub):
+        with pytest.raises(grpc.RpcError) as exc_info:
+            stub.OpenDocument(pb2.OpenDocumentRequest(pdf_data=b"bad"))
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
@@ -25,6 +25,32 @@ class TestExtractText:
         )
         assert len(pages[0].blocks) > 0
 
+    def test_with_packed_positions(self, stub, multi_page_pdf):
+        pages = list(
+            stub.ExtractText(
+                pb2.ExtractTextRequest(
+                    pdf_data=multi_page_pdf,
+                    include_word_positions=True,
+                    packed_positions=True,
+                )
+            )
+        )
+        assert len(pages) == 3
+        packed = pages[0].packed_blocks
+        assert not pages[0].blocks
+        assert len(packed.bboxes) == 4 * (len(packed.line_offsets) - 4)
+        assert "John Smith" in pages[0].text
+
+    def test_page_range_and_resume(self, stub, multi_page_pdf):
+        request = pb2.ExtractTextRequest(pdf_data=multi_page_pdf, start_page=1)
+        pages = list(stub.ExtractText(request))
+        assert [p.page_number for p in pages] == [1, 2]
+
+        request.resume_token = pages[0].resume_token
+        resumed = list(stub.ExtractText(request))
+        assert [p.page_number for p in resumed] == [2]
+        assert "$50,000" in resumed[0].text
+
     def test_invalid_input(self, stub):
         with pytest.raises(grpc.RpcError) as exc_info:
             list(stub.ExtractText(pb2.ExtractTextRequest(pdf_data=b"bad")))
@@ -0,0 +1,77 @@
+import hashlib
+
+import fitz
+import grpc
+import pytest
+
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+
+CHUNK_SIZE = 1024
+
+
+def chunked(message_type, pdf_data, header=None):
+    if header is not None:
+        yield message_type(header=header)
+    for start in range(0, len(pdf_data), CHUNK_SIZE):
+        yield message_type(chunk=pdf_data[start : start + CHUNK_SIZE])
+
+
+class TestUploadRpcs:
+    def test_get_document_info_upload(self, stub, multi_page_pdf):
+        response = stub.GetDocumentInfoUpload(
+            chunked(pb2.GetDocumentInfoUploadRequest, multi_page_pdf)
+        )
+        assert response.page_count == 3
+        assert response.file_size_bytes == len(multi_page_pdf)
+
+    def test_extract_text_upload(self, stub, multi_page_pdf):
+        header = pb2.ExtractTextRequest(pages=[1])
+        pages = list(
+            stub.ExtractTextUpload(
+                chunked(pb2.ExtractTextUploadRequest, multi_page_pdf, header)
+            )
+        )
+        assert len(pages) == 1
+        assert "Project Alpha" in pages[0].text
+
+    def test_suggestions_upload(self, stub, text_pdf):
+        header = pb2.GetSuggestionAnnotationsRequest(texts=["John Smith"])
+        response = stub.GetSuggestionAnnotationsUpload(
+            chunked(pb2.GetSuggestionAnnotationsUploadRequest, text_pdf, header)
+        )
+        assert response.total_suggestions == 1
+
+    def test_apply_redactions_upload_streams_pdf(self, stub, text_pdf):
+        xfdf = stub.GetSuggestionAnnotations(
+            pb2.GetSuggestionAnnotationsRequest(pdf_data=text_pdf, texts=["John Smith"])
+        ).xfdf
+        header = pb2.ApplyRedactionsRequest(xfdf=xfdf)
+        responses = list(
+            stub.ApplyRedactionsUpload(
+                chunked(pb2.ApplyRedactionsUploadRequest, text_pdf, header)
+            )
+        )
+
+        summary = responses[0].summary
+        pdf_data = b"".join(r.chunk for r in responses[1:])
+        assert summary.redactions_applied == 1
+        assert summary.pdf_data == b""
+        assert hashlib.sha256(pdf_data).digest() == summary.content_hash
+
+        doc = fitz.open(stream=pdf_data, filetype="pdf")
+        assert "John Smith" not in doc[0].get_text()
+        doc.close()
+
+    def test_header_after_chunk_rejected(self, stub, text_pdf):
+        requests = [
+            pb2.ExtractTextUploadRequest(chunk=text_pdf),
+            pb2.ExtractTextUploadRequest(header=pb2.ExtractTextRequest()),
+        ]
+        with pytest.raises(grpc.RpcError) as exc_info:
+            list(stub.ExtractTextUpload(iter(requests)))
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    def test_empty_upload_rejected(self, stub):
+        with pytest.raises(grpc.RpcError) as exc_info:
+            stub.GetDocumentInfoUpload(iter([]))
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
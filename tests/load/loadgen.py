@@ -0,0 +1,372 @@
+"""Closed-loop load generator for a running pdf-core server.
+
+    python -m tests.load.loadgen --target localhost:50051 --concurrency 16 \\
+        --duration 60 --mix info=4,extract=3,suggest=2,redact=1 --pages 5,50 \\
+        --metrics-url http://localhost:9100/metrics
+
+``--concurrency`` workers each send one request at a time, picking the RPC
+from the weighted ``--mix`` and a document from the ``--pages`` sizes
+(synthetic text documents from the benchmark corpus). Every
+``--interval`` seconds a progress line is printed with throughput, p99 and,
+given the server's ``/metrics`` URL, resident memory of the server and its
+worker processes. The final report has throughput, latency percentiles and
+status codes per RPC. Defaults can also be set with ``LOAD_*`` variables
+(see docker-compose.load.yml).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+import grpc
+
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from tests.benchmarks import corpus
+
+RPCS = {
+    "info": "GetDocumentInfo",
+    "extract": "ExtractText",
+    "suggest": "GetSuggestionAnnotations",
+    "redact": "ApplyRedactions",
+}
+SEARCH_TEXTS = ["John Smith", "SSN:"]
+HIGHLIGHTS_PER_PAGE = 2
+PERCENTILES = (0.5, 0.9, 0.99)
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+SERVER_RSS = "pdfcore_process_resident_memory_bytes"
+WORKER_RSS = "pdfcore_worker_resident_memory_bytes"
+
+
+@dataclass(frozen=True)
+class Document:
+    pages: int
+    pdf_data: bytes
+    xfdf: str
+
+
+@dataclass
+class Sample:
+    rpc: str
+    finished: float
+    latency: float
+    code: str
+
+
+@dataclass
+class Recorder:
+    samples: list[Sample] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, sample: Sample) -> None:
+        with self.lock:
+            self.samples.append(sample)
+
+    def since(self, start: float) -> list[Sample]:
+        with self.lock:
+            return [s for s in self.samples if s.finished >= start]
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse ``info=4,extract=1`` into weights per RPC."""
+    mix: dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in RPCS:
+            raise ValueError(f"Unknown RPC {name!r}; choose from {', '.join(RPCS)}")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("RPC mix has no positive weight")
+    return mix
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def parse_rss(text: str) -> dict[str, float]:
+    """Server and worker RSS from a Prometheus text exposition."""
+    rss = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in (SERVER_RSS, WORKER_RSS):
+            rss[name] = float(value)
+    return rss
+
+
+def scrape_rss(url: str) -> dict[str, float]:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return parse_rss(response.read().decode())
+    except OSError:
+        return {}
+
+
+def make_documents(sizes: list[int]) -> list[Document]:
+    documents = []
+    for pages in sizes:
+        pdf_data = corpus.text_document(pages=pages)
+        xfdf = corpus.highlights_xfdf(pdf_data, count=pages * HIGHLIGHTS_PER_PAGE)
+        documents.append(Document(pages, pdf_data, xfdf))
+    return documents
+
+
+def call(stub: Any, rpc: str, document: Document, timeout: float) -> None:
+    if rpc == "info":
+        stub.GetDocumentInfo(pb2.PdfInput(pdf_data=document.pdf_data), timeout=timeout)
+    elif rpc == "extract":
+        request = pb2.ExtractTextRequest(pdf_data=document.pdf_data)
+        for _ in stub.ExtractText(request, timeout=timeout):
+            pass
+    elif rpc == "suggest":
+        stub.GetSuggestionAnnotations(
+            pb2.GetSuggestionAnnotationsRequest(
+                pdf_data=document.pdf_data, texts=SEARCH_TEXTS
+            ),
+            timeout=timeout,
+        )
+    else:
+        stub.ApplyRedactions(
+            pb2.ApplyRedactionsRequest(pdf_data=document.pdf_data, xfdf=document.xfdf),
+            timeout=timeout,
+        )
+
+
+def worker(
+    stub: Any,
+    mix: dict[str, float],
+    documents: list[Document],
+    deadline: float,
+    timeout: float,
+    recorder: Recorder,
+    seed: int,
+) -> None:
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        rpc = rng.choices(names, weights)[0]
+        document = rng.choice(documents)
+        start = time.monotonic()
+        try:
+            call(stub, rpc, document, timeout)
+            code = "OK"
+        except grpc.RpcError as e:
+            code = e.code().name
+        finished = time.monotonic()
+        recorder.add(Sample(rpc, finished, finished - start, code))
+
+
+def _mib(value: float | None) -> str:
+    return "-" if value is None else f"{value / 2**20:.0f}MiB"
+
+
+def monitor(
+    recorder: Recorder,
+    stop: threading.Event,
+    interval: float,
+    metrics_url: str,
+    timeline: list[dict[str, Any]],
+    started: float,
+) -> None:
+    """Print and record throughput, p99 and RSS every ``interval`` seconds."""
+    window_start = started
+    while not stop.wait(interval):
+        now = time.monotonic()
+        window = [s for s in recorder.since(window_start) if s.finished < now]
+        rss = scrape_rss(metrics_url) if metrics_url else {}
+        row = {
+            "t_s": round(now - started, 1),
+            "rps": round(len(window) / (now - window_start), 2),
+            "p99_s": round(percentile([s.latency for s in window], 0.99), 4),
+            "errors": sum(s.code != "OK" for s in window),
+            "server_rss_bytes": rss.get(SERVER_RSS),
+            "worker_rss_bytes": rss.get(WORKER_RSS),
+        }
+        timeline.append(row)
+        print(
+            f"t={row['t_s']:>6}s rps={row['rps']:>8} p99={row['p99_s']:.3f}s"
+            f" errors={row['errors']} server_rss={_mib(row['server_rss_bytes'])}"
+            f" worker_rss={_mib(row['worker_rss_bytes'])}",
+            flush=True,
+        )
+        window_start = now
+
+
+def run(
+    target: str,
+    mix: dict[str, float],
+    concurrency: int,
+    duration: float,
+    sizes: list[int],
+    timeout: float = 60.0,
+    interval: float = 5.0,
+    metrics_url: str = "",
+) -> dict[str, Any]:
+    """Drive ``target`` for ``duration`` seconds and return the report."""
+    documents = make_documents(sizes)
+    channel = grpc.insecure_channel(
+        target,
+        options=[
+            ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+            ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+        ],
+    )
+    grpc.channel_ready_future(channel).result(timeout=30)
+    stub = pb2_grpc.PdfServiceStub(channel)
+
+    recorder = Recorder()
+    timeline: list[dict[str, Any]] = []
+    stop = threading.Event()
+    started = time.monotonic()
+    deadline = started + duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(stub, mix, documents, deadline, timeout, recorder, seed),
+            daemon=True,
+        )
+        for seed in range(concurrency)
+    ]
+    sampler = threading.Thread(
+        target=monitor,
+        args=(recorder, stop, interval, metrics_url, timeline, started),
+        daemon=True,
+    )
+    sampler.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    stop.set()
+    sampler.join()
+    channel.close()
+
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "pages": sizes,
+        "mix": mix,
+        "rpcs": summarize(recorder.samples, elapsed),
+        "timeline": timeline,
+    }
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict[str, dict[str, Any]]:
+    """Throughput, latency percentiles and status codes per RPC and overall."""
+    groups: dict[str, list[Sample]] = {"all": samples}
+    for sample in samples:
+        groups.setdefault(sample.rpc, []).append(sample)
+
+    summary = {}
+    for name, group in groups.items():
+        # Percentiles cover successful calls; errors are counted by code.
+        latencies = [s.latency for s in group if s.code == "OK"]
+        stats = {
+            "requests": len(group),
+            "rps": round(len(group) / elapsed, 2) if elapsed else 0.0,
+            "codes": dict(Counter(s.code for s in group)),
+            "max_s": round(max(latencies, default=0.0), 4),
+        }
+        for fraction in PERCENTILES:
+            key = f"p{fraction * 100:g}_s"
+            stats[key] = round(percentile(latencies, fraction), 4)
+        summary[RPCS.get(name, name)] = stats
+    return summary
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"\n{report['concurrency']} workers for {report['duration_s']}s"
+        f" against {report['target']} (pages: {report['pages']})"
+    )
+    columns = "".join(f"{f'p{f * 100:g}':>9}" for f in PERCENTILES)
+    print(f"{'rpc':<26}{'requests':>9}{'rps':>9}{columns}{'max':>9}  codes")
+    for name, stats in report["rpcs"].items():
+        values = "".join(f"{stats[f'p{f * 100:g}_s']:>9.3f}" for f in PERCENTILES)
+        codes = ", ".join(f"{code}={n}" for code, n in sorted(stats["codes"].items()))
+        print(
+            f"{name:<26}{stats['requests']:>9}{stats['rps']:>9.1f}{values}"
+            f"{stats['max_s']:>9.3f}  {codes}"
+        )
+    rss = [row["server_rss_bytes"] for row in report["timeline"]]
+    rss = [value for value in rss if value is not None]
+    if rss:
+        print(f"server RSS: start {_mib(rss[0])}, peak {_mib(max(rss))}")
+
+
+def _sizes(spec: str) -> list[int]:
+    return [int(size) for size in spec.split(",")]
+
+
+def main(argv: list[str] | None = None) -> int:
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Load-test a pdf-core server.")
+    parser.add_argument("--target", default=env("PDF_SERVICE_HOST", "localhost:50051"))
+    parser.add_argument(
+        "--mix",
+        default=env("LOAD_MIX", "info=4,extract=3,suggest=2,redact=1"),
+        help=f"weighted RPC mix over {', '.join(RPCS)}",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=int(env("LOAD_CONCURRENCY", "8"))
+    )
+    parser.add_argument(
+        "--duration", type=float, default=float(env("LOAD_DURATION", "30"))
+    )
+    parser.add_argument(
+        "--pages",
+        default=env("LOAD_PAGES", "5,50"),
+        help="comma-separated page counts of the documents sent",
+    )
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument(
+        "--metrics-url",
+        default=env("LOAD_METRICS_URL", ""),
+        help="server /metrics URL to sample resident memory from",
+    )
+    parser.add_argument("--json", default="", help="also write the report here")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    report = run(
+        args.target,
+        mix,
+        args.concurrency,
+        args.duration,
+        _sizes(args.pages),
+        timeout=args.timeout,
+        interval=args.interval,
+        metrics_url=args.metrics_url,
+    )
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+
+import fitz
+import grpc
+import pytest
+
+from pdf_service.admission import (
+    BYTES_FACTOR,
+    PAGE_BYTES,
+    PAYLOAD_BYTES_PER_PAGE,
+    AdmissionController,
+    AdmissionRejectedError,
+    Cost,
+    estimate_cost,
+)
+from pdf_service.core import cancellation
+from pdf_service.core.pdf import peek_page_count
+from pdf_service.grpc import messages
+from pdf_service.sessions import DocumentStore
+
+
+class TestEstimateCost:
+    def test_reads_page_count_without_opening(self, monkeypatch, large_text_pdf):
+        def fail(*args, **kwargs):
+            raise AssertionError("estimate_cost opened the PDF")
+
+        with fitz.open(stream=large_text_pdf, filetype="pdf") as doc:
+            page_count = len(doc)
+        monkeypatch.setattr("fitz.open", fail)
+        cost = estimate_cost(large_text_pdf)
+        assert cost.memory_bytes == (
+            len(large_text_pdf) * BYTES_FACTOR + page_count * PAGE_BYTES
+        )
+        assert cost.cpu_slots == 1
+
+    def test_estimates_pages_from_bytes_without_page_tree(self):
+        pdf_data = b"x" * (2 * PAYLOAD_BYTES_PER_PAGE + 1)
+        cost = estimate_cost(pdf_data)
+        assert cost.memory_bytes == len(pdf_data) * BYTES_FACTOR + 3 * PAGE_BYTES
+        assert estimate_cost(b"not a pdf").memory_bytes == 9 * BYTES_FACTOR + PAGE_BYTES
+
+    def test_session_counts_its_pages(self, multi_page_pdf):
+        session = DocumentStore(max_bytes=10**7, ttl_seconds=60).open(multi_page_pdf)
+        cost = estimate_cost(session)
+        assert cost.memory_bytes == len(multi_page_pdf) * BYTES_FACTOR + 3 * PAGE_BYTES
+
+
+class TestPeekPageCount:
+    def test_reads_count_from_xref_table(self, multi_page_pdf):
+        assert peek_page_count(multi_page_pdf) == 3
+
+    def test_follows_incremental_updates(self, multi_page_pdf, tmp_path):
+        path = tmp_path / "updated.pdf"
+        path.write_bytes(multi_page_pdf)
+        with fitz.open(path) as doc:
+            doc.new_page()
+            doc.saveIncr()
+        assert peek_page_count(path.read_bytes()) == 4
+
+    def test_gives_up_on_compressed_xref(self, multi_page_pdf):
+        with fitz.open(stream=multi_page_pdf, filetype="pdf") as doc:
+            compressed = doc.tobytes(use_objstms=True)
+        assert peek_page_count(compressed) is None
+
+    @pytest.mark.parametrize("data", [b"", b"not a pdf", b"%PDF-1.7\nstartxref\n99\n"])
+    def test_gives_up_on_junk(self, data):
+        assert peek_page_count(data) is None
+
+
+class TestAdmissionController:
+    def test_disabled_by_default_budgets(self):
+        controller = AdmissionController(0, 0, queue_timeout=0)
+        assert not controller.enabled
+        with controller.admit(Cost(10**12)):
+            pass
+
+    def test_admits_within_budget(self):
+        controller = AdmissionController(100, 2, queue_timeout=0)
+        with controller.admit(Cost(40)), controller.admit(Cost(60)):
+            assert controller.memory_in_use == 100
+            assert controller.cpu_in_use == 2
+        assert controller.memory_in_use == 0
+        assert controller.cpu_in_use == 0
+
+    def test_rejects_after_queue_timeout(self):
+        controller = AdmissionController(0, 1, queue_timeout=0.01)
+        with (
+            controller.admit(Cost(0)),
+            pytest.raises(AdmissionRejectedError) as excinfo,
+        ):
+            controller.acquire(Cost(0))
+        assert excinfo.value.retry_after >= 1
+        assert controller.queue_depth == 0
+        assert controller.cpu_in_use == 0
+
+    def test_cancellation_ends_the_wait(self):
+        controller = AdmissionController(0, 1, queue_timeout=30)
+        token = cancellation.CancellationToken()
+        held = controller.acquire(Cost(0))
+        threading.Timer(0.05, token.cancel).start()
+        start = time.monotonic()
+        with cancellation.bind(token), pytest.raises(cancellation.OperationCancelled):
+            controller.acquire(Cost(0))
+        assert time.monotonic() - start < 5
+        assert controller.queue_depth == 0
+        controller.release(held)
+        assert controller.cpu_in_use == 0
+
+    def test_deadline_ends_the_wait(self):
+        controller = AdmissionController(0, 1, queue_timeout=30)
+        token = cancellation.CancellationToken.from_timeout(0.05)
+        with (
+            controller.admit(Cost(0)),
+            cancellation.bind(token),
+            pytest.raises(cancellation.DeadlineExceeded),
+        ):
+            controller.acquire(Cost(0))
+        assert controller.queue_depth == 0
+        assert controller.cpu_in_use == 0
+
+    def test_oversized_request_runs_alone(self):
+        controller = AdmissionController(100, 0, queue_timeout=0.01)
+        with controller.admit(Cost(500)):
+            assert controller.memory_in_use == 100
+            with pytest.raises(AdmissionRejectedError):
+                controller.acquire(Cost(1))
+
+    def test_queued_request_admitted_on_release(self):
+        controller = AdmissionController(100, 0, queue_timeout=5)
+        held = controller.acquire(Cost(80))
+        admitted = threading.Event()
+
+        def waiter():
+            with controller.admit(Cost(50)):
+                admitted.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        assert not admitted.wait(0.05)
+        assert controller.queue_depth == 1
+        controller.release(held)
+        thread.join(timeout=5)
+        assert admitted.is_set()
+        assert controller.memory_in_use == 0
+
+    def test_queue_is_fifo(self):
+        controller = AdmissionController(100, 0, queue_timeout=5)
+        held = controller.acquire(Cost(90))
+        big = threading.Thread(target=controller.acquire, args=(Cost(100),))
+        big.start()
+        while controller.queue_depth < 1:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        # Fits the free budget, but must not overtake the queued request.
+        controller.queue_timeout = 0.01
+        with pytest.raises(AdmissionRejectedError):
+            controller.acquire(Cost(10))
+        controller.release(held)
+        big.join(timeout=5)
+        assert controller.memory_in_use == 100
+
+    def test_async_waiter(self):
+        controller = AdmissionController(0, 1, queue_timeout=5)
+
+        async def scenario():
+            order = []
+
+            async def task(name, delay):
+                async with controller.admit_async(Cost(0)):
+                    order.append(name)
+                    await asyncio.sleep(delay)
+
+            await asyncio.gather(task("first", 0.05), task("second", 0))
+            return order
+
+        assert asyncio.run(scenario()) == ["first", "second"]
+        assert controller.cpu_in_use == 0
+
+    def test_async_rejection_and_cancellation(self):
+        controller = AdmissionController(0, 1, queue_timeout=0.01)
+
+        async def scenario():
+            async with controller.admit_async(Cost(0)):
+                with pytest.raises(AdmissionRejectedError):
+                    await controller.acquire_async(Cost(0))
+                controller.queue_timeout = 5
+                waiting = asyncio.create_task(controller.acquire_async(Cost(0)))
+                await asyncio.sleep(0.01)
+                waiting.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await waiting
+
+        asyncio.run(scenario())
+        assert controller.queue_depth == 0
+        assert controller.cpu_in_use == 0
+
+
+class TestRejectionStatus:
+    def test_maps_to_resource_exhausted_with_pushback(self):
+        exc = AdmissionRejectedError("busy", retry_after=2.5)
+        assert messages.status_for(exc)[0] == grpc.StatusCode.RESOURCE_EXHAUSTED
+        assert messages.error_metadata(exc) == (("grpc-retry-pushback-ms", "2500"),)
+        assert messages.error_metadata(ValueError("bad")) == ()
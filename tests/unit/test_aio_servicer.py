@@ -0,0 +1,178 @@
+import asyncio
+from concurrent import futures
+
+import grpc
+import pytest
+
+from pdf_service.admission import AdmissionController, Cost
+from pdf_service.config import ServiceConfig
+from pdf_service.engine import InlineEngine
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc.aio_servicer import AsyncPdfServiceServicer
+from pdf_service.sessions import DocumentStore
+
+
+def run_with_stub(coro_fn, **servicer_kwargs):
+    """Start an in-process aio server and run ``coro_fn(stub)`` against it."""
+
+    async def main():
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        server = grpc.aio.server()
+        pb2_grpc.add_PdfServiceServicer_to_server(
+            AsyncPdfServiceServicer(InlineEngine(), executor, **servicer_kwargs),
+            server,
+        )
+        port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                return await coro_fn(pb2_grpc.PdfServiceStub(channel))
+        finally:
+            await server.stop(grace=None)
+            executor.shutdown()
+
+    return asyncio.run(main())
+
+
+class TestAsyncPdfServiceServicer:
+    def test_get_document_info(self, multi_page_pdf):
+        async def call(stub):
+            return await stub.GetDocumentInfo(pb2.PdfInput(pdf_data=multi_page_pdf))
+
+        assert run_with_stub(call).page_count == 3
+
+    def test_extract_text_streams_in_order(self, multi_page_pdf):
+        async def call(stub):
+            request = pb2.ExtractTextRequest(pdf_data=multi_page_pdf)
+            return [page async for page in stub.ExtractText(request)]
+
+        pages = run_with_stub(call)
+        assert [p.page_number for p in pages] == [0, 1, 2]
+        assert "Project Alpha" in pages[1].text
+
+    def test_stream_document_info(self, multi_page_pdf):
+        async def call(stub):
+            request = pb2.StreamDocumentInfoRequest(pdf_data=multi_page_pdf)
+            return [chunk async for chunk in stub.StreamDocumentInfo(request)]
+
+        chunks = run_with_stub(call, config=ServiceConfig(info_batch_pages=2))
+        kinds = [c.WhichOneof("chunk") for c in chunks]
+        assert kinds == ["header", "pages", "pages", "summary"]
+        assert [len(c.pages.pages) for c in chunks[1:3]] == [2, 1]
+
+    def test_suggestions_then_redactions(self, text_pdf):
+        async def call(stub):
+            suggestions = await stub.GetSuggestionAnnotations(
+                pb2.GetSuggestionAnnotationsRequest(
+                    pdf_data=text_pdf, texts=["John Smith"]
+                )
+            )
+            return await stub.ApplyRedactions(
+                pb2.ApplyRedactionsRequest(pdf_data=text_pdf, xfdf=suggestions.xfdf)
+            )
+
+        assert run_with_stub(call).redactions_applied == 1
+
+    def test_invalid_input_maps_to_invalid_argument(self):
+        async def call(stub):
+            return await stub.GetDocumentInfo(pb2.PdfInput(pdf_data=b"bad"))
+
+        with pytest.raises(grpc.aio.AioRpcError) as exc_info:
+            run_with_stub(call)
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    def test_extract_text_invalid_pages(self, text_pdf):
+        async def call(stub):
+            request = pb2.ExtractTextRequest(pdf_data=text_pdf, pages=[7])
+            return [page async for page in stub.ExtractText(request)]
+
+        with pytest.raises(grpc.aio.AioRpcError) as exc_info:
+            run_with_stub(call)
+        assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+    def test_apply_redactions_upload(self, text_pdf):
+        async def call(stub):
+            suggestions = await stub.GetSuggestionAnnotations(
+                pb2.GetSuggestionAnnotationsRequest(
+                    pdf_data=text_pdf, texts=["John Smith"]
+                )
+            )
+
+            async def requests():
+                header = pb2.ApplyRedactionsRequest(xfdf=suggestions.xfdf)
+                yield pb2.ApplyRedactionsUploadRequest(header=header)
+                yield pb2.ApplyRedactionsUploadRequest(chunk=text_pdf[:100])
+                yield pb2.ApplyRedactionsUploadRequest(chunk=text_pdf[100:])
+
+            return [r async for r in stub.ApplyRedactionsUpload(requests())]
+
+        responses = run_with_stub(call)
+        assert responses[0].summary.redactions_applied == 1
+        assert b"".join(r.chunk for r in responses[1:]).startswith(b"%PDF")
+
+    def test_document_session(self, multi_page_pdf):
+        async def call(stub):
+            opened = await stub.OpenDocument(
+                pb2.OpenDocumentRequest(pdf_data=multi_page_pdf)
+            )
+            request = pb2.ExtractTextRequest(doc_id=opened.doc_id, pages=[2])
+            return [page async for page in stub.ExtractText(request)]
+
+        pages = run_with_stub(call)
+        assert "$50,000" in pages[0].text
+
+    def test_sessions_in_given_store(self, multi_page_pdf):
+        documents = DocumentStore(10**7, 60, process_index=2)
+
+        async def call(stub):
+            request = pb2.OpenDocumentRequest(pdf_data=multi_page_pdf)
+            return await stub.OpenDocument(request)
+
+        opened = run_with_stub(call, documents=documents)
+        assert opened.doc_id.startswith("p2-")
+        assert len(documents) == 1
+
+    def test_admission_rejection_and_cache_bypass(self, multi_page_pdf):
+        admission = AdmissionController(0, 1, queue_timeout=0.01)
+
+        async def call(stub):
+            request = pb2.PdfInput(pdf_data=multi_page_pdf)
+            await stub.GetDocumentInfo(request)
+            admission.acquire(Cost(0))
+            # Cached results are served without waiting for admission.
+            cached = await stub.GetDocumentInfo(request)
+            with pytest.raises(grpc.aio.AioRpcError) as excinfo:
+                extract = pb2.ExtractTextRequest(pdf_data=multi_page_pdf)
+                [page async for page in stub.ExtractText(extract)]
+            return cached, excinfo.value
+
+        config = ServiceConfig(result_cache_bytes=10**6)
+        cached, error = run_with_stub(call, config=config, admission=admission)
+        assert cached.page_count == 3
+        assert error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        assert ("grpc-retry-pushback-ms", "1000") in tuple(error.trailing_metadata())
+
+    def test_cached_pages_bypass_admission(self, multi_page_pdf):
+        admission = AdmissionController(0, 1, queue_timeout=0.01)
+
+        async def call(stub):
+            first = pb2.ExtractTextRequest(pdf_data=multi_page_pdf, end_page=2)
+            [page async for page in stub.ExtractText(first)]
+            admission.acquire(Cost(0))
+            cached = [page async for page in stub.ExtractText(first)]
+            received = []
+            with pytest.raises(grpc.aio.AioRpcError) as excinfo:
+                extract = pb2.ExtractTextRequest(pdf_data=multi_page_pdf)
+                async for page in stub.ExtractText(extract):
+                    received.append(page.page_number)
+            return cached, received, excinfo.value
+
+        config = ServiceConfig(result_cache_bytes=10**6)
+        cached, received, error = run_with_stub(
+            call, config=config, admission=admission
+        )
+        assert [page.page_number for page in cached] == [0, 1]
+        # The cached pages are sent before extraction waits for admission.
+        assert received == [0, 1]
+        assert error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
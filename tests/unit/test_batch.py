@@ -0,0 +1,258 @@
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+
+from pdf_service.config import ServiceConfig
+from pdf_service.core import document_info
+from pdf_service.engine import InlineEngine
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc.aio_servicer import AsyncPdfServiceServicer
+from pdf_service.grpc.servicer import PdfServiceServicer
+from tests.unit.test_aio_servicer import run_with_stub
+
+
+@pytest.fixture
+def slow_first(monkeypatch, text_pdf):
+    """Document analysis that is slow for ``text_pdf`` and tracks concurrency."""
+    get_document_info = document_info.get_document_info
+    state = {"running": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def analyze(pdf_data):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        try:
+            time.sleep(0.5 if pdf_data == text_pdf else 0.05)
+            return get_document_info(pdf_data)
+        finally:
+            with lock:
+                state["running"] -= 1
+
+    monkeypatch.setattr(document_info, "get_document_info", analyze)
+    return state
+
+
+def info_items(text_pdf, multi_page_pdf, count):
+    yield pb2.BatchRequest(correlation_id="slow", info=pb2.PdfInput(pdf_data=text_pdf))
+    for n in range(count):
+        # Distinct bytes so results are not served from the cache.
+        pdf_data = multi_page_pdf + b"\n%" + str(n).encode()
+        yield pb2.BatchRequest(
+            correlation_id=str(n), info=pb2.PdfInput(pdf_data=pdf_data)
+        )
+
+
+def test_results_in_completion_order(slow_first, text_pdf, multi_page_pdf):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    servicer = PdfServiceServicer(config=ServiceConfig(batch_concurrency=3))
+    pb2_grpc.add_PdfServiceServicer_to_server(servicer, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = pb2_grpc.PdfServiceStub(channel)
+            results = list(
+                stub.ProcessBatch(info_items(text_pdf, multi_page_pdf, count=6))
+            )
+    finally:
+        server.stop(grace=None)
+    ids = [r.correlation_id for r in results]
+    assert sorted(ids) == sorted(["slow", *map(str, range(6))])
+    assert ids[-1] == "slow"
+    assert all(r.code == 0 for r in results)
+    assert slow_first["peak"] == 3
+
+
+def test_async_server(slow_first, text_pdf, multi_page_pdf):
+    async def call(stub):
+        items = info_items(text_pdf, multi_page_pdf, count=4)
+        return [r async for r in stub.ProcessBatch(items)]
+
+    results = run_with_stub(call, config=ServiceConfig(batch_concurrency=2))
+    ids = [r.correlation_id for r in results]
+    assert sorted(ids) == sorted(["slow", "0", "1", "2", "3"])
+    assert ids[-1] == "slow"
+    assert results[0].info.page_count == 3
+    assert slow_first["peak"] == 2
+
+
+class FakeContext:
+    """The parts of a servicer context ProcessBatch uses, called directly."""
+
+    def __init__(self):
+        self.callbacks = []
+        self.aborted = None
+
+    def time_remaining(self):
+        return None
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+        return True
+
+    def add_done_callback(self, callback):
+        self.callbacks.append(lambda: callback(self))
+
+    def is_active(self):
+        return True
+
+    def set_trailing_metadata(self, metadata):
+        pass
+
+    def abort(self, code, details):
+        self.aborted = code
+        raise RuntimeError(details)
+
+    def cancel(self):
+        for callback in self.callbacks:
+            callback()
+
+
+class FakeAsyncContext(FakeContext):
+    async def abort(self, code, details):
+        super().abort(code, details)
+
+
+def items_then_error(text_pdf):
+    yield pb2.BatchRequest(correlation_id="a", info=pb2.PdfInput(pdf_data=text_pdf))
+    raise ValueError("Malformed request")
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """PDFs whose analysis has started."""
+    get_document_info = document_info.get_document_info
+    started = []
+
+    def analyze(pdf_data):
+        started.append(pdf_data)
+        return get_document_info(pdf_data)
+
+    monkeypatch.setattr(document_info, "get_document_info", analyze)
+    return started
+
+
+def in_thread(fn, timeout=10.0):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "timed out"
+    return result[0]
+
+
+class TestSyncProcessBatch:
+    def test_reads_items_only_for_free_slots(self, started, text_pdf, multi_page_pdf):
+        servicer = PdfServiceServicer(config=ServiceConfig(batch_concurrency=2))
+        items = info_items(text_pdf, multi_page_pdf, count=4)
+        responses = servicer.ProcessBatch(items, FakeContext())
+        first = next(responses)
+        time.sleep(0.3)
+        # The first result is not consumed yet, so its slot is still held.
+        assert len(started) == 2
+        rest = in_thread(lambda: list(responses))
+        assert len([first, *rest]) == 5
+        assert len(started) == 5
+
+    def test_failing_item_gets_error_response(self, text_pdf):
+        servicer = PdfServiceServicer()
+
+        def fail(item):
+            raise RuntimeError("boom")
+
+        servicer._batch_item = fail
+        items = [
+            pb2.BatchRequest(correlation_id="a", info=pb2.PdfInput(pdf_data=text_pdf))
+        ]
+        (response,) = in_thread(
+            lambda: list(servicer.ProcessBatch(iter(items), FakeContext()))
+        )
+        assert response.correlation_id == "a"
+        assert response.code == grpc.StatusCode.INTERNAL.value[0]
+
+    def test_request_error_aborts_after_results(self, text_pdf):
+        servicer = PdfServiceServicer()
+        context = FakeContext()
+        responses = []
+
+        def consume():
+            with pytest.raises(RuntimeError, match="Malformed request"):
+                for response in servicer.ProcessBatch(
+                    items_then_error(text_pdf), context
+                ):
+                    responses.append(response)
+
+        in_thread(consume)
+        assert [r.correlation_id for r in responses] == ["a"]
+        assert context.aborted == grpc.StatusCode.INVALID_ARGUMENT
+
+    def test_cancellation_ends_stream(self, monkeypatch, text_pdf):
+        release = threading.Event()
+        monkeypatch.setattr(
+            document_info, "get_document_info", lambda pdf_data: release.wait(10)
+        )
+        servicer = PdfServiceServicer()
+        context = FakeContext()
+        items = [
+            pb2.BatchRequest(correlation_id="a", info=pb2.PdfInput(pdf_data=text_pdf))
+        ]
+        responses = servicer.ProcessBatch(iter(items), context)
+        threading.Timer(0.2, context.cancel).start()
+        try:
+            assert in_thread(lambda: list(responses)) == []
+        finally:
+            release.set()
+
+
+class TestAsyncProcessBatch:
+    def test_reads_items_only_for_free_slots(self, started, text_pdf, multi_page_pdf):
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        servicer = AsyncPdfServiceServicer(
+            InlineEngine(), executor, ServiceConfig(batch_concurrency=2)
+        )
+        items = info_items(text_pdf, multi_page_pdf, count=4)
+
+        async def main():
+            responses = servicer.ProcessBatch(_aiter(items), FakeAsyncContext())
+            first = await anext(responses)
+            await asyncio.sleep(0.3)
+            reading = len(started)
+            return reading, [first] + [r async for r in responses]
+
+        try:
+            reading, responses = asyncio.run(main())
+        finally:
+            executor.shutdown()
+        assert reading == 2
+        assert len(responses) == 5
+
+    def test_request_error_aborts_after_results(self, text_pdf):
+        executor = futures.ThreadPoolExecutor(max_workers=2)
+        servicer = AsyncPdfServiceServicer(InlineEngine(), executor)
+        context = FakeAsyncContext()
+        responses = []
+
+        async def main():
+            async for response in servicer.ProcessBatch(
+                _aiter(items_then_error(text_pdf)), context
+            ):
+                responses.append(response)
+
+        try:
+            with pytest.raises(RuntimeError, match="Malformed request"):
+                asyncio.run(main())
+        finally:
+            executor.shutdown()
+        assert [r.correlation_id for r in responses] == ["a"]
+        assert context.aborted == grpc.StatusCode.INVALID_ARGUMENT
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
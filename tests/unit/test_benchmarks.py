@@ -0,0 +1,53 @@
+import fitz
+
+from pdf_service.core.redaction import apply_redactions
+from tests.benchmarks import corpus
+from tests.benchmarks.run import MIN_DELTA_SECONDS, compare
+
+
+class TestCorpus:
+    def test_text_document_is_searchable(self):
+        pdf = corpus.text_document(pages=3)
+        with fitz.open(stream=pdf, filetype="pdf") as doc:
+            assert len(doc) == 3
+            assert "SSN:" in "".join(page.get_text() for page in doc)
+
+    def test_scanned_document_has_no_text_layer(self):
+        pdf = corpus.scanned_document(pages=1, dpi=36)
+        with fitz.open(stream=pdf, filetype="pdf") as doc:
+            assert doc[0].get_text().strip() == ""
+            assert doc[0].get_images()
+
+    def test_table_document_is_dense(self):
+        pdf = corpus.table_document(pages=1, rows=4, columns=3)
+        with fitz.open(stream=pdf, filetype="pdf") as doc:
+            assert len(doc[0].get_text("words")) == 12
+
+    def test_generation_is_deterministic(self):
+        def text(pdf):
+            with fitz.open(stream=pdf, filetype="pdf") as doc:
+                return [page.get_text() for page in doc]
+
+        assert text(corpus.text_document(pages=2)) == text(
+            corpus.text_document(pages=2)
+        )
+
+    def test_highlights_apply(self):
+        pdf = corpus.text_document(pages=2)
+        xfdf = corpus.highlights_xfdf(pdf, count=20)
+        assert apply_redactions(pdf, xfdf)["redactions_applied"] == 20
+
+
+class TestCompare:
+    def test_flags_slowdowns_beyond_threshold(self):
+        baseline = {"a": {"median_s": 1.0}, "b": {"median_s": 1.0}}
+        results = {"a": {"median_s": 1.3}, "b": {"median_s": 1.2}}
+        assert compare(results, baseline, threshold=0.25) == ["a"]
+
+    def test_ignores_noise_and_new_benchmarks(self):
+        baseline = {"fast": {"median_s": 0.001}}
+        results = {
+            "fast": {"median_s": 0.001 + MIN_DELTA_SECONDS / 2},
+            "new": {"median_s": 9.0},
+        }
+        assert compare(results, baseline, threshold=0.25) == []
@@ -0,0 +1,143 @@
+import os
+
+from pdf_service.cache import ResultCache, result_key, result_keys
+from pdf_service.core.document_info import get_document_info
+from pdf_service.core.text_extraction import extract_text
+from pdf_service.sessions import DocumentStore
+
+
+class TestResultKey:
+    def test_depends_on_content_and_options(self, text_pdf, multi_page_pdf):
+        key = result_key("extract_text", text_pdf, pages=None)
+        assert key == result_key("extract_text", bytes(text_pdf), pages=None)
+        assert key != result_key("extract_text", multi_page_pdf, pages=None)
+        assert key != result_key("extract_text", text_pdf, pages=[1])
+        assert key != result_key("document_info", text_pdf, pages=None)
+
+    def test_keys_per_item(self, text_pdf):
+        keys = result_keys("extract_page", text_pdf, [0, 1], positions=True)
+        assert len(set(keys)) == 2
+        assert keys != result_keys("extract_page", text_pdf, [0, 1], positions=False)
+
+    def test_session_matches_bytes(self, text_pdf):
+        session = DocumentStore(max_bytes=10**7, ttl_seconds=60).open(text_pdf)
+        assert result_key("document_info", session) == result_key(
+            "document_info", text_pdf
+        )
+
+
+class TestResultCache:
+    def test_get_put_and_counters(self):
+        cache = ResultCache(max_bytes=10**6)
+        assert cache.get("a") is None
+        cache.put("a", {"value": 1})
+        assert cache.get("a") == {"value": 1}
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(max_bytes=30)
+        cache.put("a", "x" * 10)
+        cache.put("b", "y" * 10)
+        cache.get("a")
+        cache.put("c", "z" * 10)
+        assert cache.get("b") is None
+        assert cache.get("a") == "x" * 10
+        assert cache.stats()["bytes"] <= 30
+
+    def test_cached_computes_once(self, multi_page_pdf):
+        cache = ResultCache(max_bytes=10**6)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return get_document_info(multi_page_pdf)
+
+        first = cache.cached(lambda: result_key("info", multi_page_pdf), compute)
+        second = cache.cached(lambda: result_key("info", multi_page_pdf), compute)
+        assert first == second
+        assert len(calls) == 1
+
+    def test_disabled_cache_always_computes(self):
+        cache = ResultCache(max_bytes=0)
+        assert not cache.enabled
+        assert cache.cached(lambda: "unused", lambda: 1) == 1
+        assert cache.stats()["misses"] == 0
+
+    def test_store_each_keeps_pages_of_broken_stream(self, multi_page_pdf):
+        cache = ResultCache(max_bytes=10**6)
+        keys = result_keys("extract_page", multi_page_pdf, [0, 1, 2])
+        expected = list(extract_text(multi_page_pdf, None, False, None))
+
+        partial = cache.store_each(
+            keys, extract_text(multi_page_pdf, None, False, None)
+        )
+        next(partial)
+        partial.close()
+        assert list(cache.cached_prefix(keys)) == expected[:1]
+
+        assert list(cache.store_each(keys[1:], iter(expected[1:]))) == expected[1:]
+        assert list(cache.cached_prefix(keys)) == expected
+
+    def test_cached_prefix_stops_at_first_miss(self):
+        cache = ResultCache(max_bytes=10**6)
+        cache.put("a", 1)
+        cache.put("c", 3)
+        assert list(cache.cached_prefix(["a", "b", "c"])) == [1]
+        assert list(cache.cached_prefix(["", "a"])) == []
+
+
+class TestDiskTier:
+    def test_survives_restart(self, tmp_path, multi_page_pdf):
+        expected = list(extract_text(multi_page_pdf, None, True, None))
+        ResultCache(max_bytes=10**6, directory=str(tmp_path), max_disk_bytes=10**7).put(
+            "k", expected
+        )
+
+        restarted = ResultCache(
+            max_bytes=10**6, directory=str(tmp_path), max_disk_bytes=10**7
+        )
+        assert restarted.get("k") == expected
+        assert restarted.stats()["disk_hits"] == 1
+        assert restarted.get("k") == expected
+        assert restarted.stats()["hits"] == 1
+
+    def test_disk_only(self, tmp_path):
+        cache = ResultCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=10**6)
+        assert cache.enabled
+        cache.put("k", [1, 2, 3])
+        assert cache.get("k") == [1, 2, 3]
+
+    def test_disk_size_limit(self, tmp_path):
+        cache = ResultCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=250)
+        for i in range(5):
+            cache.put(f"k{i}", "x" * 100)
+            os.utime(tmp_path / f"k{i}.json", (i, i))
+        assert cache.get("k4") == "x" * 100
+        assert cache.get("k0") is None
+        assert cache.stats()["disk_bytes"] <= 250
+
+    def test_disk_evicts_to_low_water_mark(self, tmp_path, monkeypatch):
+        cache = ResultCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=1020)
+        scans = []
+        disk_files = cache._disk_files
+        monkeypatch.setattr(
+            cache, "_disk_files", lambda: scans.append(1) or disk_files()
+        )
+        for i in range(20):
+            cache.put(f"k{i}", "x" * 100)
+            os.utime(tmp_path / f"k{i}.json", (i, i))
+        # Every other write past the budget, not every one of the last ten.
+        assert len(scans) == 5
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            f"k{i}.json" for i in range(10, 20)
+        )
+        assert cache.stats()["disk_bytes"] == 10 * 102
+
+    def test_corrupt_disk_entry_is_a_miss(self, tmp_path):
+        cache = ResultCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=10**6)
+        cache.put("k", {"text": "page"})
+        (tmp_path / "k.json").write_bytes(b'{"text": "pa')
+        assert cache.get("k") is None
+        assert cache.stats()["misses"] == 1
+        assert not (tmp_path / "k.json").exists()
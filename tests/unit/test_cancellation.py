@@ -0,0 +1,214 @@
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+
+from pdf_service.admission import AdmissionController, Cost
+from pdf_service.core import cancellation, document_info, stages, text_extraction
+from pdf_service.core.cancellation import (
+    CancellationToken,
+    DeadlineExceeded,
+    OperationCancelled,
+)
+from pdf_service.core.redaction import apply_redactions
+from pdf_service.engine import ProcessPoolEngine
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc import messages
+from pdf_service.grpc.servicer import PdfServiceServicer
+from tests.unit.test_aio_servicer import run_with_stub
+
+
+def wait_until_cancelled(timeout=30.0):
+    """Stand-in for a long per-page loop."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        cancellation.check()
+        time.sleep(0.01)
+    return "finished"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = ProcessPoolEngine(max_workers=1)
+    yield engine
+    engine.shutdown()
+
+
+class TestCancellationToken:
+    def test_cancel(self):
+        token = CancellationToken()
+        token.check()
+        token.cancel()
+        assert token.cancelled
+        with pytest.raises(OperationCancelled) as excinfo:
+            token.check()
+        assert not isinstance(excinfo.value, DeadlineExceeded)
+
+    def test_deadline(self):
+        token = CancellationToken.from_timeout(0)
+        assert token.expired
+        with pytest.raises(DeadlineExceeded):
+            token.check()
+        assert not CancellationToken.from_timeout(None).expired
+
+    def test_callbacks(self):
+        token = CancellationToken()
+        calls = []
+        token.add_callback(lambda: calls.append("a"))
+        removed = lambda: calls.append("removed")  # noqa: E731
+        token.add_callback(removed)
+        token.remove_callback(removed)
+        token.cancel()
+        token.cancel()
+        token.add_callback(lambda: calls.append("late"))
+        assert calls == ["a", "late"]
+
+    def test_check_without_token_is_a_no_op(self):
+        cancellation.check()
+        token = CancellationToken()
+        token.cancel()
+        with cancellation.bind(token), pytest.raises(OperationCancelled):
+            cancellation.check()
+        cancellation.check()
+
+    def test_bound_steps(self):
+        token = CancellationToken()
+
+        def steps():
+            for n in range(3):
+                cancellation.check()
+                yield n
+
+        results = []
+        with pytest.raises(OperationCancelled):
+            for n in cancellation.bound_steps(token, steps()):
+                results.append(n)
+                token.cancel()
+        assert results == [0]
+
+
+class TestCoreLoops:
+    def test_extraction_stops(self, multi_page_pdf):
+        token = CancellationToken()
+        token.cancel()
+        with cancellation.bind(token), pytest.raises(OperationCancelled):
+            text_extraction.extract_all_text(multi_page_pdf, None, False, None)
+
+    def test_redaction_stops_between_stages(self, text_pdf, suggestion_xfdf):
+        token = CancellationToken()
+        seen = []
+
+        def observer(name, seconds):
+            seen.append(name)
+            if name == "apply_redactions":
+                token.cancel()
+
+        stages.add_observer(observer)
+        try:
+            with cancellation.bind(token), pytest.raises(OperationCancelled):
+                apply_redactions(text_pdf, suggestion_xfdf)
+        finally:
+            stages.remove_observer(observer)
+        assert "apply_redactions" in seen
+        assert "tobytes" not in seen
+
+
+class TestProcessPoolEngine:
+    def test_cancel_reaches_worker(self, engine):
+        token = CancellationToken()
+        with cancellation.bind(token):
+            future = engine.submit(wait_until_cancelled)
+        threading.Timer(0.5, token.cancel).start()
+        with pytest.raises(OperationCancelled):
+            future.result(timeout=30)
+        # The slot is released and reset for the next call.
+        assert engine.run(wait_until_cancelled, 0.05) == "finished"
+
+    def test_deadline_reaches_worker(self, engine):
+        with cancellation.bind(CancellationToken.from_timeout(0.5)):
+            future = engine.submit(wait_until_cancelled)
+        with pytest.raises(DeadlineExceeded):
+            future.result(timeout=30)
+
+    def test_cancelled_before_submit(self, engine):
+        token = CancellationToken()
+        token.cancel()
+        with cancellation.bind(token), pytest.raises(OperationCancelled):
+            engine.submit(wait_until_cancelled)
+
+
+def test_status_codes():
+    assert messages.status_for(DeadlineExceeded("late"))[0] == (
+        grpc.StatusCode.DEADLINE_EXCEEDED
+    )
+    assert messages.status_for(OperationCancelled("gone"))[0] == (
+        grpc.StatusCode.CANCELLED
+    )
+
+
+class TestRpcDeadlines:
+    @pytest.fixture
+    def outcome(self, monkeypatch):
+        """Replace document analysis with a loop recording how it ended."""
+        outcome = futures.Future()
+
+        def get_document_info(pdf_data):
+            try:
+                wait_until_cancelled()
+            except OperationCancelled as e:
+                outcome.set_result(e)
+                raise
+
+        monkeypatch.setattr(document_info, "get_document_info", get_document_info)
+        return outcome
+
+    def test_sync_server_stops_work_at_deadline(self, outcome, text_pdf):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        pb2_grpc.add_PdfServiceServicer_to_server(PdfServiceServicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        try:
+            with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = pb2_grpc.PdfServiceStub(channel)
+                with pytest.raises(grpc.RpcError) as excinfo:
+                    stub.GetDocumentInfo(pb2.PdfInput(pdf_data=text_pdf), timeout=0.5)
+            assert excinfo.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+            assert isinstance(outcome.result(timeout=10), DeadlineExceeded)
+        finally:
+            server.stop(grace=None)
+
+    def test_sync_server_stops_waiting_for_admission(self, text_pdf):
+        admission = AdmissionController(0, 1, queue_timeout=30)
+        held = admission.acquire(Cost(0))
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        pb2_grpc.add_PdfServiceServicer_to_server(
+            PdfServiceServicer(admission=admission), server
+        )
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        try:
+            with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = pb2_grpc.PdfServiceStub(channel)
+                with pytest.raises(grpc.RpcError) as excinfo:
+                    stub.GetDocumentInfo(pb2.PdfInput(pdf_data=text_pdf), timeout=0.5)
+            assert excinfo.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+            give_up = time.monotonic() + 10
+            while admission.queue_depth and time.monotonic() < give_up:
+                time.sleep(0.01)
+            assert admission.queue_depth == 0
+        finally:
+            admission.release(held)
+            server.stop(grace=None)
+
+    def test_async_server_stops_work_on_cancel(self, outcome, text_pdf):
+        async def call(stub):
+            rpc = stub.GetDocumentInfo(pb2.PdfInput(pdf_data=text_pdf))
+            await asyncio.sleep(0.5)
+            rpc.cancel()
+            return await asyncio.wait_for(asyncio.wrap_future(outcome), timeout=10)
+
+        assert type(run_with_stub(call)) is OperationCancelled
@@ -0,0 +1,163 @@
+import fitz
+import pytest
+
+from pdf_service.core import coverage, text_extraction
+from pdf_service.core.coverage import CoverageGrid, measure
+
+
+def image_pdf(image_rect, text=None) -> bytes:
+    """One A4 page with a white image at ``image_rect`` and optional text."""
+    png = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    png.clear_with(255)
+    doc = fitz.open()
+    page = doc.new_page()
+    if text:
+        page.insert_text((72, 72), text)
+    page.insert_image(fitz.Rect(image_rect), stream=png.tobytes("png"))
+    pdf_data = doc.tobytes()
+    doc.close()
+    return pdf_data
+
+
+def measure_first(pdf_data, full=True):
+    with fitz.open(stream=pdf_data, filetype="pdf") as doc:
+        return measure(doc[0], full=full)
+
+
+def outlines_pdf() -> bytes:
+    """One page of filled shapes, as text converted to outlines looks."""
+    doc = fitz.open()
+    page = doc.new_page()
+    for row in range(20):
+        for col in range(12):
+            x, y = 72 + col * 36, 72 + row * 30
+            page.draw_rect(fitz.Rect(x, y, x + 24, y + 18), fill=(0, 0, 0))
+    pdf_data = doc.tobytes()
+    doc.close()
+    return pdf_data
+
+
+class TestMeasure:
+    def test_has_text_matches_get_text(self, edge_case_pdf, mixed_pdf):
+        for pdf_data in (edge_case_pdf, mixed_pdf):
+            with fitz.open(stream=pdf_data, filetype="pdf") as doc:
+                for page in doc:
+                    assert measure(page).has_text == bool(page.get_text().strip())
+
+    def test_full_page_scan(self):
+        c = measure_first(image_pdf((0, 0, 595, 842)))
+        assert not c.has_text
+        assert c.image_coverage == pytest.approx(1)
+        assert coverage.likely_scanned(c)
+        assert coverage.ocr_pays_off(c)
+
+    def test_logo_on_blank_page_is_not_a_scan(self):
+        c = measure_first(image_pdf((20, 20, 60, 60)))
+        assert 0 < c.image_coverage < coverage.MIN_SCAN_COVERAGE
+        assert not coverage.likely_scanned(c)
+        assert not coverage.ocr_pays_off(c, force=True)
+
+    def test_text_page(self, text_pdf):
+        c = measure_first(text_pdf)
+        assert c.has_text
+        assert c.text_coverage > 0
+        assert c.image_coverage == 0
+        assert not coverage.ocr_pays_off(c, force=True)
+
+    def test_stamp_on_text_page_is_not_worth_ocr(self):
+        c = measure_first(image_pdf((400, 700, 450, 750), text="Signed"))
+        assert not coverage.ocr_pays_off(c, force=True)
+
+    def test_forced_ocr_of_attachment_on_text_page(self):
+        c = measure_first(image_pdf((72, 200, 520, 700), text="See attached"))
+        assert c.has_text
+        assert not coverage.ocr_pays_off(c)
+        assert coverage.ocr_pays_off(c, force=True)
+
+    def test_forced_ocr_of_outlined_text(self):
+        c = measure_first(outlines_pdf())
+        assert not c.has_text
+        assert c.drawing_coverage >= coverage.MIN_SCAN_COVERAGE
+        assert not coverage.likely_scanned(c)
+        assert not coverage.ocr_pays_off(c)
+        assert coverage.ocr_pays_off(c, force=True)
+
+    def test_forced_ocr_of_illegible_text(self, text_pdf):
+        c = measure_first(text_pdf)
+        assert not coverage.ocr_pays_off(c, illegible_text=True)
+        assert coverage.ocr_pays_off(c, force=True, illegible_text=True)
+
+    def test_fast_run_stops_at_first_glyph(self, monkeypatch):
+        doc = fitz.open()
+        page = doc.new_page()
+        for line in range(40):
+            # Separate text objects, each handed to the probe on its own.
+            page.insert_text((72, 72 + line * 15), f"Line {line}")
+        texts = []
+        text = coverage._Probe._text
+        monkeypatch.setattr(
+            coverage._Probe, "_text", lambda *args: texts.append(text(*args))
+        )
+        fast = measure(doc[0], full=False)
+        assert (fast.has_text, fast.complete, len(texts)) == (True, False, 1)
+        assert measure(doc[0]).complete
+        assert len(texts) == 41
+        doc.close()
+
+    def test_fast_run_measures_pages_without_text(self):
+        pdf_data = image_pdf((0, 0, 595, 842))
+        assert measure_first(pdf_data, full=False) == measure_first(pdf_data)
+
+    def test_forced_decision_needs_full_run(self, text_pdf):
+        c = measure_first(text_pdf, full=False)
+        assert not coverage.ocr_pays_off(c)
+        with pytest.raises(ValueError, match="full coverage"):
+            coverage.ocr_pays_off(c, force=True)
+
+
+class TestCoverageGrid:
+    def test_ratio(self):
+        grid = CoverageGrid(fitz.Rect(0, 0, 100, 100), size=10)
+        grid.add(0, 0, 50, 50)
+        grid.add(25, 25, 50, 50)
+        assert grid.ratio == pytest.approx(0.25)
+
+    def test_clips_to_bounds(self):
+        grid = CoverageGrid(fitz.Rect(0, 0, 100, 100), size=10)
+        grid.add(-50, -50, 200, 5)
+        assert grid.ratio == pytest.approx(0.1)
+
+    def test_ratio_without(self):
+        images = CoverageGrid(fitz.Rect(0, 0, 100, 100), size=10)
+        text = CoverageGrid(fitz.Rect(0, 0, 100, 100), size=10)
+        images.add(0, 0, 100, 50)
+        text.add(0, 0, 50, 100)
+        assert images.ratio_without(text) == pytest.approx(0.25)
+
+
+def test_extraction_skips_ocr_of_logo(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        text_extraction.ocr, "submit_page", lambda page, language: calls.append(page)
+    )
+    pdf_data = image_pdf((20, 20, 60, 60))
+    pages = list(text_extraction.extract_text(pdf_data, None, False, {"enabled": True}))
+    assert pages[0]["text"] == ""
+    assert calls == []
+
+
+def test_forced_extraction_ocrs_outlined_text(monkeypatch, text_pdf):
+    calls = []
+    monkeypatch.setattr(
+        text_extraction.ocr,
+        "submit_page",
+        lambda page, language: calls.append(page) or page.get_textpage(),
+    )
+    for pdf_data in (outlines_pdf(), text_pdf):
+        list(text_extraction.extract_text(pdf_data, None, False, {"enabled": True}))
+        list(
+            text_extraction.extract_text(
+                pdf_data, None, False, {"enabled": True, "force": True}
+            )
+        )
+    assert len(calls) == 1
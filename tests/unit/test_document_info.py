@@ -1,6 +1,16 @@
+import fitz
 import pytest
 
-from pdf_service.core.document_info import get_document_info
+from pdf_service.core import coverage
+from pdf_service.core.document_info import (
+    annotation_count,
+    get_document_info,
+    get_triage,
+    merge,
+    sample_page_numbers,
+    scanned_estimate,
+    stream_document_info,
+)
 
 
 class TestGetDocumentInfo:
@@ -26,8 +36,6 @@ class TestGetDocumentInfo:
         assert result["pages"][0]["likely_scanned"] is True
 
     def test_reports_annotation_count(self):
-        import fitz
-
         doc = fitz.open()
         page = doc.new_page()
         page.insert_text((72, 72), "Hello World", fontsize=12)
@@ -82,3 +90,111 @@ class TestGetDocumentInfo:
         assert result["pages"][0]["has_text"] is True
         assert result["pages"][1]["has_text"] is False
         assert result["pages"][1]["has_images"] is True
+
+    def test_page_range(self, multi_page_pdf):
+        result = get_document_info(multi_page_pdf, 1, 3)
+        assert result["page_count"] == 3
+        assert [p["page_number"] for p in result["pages"]] == [1, 2]
+
+    def test_merge_matches_whole_document(self, mixed_pdf):
+        parts = [get_document_info(mixed_pdf, 0, 1), get_document_info(mixed_pdf, 1)]
+        assert merge(parts) == get_document_info(mixed_pdf)
+
+
+class TestFastAnalysis:
+    def test_text_detection_stops_at_first_glyph(self, monkeypatch):
+        # Guards the fast path: text pages must not be walked past the glyph
+        # that answers has_text, whatever is drawn after it.
+        doc = fitz.open()
+        for _ in range(3):
+            page = doc.new_page()
+            for line in range(30):
+                page.insert_text((72, 72 + line * 15), f"Line {line}")
+            page.draw_rect(fitz.Rect(72, 600, 300, 700), fill=(0, 0, 0))
+            pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+            page.insert_image(fitz.Rect(0, 0, 595, 842), pixmap=pixmap)
+        pdf_data = doc.tobytes()
+        doc.close()
+        seen = []
+        for name in ("_text", "_image", "_path"):
+            original = getattr(coverage._Probe, name)
+            monkeypatch.setattr(
+                coverage._Probe,
+                name,
+                lambda *args, _name=name, _original=original: (
+                    seen.append(_name),
+                    _original(*args),
+                ),
+            )
+        result = get_document_info(pdf_data)
+        assert all(page["has_text"] for page in result["pages"])
+        assert seen == ["_text"] * 3
+
+    def test_annotation_count_matches_annots(self, edge_case_pdf):
+        with fitz.open(stream=edge_case_pdf, filetype="pdf") as doc:
+            counts = [annotation_count(page) for page in doc]
+            assert counts == [len(list(page.annots())) for page in doc]
+        assert counts[5] == 2
+
+
+class TestStreamDocumentInfo:
+    def test_header_then_batches(self, multi_page_pdf):
+        header, *batches = stream_document_info(multi_page_pdf, 0, None, 2)
+        assert header["pages"] == []
+        assert header["page_count"] == 3
+        assert [[p["page_number"] for p in b["pages"]] for b in batches] == [
+            [0, 1],
+            [2],
+        ]
+        assert merge(batches)["pages"] == get_document_info(multi_page_pdf)["pages"]
+
+    def test_page_range(self, multi_page_pdf):
+        _, *batches = stream_document_info(multi_page_pdf, 1, 2, 50)
+        assert [p["page_number"] for p in batches[0]["pages"]] == [1]
+
+    @pytest.mark.parametrize("start, stop", [(-1, None), (3, None), (2, 1), (0, 4)])
+    def test_rejects_invalid_range(self, multi_page_pdf, start, stop):
+        with pytest.raises(ValueError, match="Page range out of range"):
+            next(stream_document_info(multi_page_pdf, start, stop, 50))
+
+    def test_raises_for_encrypted_pdf(self, encrypted_pdf):
+        with pytest.raises(ValueError, match="PDF is encrypted"):
+            next(stream_document_info(encrypted_pdf, 0, None, 50))
+
+
+class TestTriage:
+    def test_metadata_only(self, multi_page_pdf):
+        result = get_triage(multi_page_pdf)
+        assert result["page_count"] == 3
+        assert result["file_size_bytes"] == len(multi_page_pdf)
+        assert set(result["metadata"]) == {"title", "author", "producer", "creator"}
+        assert result["sampled_pages"] == []
+        assert result["confidence"] == 0.0
+
+    def test_samples_match_full_analysis(self, mixed_pdf):
+        result = get_triage(mixed_pdf, sample_pages=5)
+        assert result["sampled_pages"] == get_document_info(mixed_pdf)["pages"]
+        assert result["estimated_scanned_ratio"] == 0.5
+        assert result["confidence"] == 1.0
+
+    def test_reports_encrypted_pdf(self, encrypted_pdf):
+        result = get_triage(encrypted_pdf, sample_pages=3)
+        assert result["is_encrypted"] is True
+        assert result["sampled_pages"] == []
+
+    def test_rejects_negative_sample(self, text_pdf):
+        with pytest.raises(ValueError, match="sample_pages"):
+            get_triage(text_pdf, sample_pages=-1)
+
+    def test_sample_spreads_over_document(self):
+        assert sample_page_numbers(100, 4) == [12, 37, 62, 87]
+        assert sample_page_numbers(3, 10) == [0, 1, 2]
+        assert sample_page_numbers(5, 0) == []
+
+    def test_confidence_grows_with_sample(self):
+        confidences = [scanned_estimate(0, n, 1000)[1] for n in (1, 10, 100, 999)]
+        assert confidences == sorted(confidences)
+        assert 0 < confidences[0] < confidences[-1] < 1
+        ratio, confidence = scanned_estimate(5, 10, 1000)
+        assert ratio == 0.5
+        assert confidence < scanned_estimate(0, 10, 1000)[1]
@@ -0,0 +1,474 @@
+import os
+import threading
+import time
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+import pytest
+
+from pdf_service import engine as engine_module
+from pdf_service.config import ServiceConfig
+from pdf_service.core import ocr, stages, text_extraction
+from pdf_service.core.document_info import analyze_document, get_document_info
+from pdf_service.core.text_extraction import extract_text
+from pdf_service.engine import (
+    OCR_THREAD_LIMIT_ENV,
+    InlineEngine,
+    OcrPool,
+    ProcessPoolEngine,
+    WorkerCrashedError,
+    build_engine,
+)
+from pdf_service.sessions import DocumentStore
+
+
+@pytest.fixture(scope="module")
+def process_engine():
+    engine = ProcessPoolEngine(max_workers=2, batch_pages=2)
+    yield engine
+    engine.shutdown()
+
+
+class TestInlineEngine:
+    def test_run_returns_result(self, text_pdf):
+        result = InlineEngine().run(get_document_info, text_pdf)
+        assert result["page_count"] == 1
+
+    def test_submit_captures_exception(self):
+        future = InlineEngine().submit(get_document_info, b"")
+        with pytest.raises(ValueError, match="Empty PDF data"):
+            future.result()
+
+    def test_extract_text_streams_pages(self, multi_page_pdf):
+        pages = list(InlineEngine().extract_text(multi_page_pdf, None, False, None))
+        assert [p["page_number"] for p in pages] == [0, 1, 2]
+
+    def test_run_document_uses_open_session(self, text_pdf):
+        session = DocumentStore(10**7, 60).open(text_pdf)
+        result = InlineEngine().run_document(
+            session,
+            get_document_info,
+            lambda s: analyze_document(s.doc, s.size) | {"page_count": -1},
+        )
+        assert result["page_count"] == -1
+
+    def test_analyze_document_uses_open_session(self, multi_page_pdf):
+        session = DocumentStore(10**7, 60).open(multi_page_pdf)
+        result = InlineEngine().analyze_document(session)
+        assert result == get_document_info(multi_page_pdf)
+        assert not session.lock.locked()
+
+    def test_stream_document_info_from_session(self, multi_page_pdf):
+        session = DocumentStore(10**7, 60).open(multi_page_pdf)
+        results = InlineEngine().stream_document_info(session, 1, None, 1)
+        header, *batches = results
+        assert header["page_count"] == 3
+        assert [b["pages"][0]["page_number"] for b in batches] == [1, 2]
+        assert not session.lock.locked()
+
+    def test_extract_document_from_session(self, multi_page_pdf):
+        session = DocumentStore(10**7, 60).open(multi_page_pdf)
+        pages = list(InlineEngine().extract_document(session, [1], False, None))
+        assert "Project Alpha" in pages[0]["text"]
+        assert not session.lock.locked()
+
+
+class TestProcessPoolEngine:
+    def test_run_returns_result(self, process_engine, multi_page_pdf):
+        result = process_engine.run(get_document_info, multi_page_pdf)
+        assert result["page_count"] == 3
+
+    def test_reports_worker_stage_timings(self, process_engine, multi_page_pdf):
+        recorded = []
+        stages.add_observer(lambda name, seconds: recorded.append(name))
+        try:
+            process_engine.run(get_document_info, multi_page_pdf)
+        finally:
+            stages._observers.pop()
+        assert recorded.count("coverage") == 3
+        assert "fitz_open" in recorded
+
+    def test_worker_pids(self, process_engine, text_pdf):
+        process_engine.run(get_document_info, text_pdf)
+        assert process_engine.worker_pids()
+        assert InlineEngine().worker_pids() == []
+
+    def test_propagates_value_error(self, process_engine):
+        with pytest.raises(ValueError, match="Invalid or corrupt PDF"):
+            process_engine.run(get_document_info, b"not a pdf")
+
+    def test_analyze_document_splits_pages(self, mixed_pdf, multi_page_pdf):
+        engine = ProcessPoolEngine(max_workers=2, analysis_pages=1)
+        try:
+            assert engine.analyze_document(mixed_pdf) == get_document_info(mixed_pdf)
+            result = engine.analyze_document(multi_page_pdf)
+        finally:
+            engine.shutdown()
+        assert result == get_document_info(multi_page_pdf)
+        assert [p["page_number"] for p in result["pages"]] == [0, 1, 2]
+
+    def test_analyze_document_shares_pdf_once(self, monkeypatch, large_text_pdf):
+        engine = ProcessPoolEngine(max_workers=2, analysis_pages=10)
+        submitted = []
+        submit = engine.submit
+
+        def record(fn, *args):
+            submitted.append((fn, args))
+            return submit(fn, *args)
+
+        monkeypatch.setattr(engine, "submit", record)
+        try:
+            result = engine.analyze_document(large_text_pdf)
+        finally:
+            engine.shutdown()
+        assert result == get_document_info(large_text_pdf)
+        # One range per worker; no separate round trip for the page count.
+        assert [args[1:] for _, args in submitted] == [(0, 25), (25, 50)]
+        assert {fn for fn, _ in submitted} == {engine_module._analyze_shared_range}
+        assert len({args[0] for _, args in submitted}) == 1
+
+    @pytest.mark.parametrize("peeked", [None, 1, 10])
+    def test_analyze_document_trusts_first_range_for_page_count(
+        self, monkeypatch, multi_page_pdf, peeked
+    ):
+        monkeypatch.setattr(engine_module, "peek_page_count", lambda data: peeked)
+        engine = ProcessPoolEngine(max_workers=2, analysis_pages=1)
+        try:
+            result = engine.analyze_document(multi_page_pdf)
+        finally:
+            engine.shutdown()
+        assert result == get_document_info(multi_page_pdf)
+
+    def test_analyze_document_validates_pdf(self, process_engine, encrypted_pdf):
+        with pytest.raises(ValueError, match="PDF is encrypted"):
+            process_engine.analyze_document(encrypted_pdf)
+
+    def test_stream_document_info_matches_inline(self, process_engine, mixed_pdf):
+        expected = list(InlineEngine().stream_document_info(mixed_pdf, 0, None, 1))
+        results = list(process_engine.stream_document_info(mixed_pdf, 0, None, 1))
+        assert results == expected
+
+    def test_stream_document_info_opens_document_once(self, large_text_pdf):
+        engine = ProcessPoolEngine(max_workers=1)
+        recorded = []
+        stages.add_observer(lambda name, seconds: recorded.append(name))
+        try:
+            results = list(engine.stream_document_info(large_text_pdf, 0, None, 4))
+            list(engine.stream_document_info(large_text_pdf, 0, 8, 4))
+        finally:
+            stages._observers.pop()
+            engine.shutdown()
+        assert len(results) > 2
+        assert recorded.count("fitz_open") == 2
+
+    def test_stream_document_info_frees_shared_memory(
+        self, monkeypatch, process_engine, mixed_pdf
+    ):
+        created = []
+        shared_memory = engine_module.shared_memory.SharedMemory
+
+        def track(*args, **kwargs):
+            memory = shared_memory(*args, **kwargs)
+            created.append(memory.name)
+            return memory
+
+        monkeypatch.setattr(engine_module.shared_memory, "SharedMemory", track)
+        stream = process_engine.stream_document_info(mixed_pdf, 0, None, 1)
+        next(stream)
+        stream.close()
+        (name,) = created
+        with pytest.raises(FileNotFoundError):
+            shared_memory(name)
+
+    def test_worker_closes_documents_of_finished_calls(self, text_pdf):
+        with engine_module._shared_pdf(text_pdf) as live:
+            with engine_module._shared_pdf(text_pdf) as finished:
+                done = engine_module._open_shared_document(finished)
+                kept = engine_module._open_shared_document(live)
+            try:
+                engine_module._close_finished_documents()
+                assert list(engine_module._shared_documents) == [live]
+                assert done.is_closed
+                assert not kept.is_closed
+            finally:
+                engine_module._shared_documents.clear()
+                kept.close()
+
+    def test_stream_document_info_validates_pdf(self, process_engine):
+        with pytest.raises(ValueError, match="Invalid or corrupt PDF"):
+            list(process_engine.stream_document_info(b"not a pdf", 0, None, 1))
+
+    def test_extract_text_matches_inline(self, process_engine, multi_page_pdf):
+        expected = list(extract_text(multi_page_pdf, None, True, None))
+        pages = list(process_engine.extract_text(multi_page_pdf, None, True, None))
+        assert pages == expected
+
+    def test_extract_text_keeps_requested_order(self, process_engine, multi_page_pdf):
+        pages = list(
+            process_engine.extract_text(multi_page_pdf, [2, 0, 1], False, None)
+        )
+        assert [p["page_number"] for p in pages] == [2, 0, 1]
+
+    def test_extract_text_streams_window_in_order(self, large_text_pdf):
+        engine = _ThreadedEngine(max_workers=2, batch_pages=1, extract_window=3)
+        try:
+            pages = list(engine.extract_text(large_text_pdf, None, False, None))
+        finally:
+            engine.shutdown()
+        expected = list(extract_text(large_text_pdf, None, False, None))
+        assert pages == expected
+        assert engine.peak == 3
+        # Later batches finished first, yet nothing was streamed out of order.
+        assert engine.finished != sorted(engine.finished)
+
+    def test_extract_text_cancels_window_when_closed(self, large_text_pdf):
+        engine = _ThreadedEngine(max_workers=1, batch_pages=1, extract_window=3)
+        try:
+            stream = engine.extract_text(large_text_pdf, None, False, None)
+            next(stream)
+            stream.close()
+        finally:
+            engine.shutdown()
+        assert len(engine.submitted) == 3
+        assert any(f.cancelled() for f in engine.submitted)
+
+    def test_extract_text_validates_pages(self, process_engine, text_pdf):
+        with pytest.raises(ValueError, match="Page numbers out of range"):
+            list(process_engine.extract_text(text_pdf, [9], False, None))
+
+    def test_run_document_sends_session_bytes(self, process_engine, text_pdf):
+        session = DocumentStore(10**7, 60).open(text_pdf)
+        result = process_engine.run_document(
+            session, get_document_info, lambda s: pytest.fail("used open document")
+        )
+        assert result["file_size_bytes"] == len(text_pdf)
+
+    def test_recovers_from_worker_crash(self, text_pdf):
+        engine = ProcessPoolEngine(max_workers=1)
+        try:
+            with pytest.raises(WorkerCrashedError):
+                engine.run(os._exit, 1)
+            assert engine.run(get_document_info, text_pdf)["page_count"] == 1
+        finally:
+            engine.shutdown()
+
+    def test_rejects_invalid_sizes(self):
+        with pytest.raises(ValueError, match="max_workers"):
+            ProcessPoolEngine(max_workers=0)
+        with pytest.raises(ValueError, match="analysis_pages"):
+            ProcessPoolEngine(max_workers=1, analysis_pages=0)
+        with pytest.raises(ValueError, match="extract_window"):
+            ProcessPoolEngine(max_workers=1, extract_window=0)
+        with pytest.raises(ValueError, match="ocr_pages_per_request"):
+            ProcessPoolEngine(max_workers=1, ocr_pages_per_request=0)
+
+    def test_ocr_pages_go_to_ocr_pool(self, fake_tesseract, scanned_pdf, text_pdf):
+        ocr_pool = _ThreadedOcrPool()
+        engine = ProcessPoolEngine(
+            max_workers=2, batch_pages=2, ocr_pool=ocr_pool, ocr_pages_per_request=2
+        )
+        pdf_data = _interleaved(scanned_pdf, text_pdf, 7)
+        try:
+            # Workers have no Tesseract here: they must leave OCR to the pool.
+            recorded = []
+            stages.add_observer(lambda name, seconds: recorded.append(name))
+            try:
+                pages = list(
+                    engine.extract_text(pdf_data, None, False, {"enabled": True})
+                )
+            finally:
+                stages._observers.pop()
+            assert [p["page_number"] for p in pages] == list(range(7))
+            # Pages are measured once, by the workers that deferred them.
+            assert recorded.count("coverage") == 7
+            assert {type(pdf) for pdf in ocr_pool.pdfs} == {engine_module._SharedPdf}
+            assert len(set(ocr_pool.pdfs)) == 1
+            assert ["Recognized" in p["text"] for p in pages] == [
+                n % 2 == 0 for n in range(7)
+            ]
+            assert sorted(ocr_pool.pages) == [0, 2, 4, 6]
+            assert ocr_pool.peak == 2
+            assert engine.ocr_queue_depth() == 0
+        finally:
+            engine.shutdown()
+        assert ocr_pool.closed
+
+    def test_without_ocr_no_pool_calls(self, multi_page_pdf):
+        ocr_pool = _ThreadedOcrPool()
+        engine = ProcessPoolEngine(max_workers=1, ocr_pool=ocr_pool)
+        try:
+            assert (
+                len(list(engine.extract_text(multi_page_pdf, None, False, None))) == 3
+            )
+            assert ocr_pool.pages == []
+        finally:
+            engine.shutdown()
+
+
+class TestOcrPool:
+    def test_recognizes_in_worker(self):
+        pool = OcrPool(max_workers=1)
+        try:
+            future = pool.submit(b"\xff" * 300, 10, 10, "eng")
+            # Tesseract is not installed here; its error crosses the process.
+            with pytest.raises(RuntimeError, match="Tesseract"):
+                future.result()
+            assert pool.worker_pids()
+            assert pool.queue_depth == 0
+        finally:
+            pool.shutdown()
+
+    def test_queue_depth_counts_pages_beyond_workers(self, monkeypatch):
+        pool = OcrPool(max_workers=1)
+        gate = futures.Future()
+        monkeypatch.setattr(pool, "_pool", _GatedPool(gate))
+        submitted = [pool.submit(b"", 1, 1, "eng") for _ in range(3)]
+        assert pool.queue_depth == 2
+        gate.set_result(None)
+        assert [f.result() for f in submitted] == [b"%PDF"] * 3
+        assert pool.queue_depth == 0
+
+    def test_recovers_from_worker_crash(self):
+        pool = OcrPool(max_workers=1)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                pool._pool.submit(os._exit, 1).result()
+            with pytest.raises(WorkerCrashedError):
+                pool.submit(b"\xff" * 300, 10, 10, "eng").result()
+            with pytest.raises(RuntimeError, match="Tesseract"):
+                pool.submit(b"\xff" * 300, 10, 10, "eng").result()
+        finally:
+            pool.shutdown()
+
+    def test_rejects_invalid_size(self):
+        with pytest.raises(ValueError, match="max_workers"):
+            OcrPool(max_workers=0)
+
+
+class TestBuildEngine:
+    def test_thread_engine(self):
+        engine = build_engine(ServiceConfig(engine="thread", ocr_workers=0))
+        assert isinstance(engine, InlineEngine)
+        assert engine.worker_pids() == []
+
+    def test_thread_engine_ocr_pool(self, monkeypatch):
+        monkeypatch.delenv(OCR_THREAD_LIMIT_ENV, raising=False)
+        config = ServiceConfig(
+            engine="thread", ocr_workers=1, ocr_threads=2, ocr_pages_per_request=3
+        )
+        engine = build_engine(config)
+        try:
+            assert os.environ[OCR_THREAD_LIMIT_ENV] == "2"
+            assert ocr.pages_in_flight() == 3
+            assert engine.ocr_queue_depth() == 0
+        finally:
+            engine.shutdown()
+            ocr.set_recognizer(None)
+
+    def test_process_engine(self):
+        engine = build_engine(
+            ServiceConfig(engine="process", process_workers=1, ocr_threads=0)
+        )
+        try:
+            assert isinstance(engine, ProcessPoolEngine)
+        finally:
+            engine.shutdown()
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError, match="Unknown execution engine"):
+            build_engine(ServiceConfig(engine="gpu"))
+
+
+def _interleaved(odd_pdf, even_pdf, pages):
+    """``pages`` pages alternating the first page of the two PDFs."""
+    with (
+        fitz.open(stream=odd_pdf, filetype="pdf") as odd,
+        fitz.open(stream=even_pdf, filetype="pdf") as even,
+        fitz.open() as doc,
+    ):
+        for number in range(pages):
+            doc.insert_pdf(odd if number % 2 == 0 else even)
+        return doc.tobytes()
+
+
+class _ThreadedOcrPool:
+    """Stands in for OcrPool: calls run on threads of this process."""
+
+    def __init__(self):
+        self._threads = futures.ThreadPoolExecutor(max_workers=4)
+        self._lock = threading.Lock()
+        self.pages = []
+        self.pdfs = []
+        self.running = 0
+        self.peak = 0
+        self.closed = False
+        self.queue_depth = 0
+
+    def call(self, fn, *args):
+        with self._lock:
+            self.pdfs.append(args[0])
+            self.pages.append(args[1])
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+
+        def run():
+            time.sleep(0.02)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        return self._threads.submit(run)
+
+    def shutdown(self):
+        self.closed = True
+        self._threads.shutdown(wait=True)
+
+
+class _GatedPool:
+    """Stands in for the OCR pool's executor; calls finish once ``gate`` is set."""
+
+    def __init__(self, gate):
+        self._gate = gate
+
+    def submit(self, fn, *args):
+        future = futures.Future()
+        self._gate.add_done_callback(lambda _: future.set_result((b"%PDF", [])))
+        return future
+
+
+class _ThreadedEngine(ProcessPoolEngine):
+    """Runs extraction batches on threads, later pages finishing sooner."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._threads = futures.ThreadPoolExecutor(max_workers=kwargs["max_workers"])
+        self._lock = threading.Lock()
+        self.submitted = []
+        self.finished = []
+        self.running = 0
+        self.peak = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        if fn is not text_extraction.extract_all_text:
+            return self._threads.submit(fn, *args, **kwargs)
+
+        def batch():
+            page = args[1][0]
+            time.sleep(0.02 * (3 - page % 3))
+            with self._lock:
+                self.finished.append(page)
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            future = self._threads.submit(batch)
+            self.submitted.append(future)
+            pending = sum(not f.done() for f in self.submitted)
+            self.peak = max(self.peak, pending)
+        return future
+
+    def shutdown(self):
+        self._threads.shutdown(wait=True, cancel_futures=True)
+        super().shutdown()
@@ -0,0 +1,68 @@
+import pytest
+
+from pdf_service.cache import ResultCache
+from pdf_service.core import text_extraction
+from pdf_service.engine import InlineEngine
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.grpc.extraction import Extraction
+
+
+def stream(request, results=None):
+    extraction = Extraction(
+        InlineEngine(), results or ResultCache(0), request.pdf_data, request
+    )
+    return extraction.responses(extraction.page_results(extraction.extract))
+
+
+def test_resume_after_token(large_text_pdf):
+    request = pb2.ExtractTextRequest(
+        pdf_data=large_text_pdf, start_page=10, end_page=20
+    )
+    first = list(stream(request))
+    assert [r.page_number for r in first] == list(range(10, 20))
+
+    request.resume_token = first[3].resume_token
+    resumed = list(stream(request))
+    assert resumed == first[4:]
+
+    request.resume_token = first[-1].resume_token
+    assert list(stream(request)) == []
+
+
+def test_rejects_token_of_other_request(multi_page_pdf):
+    request = pb2.ExtractTextRequest(pdf_data=multi_page_pdf)
+    token = next(stream(request)).resume_token
+    request.include_word_positions = True
+    request.resume_token = token
+    with pytest.raises(ValueError, match="Resume token"):
+        list(stream(request))
+    request.include_word_positions = False
+    request.resume_token = "99." + token.partition(".")[2]
+    with pytest.raises(ValueError, match="Resume token"):
+        list(stream(request))
+
+
+def test_resumed_stream_reuses_cached_pages(monkeypatch, multi_page_pdf):
+    results = ResultCache(10**6)
+    request = pb2.ExtractTextRequest(pdf_data=multi_page_pdf)
+    responses = stream(request, results)
+    first = next(responses)
+    responses.close()
+
+    extracted = []
+    extract = text_extraction.extract_document_text
+
+    def record(doc, pages, *args):
+        extracted.extend(pages)
+        return extract(doc, pages, *args)
+
+    monkeypatch.setattr(text_extraction, "extract_document_text", record)
+    # A plain retry gets the cached first page and extracts only the rest.
+    retried = list(stream(request, results))
+    assert retried[0] == first
+    assert extracted == [1, 2]
+
+    extracted.clear()
+    request.resume_token = retried[1].resume_token
+    assert list(stream(request, results)) == retried[2:]
+    assert extracted == []
@@ -0,0 +1,69 @@
+from concurrent import futures
+
+import grpc
+import pytest
+
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc.servicer import PdfServiceServicer
+from tests.load import loadgen
+
+
+class TestHelpers:
+    def test_parse_mix(self):
+        assert loadgen.parse_mix("info=3, extract") == {"info": 3.0, "extract": 1.0}
+        with pytest.raises(ValueError, match="Unknown RPC"):
+            loadgen.parse_mix("info=1,ocr=2")
+        with pytest.raises(ValueError, match="no positive weight"):
+            loadgen.parse_mix("info=0")
+
+    def test_percentile(self):
+        values = [float(n) for n in range(1, 101)]
+        assert loadgen.percentile(values, 0.5) == 50.0
+        assert loadgen.percentile(values, 0.99) == 99.0
+        assert loadgen.percentile([], 0.99) == 0.0
+
+    def test_parse_rss(self):
+        text = (
+            "# TYPE pdfcore_process_resident_memory_bytes gauge\n"
+            "pdfcore_process_resident_memory_bytes 1048576\n"
+            "pdfcore_worker_resident_memory_bytes 0\n"
+            "pdfcore_sessions_open 2\n"
+        )
+        assert loadgen.parse_rss(text) == {
+            loadgen.SERVER_RSS: 1048576.0,
+            loadgen.WORKER_RSS: 0.0,
+        }
+
+    def test_summarize_counts_errors_by_code(self):
+        samples = [
+            loadgen.Sample("info", 1.0, 0.1, "OK"),
+            loadgen.Sample("info", 1.0, 0.3, "OK"),
+            loadgen.Sample("redact", 1.0, 5.0, "RESOURCE_EXHAUSTED"),
+        ]
+        summary = loadgen.summarize(samples, elapsed=2.0)
+        assert summary["all"]["requests"] == 3
+        assert summary["all"]["rps"] == 1.5
+        assert summary["GetDocumentInfo"]["p99_s"] == 0.3
+        assert summary["ApplyRedactions"]["codes"] == {"RESOURCE_EXHAUSTED": 1}
+        assert summary["ApplyRedactions"]["max_s"] == 0.0
+
+
+def test_run_against_server():
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    pb2_grpc.add_PdfServiceServicer_to_server(PdfServiceServicer(), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        report = loadgen.run(
+            f"127.0.0.1:{port}",
+            loadgen.parse_mix("info,extract,suggest,redact"),
+            concurrency=2,
+            duration=0.5,
+            sizes=[2],
+            interval=0.2,
+        )
+    finally:
+        server.stop(grace=None)
+    assert report["rpcs"]["all"]["requests"] > 0
+    assert report["rpcs"]["all"]["codes"].keys() == {"OK"}
+    assert report["timeline"]
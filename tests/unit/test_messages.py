@@ -0,0 +1,95 @@
+import array
+
+import pytest
+
+from pdf_service.core.document_info import stream_document_info
+from pdf_service.core.text_extraction import extract_text
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.grpc.messages import (
+    Upload,
+    document_info_chunks,
+    page_text_response,
+    redaction_chunks,
+)
+
+
+class TestUpload:
+    def test_joins_chunks(self):
+        upload = Upload(pb2.PdfInput())
+        for chunk in (b"%PDF-", b"1.7", b"..."):
+            upload.add(pb2.GetDocumentInfoUploadRequest(chunk=chunk))
+        assert bytes(upload.pdf_data) == b"%PDF-1.7..."
+
+    def test_header_replaces_default(self):
+        upload = Upload(pb2.ExtractTextRequest())
+        upload.add(
+            pb2.ExtractTextUploadRequest(
+                header=pb2.ExtractTextRequest(pages=[2], pdf_data=b"abc")
+            )
+        )
+        upload.add(pb2.ExtractTextUploadRequest(chunk=b"def"))
+        assert list(upload.header.pages) == [2]
+        assert upload.header.pdf_data == b""
+        assert bytes(upload.pdf_data) == b"abcdef"
+
+    def test_header_after_chunk_rejected(self):
+        upload = Upload(pb2.ExtractTextRequest())
+        upload.add(pb2.ExtractTextUploadRequest(chunk=b"abc"))
+        with pytest.raises(ValueError, match="first message"):
+            upload.add(pb2.ExtractTextUploadRequest(header=pb2.ExtractTextRequest()))
+
+    def test_enforces_max_size(self):
+        upload = Upload(pb2.PdfInput(), max_size=4)
+        upload.add(pb2.GetDocumentInfoUploadRequest(chunk=b"abcd"))
+        with pytest.raises(ValueError, match="exceeds 4 bytes"):
+            upload.add(pb2.GetDocumentInfoUploadRequest(chunk=b"e"))
+
+
+class TestRedactionChunks:
+    def test_summary_then_chunks(self):
+        result = {
+            "pdf_data": b"0123456789",
+            "redactions_applied": 2,
+            "content_hash": b"h" * 32,
+            "redaction_log": [],
+        }
+        responses = list(redaction_chunks(result, 4))
+        assert responses[0].summary.redactions_applied == 2
+        assert responses[0].summary.pdf_data == b""
+        assert [r.chunk for r in responses[1:]] == [b"0123", b"4567", b"89"]
+
+
+class TestDocumentInfoChunks:
+    def test_header_pages_then_summary(self, mixed_pdf):
+        results = stream_document_info(mixed_pdf, 0, None, 1)
+        header, *batches, summary = document_info_chunks(results)
+        assert header.header.page_count == 2
+        assert [b.pages.pages[0].page_number for b in batches] == [0, 1]
+        assert batches[1].pages.pages[0].likely_scanned
+        assert summary.summary.has_text_content
+        assert summary.summary.existing_annotation_count == 0
+
+
+class TestPageTextResponse:
+    def test_packed_blocks(self, multi_page_pdf):
+        (page,) = extract_text(multi_page_pdf, [1], True, None, True)
+        response = page_text_response(page)
+        packed = response.packed_blocks
+        assert not response.blocks
+        assert (
+            array.array("i", packed.line_offsets).tolist()
+            == (page["packed_blocks"]["line_offsets"])
+        )
+        assert array.array("f", packed.bboxes).tolist() == pytest.approx(
+            page["packed_blocks"]["bboxes"]
+        )
+        assert (
+            array.array("i", packed.block_line_counts).tolist()
+            == (page["packed_blocks"]["block_line_counts"])
+        )
+
+    def test_blocks(self, text_pdf):
+        (page,) = extract_text(text_pdf, None, True, None)
+        response = page_text_response(page)
+        assert len(response.blocks) == len(page["blocks"])
+        assert not response.HasField("packed_blocks")
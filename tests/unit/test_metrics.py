@@ -0,0 +1,351 @@
+import asyncio
+import threading
+import urllib.request
+from concurrent import futures
+
+import grpc
+import pytest
+
+from pdf_service import metrics, server
+from pdf_service.config import ServiceConfig
+from pdf_service.core import stages
+from pdf_service.core.redaction import apply_redactions
+from pdf_service.engine import InlineEngine
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc.aio_servicer import AsyncPdfServiceServicer
+from pdf_service.grpc.interceptors import (
+    AsyncCompressionInterceptor,
+    AsyncMetricsInterceptor,
+    CompressionInterceptor,
+    MetricsInterceptor,
+)
+from pdf_service.grpc.servicer import PdfServiceServicer
+
+
+class TestRegistry:
+    def test_counter_and_gauge(self):
+        registry = metrics.Registry()
+        counter = registry.register(
+            metrics.Counter("test_total", "Things.", labels=("kind",))
+        )
+        gauge = registry.register(metrics.Gauge("test_level", "Level."))
+        counter.inc(kind="a")
+        counter.inc(2, kind="a")
+        gauge.set_function(lambda: 7)
+        text = registry.render()
+        assert "# TYPE test_total counter" in text
+        assert 'test_total{kind="a"} 3' in text
+        assert "test_level 7" in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Time.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        lines = list(histogram.samples())
+        assert lines[:3] == [
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+        ]
+        assert lines[-1] == "test_seconds_count 4"
+        assert histogram.sum() == pytest.approx(6.05)
+
+    def test_rejects_wrong_labels_and_duplicates(self):
+        registry = metrics.Registry()
+        counter = registry.register(metrics.Counter("dup", "Dup.", labels=("a",)))
+        with pytest.raises(ValueError):
+            counter.inc(b="x")
+        with pytest.raises(ValueError):
+            registry.register(metrics.Counter("dup", "Dup."))
+
+    def test_escapes_label_values(self):
+        counter = metrics.Counter("esc_total", "Esc.", labels=("v",))
+        counter.inc(v='a"b\\c')
+        assert list(counter.samples()) == ['esc_total{v="a\\"b\\\\c"} 1']
+
+
+class TestStages:
+    def test_redaction_stages_are_timed(self, text_pdf, suggestion_xfdf):
+        before = {
+            name: metrics.STAGE_DURATION.count(stage=name)
+            for name in ("fitz_open", "xfdf_parse", "apply_redactions", "tobytes")
+        }
+        apply_redactions(text_pdf, suggestion_xfdf)
+        for name, count in before.items():
+            assert metrics.STAGE_DURATION.count(stage=name) == count + 1
+
+    def test_collect_and_replay(self):
+        with stages.collect() as samples, stages.stage("custom"):
+            pass
+        assert [name for name, _ in samples] == ["custom"]
+        before = metrics.STAGE_DURATION.count(stage="custom")
+        stages.replay(samples)
+        assert metrics.STAGE_DURATION.count(stage="custom") == before + 1
+
+
+class TestMetricsInterceptor:
+    @pytest.fixture
+    def stub(self):
+        server = grpc.server(
+            futures.ThreadPoolExecutor(max_workers=2),
+            interceptors=[MetricsInterceptor()],
+        )
+        pb2_grpc.add_PdfServiceServicer_to_server(PdfServiceServicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            yield pb2_grpc.PdfServiceStub(channel)
+        server.stop(grace=None)
+
+    def test_records_latency_sizes_and_pages(self, stub, multi_page_pdf):
+        count = metrics.RPC_DURATION.count(method="ExtractText", code="OK")
+        pages = metrics.RPC_PAGES.sum(method="ExtractText")
+        request_bytes = metrics.RPC_REQUEST_BYTES.sum(method="ExtractText")
+        list(stub.ExtractText(pb2.ExtractTextRequest(pdf_data=multi_page_pdf)))
+        assert metrics.RPC_DURATION.count(method="ExtractText", code="OK") == count + 1
+        assert metrics.RPC_PAGES.sum(method="ExtractText") == pages + 3
+        assert metrics.RPC_REQUEST_BYTES.sum(
+            method="ExtractText"
+        ) - request_bytes > len(multi_page_pdf)
+
+    def test_sizes_are_serialized_sizes(self, stub, multi_page_pdf, monkeypatch):
+        def byte_size(self):
+            raise AssertionError("ByteSize() serializes the message again")
+
+        monkeypatch.setattr(pb2.PageTextResponse, "ByteSize", byte_size)
+        monkeypatch.setattr(pb2.DocumentInfoResponse, "ByteSize", byte_size)
+        sent = metrics.RPC_RESPONSE_BYTES.sum(method="ExtractText")
+        info_sent = metrics.RPC_RESPONSE_BYTES.sum(method="GetDocumentInfo")
+        request = pb2.PdfInput(pdf_data=multi_page_pdf)
+        received = metrics.RPC_REQUEST_BYTES.sum(method="GetDocumentInfo")
+        info = stub.GetDocumentInfo(request)
+        pages = list(stub.ExtractText(pb2.ExtractTextRequest(pdf_data=multi_page_pdf)))
+        assert metrics.RPC_REQUEST_BYTES.sum(method="GetDocumentInfo") == (
+            received + len(request.SerializeToString())
+        )
+        assert metrics.RPC_RESPONSE_BYTES.sum(method="GetDocumentInfo") == (
+            info_sent + len(info.SerializeToString())
+        )
+        assert metrics.RPC_RESPONSE_BYTES.sum(method="ExtractText") == sent + sum(
+            len(page.SerializeToString()) for page in pages
+        )
+
+    def test_records_streamed_page_info(self, stub, multi_page_pdf):
+        pages = metrics.RPC_PAGES.sum(method="StreamDocumentInfo")
+        request = pb2.StreamDocumentInfoRequest(pdf_data=multi_page_pdf, start_page=1)
+        list(stub.StreamDocumentInfo(request))
+        assert metrics.RPC_PAGES.sum(method="StreamDocumentInfo") == pages + 2
+
+    def test_records_error_status(self, stub):
+        labels = {"method": "GetDocumentInfo", "code": "INVALID_ARGUMENT"}
+        count = metrics.RPC_DURATION.count(**labels)
+        with pytest.raises(grpc.RpcError):
+            stub.GetDocumentInfo(pb2.PdfInput(pdf_data=b"junk"))
+        assert metrics.RPC_DURATION.count(**labels) == count + 1
+
+    def test_records_client_streaming(self, stub, text_pdf):
+        count = metrics.RPC_DURATION.count(method="GetDocumentInfoUpload", code="OK")
+        chunks = [text_pdf[i : i + 100] for i in range(0, len(text_pdf), 100)]
+        stub.GetDocumentInfoUpload(
+            iter([pb2.GetDocumentInfoUploadRequest(chunk=c) for c in chunks])
+        )
+        assert (
+            metrics.RPC_DURATION.count(method="GetDocumentInfoUpload", code="OK")
+            == count + 1
+        )
+        assert metrics.RPC_REQUEST_BYTES.sum(method="GetDocumentInfoUpload") >= len(
+            text_pdf
+        )
+
+
+def test_metrics_interceptor_only_with_metrics_port():
+    config = ServiceConfig(metrics_port=0, compression="gzip")
+    assert [type(i) for i in server._interceptors(config)] == [CompressionInterceptor]
+    config = ServiceConfig(metrics_port=9100, compression="none")
+    assert [type(i) for i in server._interceptors(config, asynchronous=True)] == [
+        AsyncMetricsInterceptor
+    ]
+
+
+class TestAsyncMetricsInterceptor:
+    def test_records_unary_and_streaming(self, multi_page_pdf):
+        async def main():
+            executor = futures.ThreadPoolExecutor(max_workers=2)
+            server = grpc.aio.server(interceptors=[AsyncMetricsInterceptor()])
+            pb2_grpc.add_PdfServiceServicer_to_server(
+                AsyncPdfServiceServicer(InlineEngine(), executor), server
+            )
+            port = server.add_insecure_port("127.0.0.1:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = pb2_grpc.PdfServiceStub(channel)
+                    await stub.GetDocumentInfo(pb2.PdfInput(pdf_data=multi_page_pdf))
+                    request = pb2.ExtractTextRequest(pdf_data=multi_page_pdf)
+                    [page async for page in stub.ExtractText(request)]
+                    with pytest.raises(grpc.aio.AioRpcError):
+                        await stub.GetDocumentInfo(pb2.PdfInput(pdf_data=b"junk"))
+            finally:
+                await server.stop(grace=None)
+                executor.shutdown()
+
+        info = metrics.RPC_DURATION.count(method="GetDocumentInfo", code="OK")
+        pages = metrics.RPC_PAGES.sum(method="ExtractText")
+        invalid = {"method": "GetDocumentInfo", "code": "INVALID_ARGUMENT"}
+        errors = metrics.RPC_DURATION.count(**invalid)
+        info_sizes = metrics.RPC_RESPONSE_BYTES.count(method="GetDocumentInfo")
+        page_bytes = metrics.RPC_RESPONSE_BYTES.sum(method="ExtractText")
+        asyncio.run(main())
+        assert metrics.RPC_RESPONSE_BYTES.count(method="GetDocumentInfo") == (
+            info_sizes + 1
+        )
+        assert metrics.RPC_RESPONSE_BYTES.sum(method="ExtractText") > page_bytes
+        assert metrics.RPC_DURATION.count(method="GetDocumentInfo", code="OK") == (
+            info + 1
+        )
+        assert metrics.RPC_PAGES.sum(method="ExtractText") == pages + 3
+        assert metrics.RPC_DURATION.count(**invalid) == errors + 1
+
+
+def compressing_stub(interceptor, options=()):
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=2), interceptors=[interceptor]
+    )
+    pb2_grpc.add_PdfServiceServicer_to_server(PdfServiceServicer(), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}", options=list(options))
+    return server, channel, pb2_grpc.PdfServiceStub(channel)
+
+
+class FakeContext:
+    def __init__(self):
+        self.compression = None
+        self.uncompressed = 0
+
+    def set_compression(self, compression):
+        self.compression = compression
+
+    def disable_next_message_compression(self):
+        self.uncompressed += 1
+
+
+class TestCompressionInterceptor:
+    def extract(self, interceptor, pdf_data, options=()):
+        server, channel, stub = compressing_stub(interceptor, options)
+        try:
+            request = pb2.ExtractTextRequest(
+                pdf_data=pdf_data, include_word_positions=True
+            )
+            return [page.text for page in stub.ExtractText(request)]
+        finally:
+            channel.close()
+            server.stop(grace=None)
+
+    def test_rejects_unsupported_algorithm(self):
+        with pytest.raises(ValueError, match="zstd"):
+            CompressionInterceptor("zstd", 0)
+
+    def test_compresses_large_responses(self, multi_page_pdf):
+        labels = {"method": "ExtractText", "algorithm": "gzip"}
+        sampled = metrics.RPC_COMPRESSION_RATIO.count(**labels)
+        interceptor = CompressionInterceptor("gzip", 1)
+        pages = self.extract(interceptor, multi_page_pdf)
+        assert len(pages) == 3 and "Project Alpha" in pages[1]
+        interceptor._compression.ratios.join()
+        assert metrics.RPC_COMPRESSION_RATIO.count(**labels) == sampled + 1
+
+    def test_small_responses_are_not_compressed(self, multi_page_pdf):
+        labels = {"method": "ExtractText", "algorithm": "deflate"}
+        sampled = metrics.RPC_COMPRESSION_RATIO.count(**labels)
+        interceptor = CompressionInterceptor("deflate", 10**9)
+        pages = self.extract(interceptor, multi_page_pdf)
+        assert len(pages) == 3
+        interceptor._compression.ratios.join()
+        assert metrics.RPC_COMPRESSION_RATIO.count(**labels) == sampled
+
+    def test_samples_one_in_ten_off_the_call(self, monkeypatch):
+        measured = threading.Event()
+        observe = metrics.RPC_COMPRESSION_RATIO.observe
+
+        def slow_observe(*args, **kwargs):
+            measured.wait(10)
+            observe(*args, **kwargs)
+
+        monkeypatch.setattr(metrics.RPC_COMPRESSION_RATIO, "observe", slow_observe)
+        labels = {"method": "Sampled", "algorithm": "gzip"}
+        sampled = metrics.RPC_COMPRESSION_RATIO.count(**labels)
+        compression = CompressionInterceptor("gzip", 4)._compression
+        call = compression.call("Sampled")
+        context = FakeContext()
+        call.start(context)
+        serialize = call.serializer(bytes)
+        for _ in range(20):
+            # Returns while the sample waits to be measured.
+            assert serialize(b"x" * 100) == b"x" * 100
+        assert context.uncompressed == 0
+        serialize(b"xy")  # below min_bytes: sent uncompressed, not sampled
+        assert context.uncompressed == 1
+        measured.set()
+        compression.ratios.join()
+        assert metrics.RPC_COMPRESSION_RATIO.count(**labels) == sampled + 2
+
+    def test_decides_without_encoding_again(self, multi_page_pdf, monkeypatch):
+        def byte_size(self):
+            raise AssertionError("ByteSize() serializes the message again")
+
+        monkeypatch.setattr(pb2.PageTextResponse, "ByteSize", byte_size)
+        interceptor = CompressionInterceptor("gzip", 200)
+        assert len(self.extract(interceptor, multi_page_pdf)) == 3
+
+    def test_client_without_gzip_support(self, multi_page_pdf):
+        # Only identity enabled: the server falls back to uncompressed.
+        options = [("grpc.enabled_compression_algorithms_bitset", 1)]
+        interceptor = CompressionInterceptor("gzip", 1)
+        assert len(self.extract(interceptor, multi_page_pdf, options)) == 3
+
+    def test_async_server(self, multi_page_pdf):
+        interceptor = AsyncCompressionInterceptor("gzip", 1)
+
+        async def main():
+            executor = futures.ThreadPoolExecutor(max_workers=2)
+            server = grpc.aio.server(interceptors=[interceptor])
+            pb2_grpc.add_PdfServiceServicer_to_server(
+                AsyncPdfServiceServicer(InlineEngine(), executor), server
+            )
+            port = server.add_insecure_port("127.0.0.1:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                    stub = pb2_grpc.PdfServiceStub(channel)
+                    info = await stub.GetDocumentInfo(
+                        pb2.PdfInput(pdf_data=multi_page_pdf)
+                    )
+                    request = pb2.ExtractTextRequest(pdf_data=multi_page_pdf)
+                    pages = [page async for page in stub.ExtractText(request)]
+                    return info.page_count, len(pages)
+            finally:
+                await server.stop(grace=None)
+                executor.shutdown()
+
+        labels = {"method": "GetDocumentInfo", "algorithm": "gzip"}
+        sampled = metrics.RPC_COMPRESSION_RATIO.count(**labels)
+        assert asyncio.run(main()) == (3, 3)
+        interceptor._compression.ratios.join()
+        assert metrics.RPC_COMPRESSION_RATIO.count(**labels) == sampled + 1
+
+
+class TestHttpEndpoint:
+    def test_serves_prometheus_text(self):
+        server = metrics.start_http_server(0, host="127.0.0.1")
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as resp:
+                body = resp.read().decode()
+                assert resp.headers["Content-Type"].startswith("text/plain")
+            assert "pdfcore_process_resident_memory_bytes" in body
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+        finally:
+            server.shutdown()
@@ -1,7 +1,11 @@
+from concurrent import futures
+
 import fitz
 import pytest
 
-from pdf_service.core.ocr import ocr_page
+from pdf_service.cache import ResultCache
+from pdf_service.core import ocr
+from pdf_service.core.ocr import ocr_page, ocr_textpage
 
 
 class TestOcrPage:
@@ -35,3 +39,93 @@ class TestOcrPage:
             raise
         finally:
             doc.close()
+
+    def test_ocr_textpage_has_positions(self, text_pdf):
+        doc = fitz.open(stream=text_pdf, filetype="pdf")
+        try:
+            textpage = ocr_textpage(doc[0])
+            blocks = textpage.extractDICT()["blocks"]
+            assert any(block["type"] == 0 for block in blocks)
+        except RuntimeError as e:
+            if "Tesseract" in str(e):
+                pytest.skip("Tesseract not installed")
+            raise
+        finally:
+            doc.close()
+
+
+class TestOcrCache:
+    def test_hit_skips_tesseract(self, fake_tesseract, scanned_pdf):
+        ocr.set_cache(ResultCache(max_bytes=10**6))
+        with fitz.open(stream=scanned_pdf, filetype="pdf") as doc:
+            first = ocr_textpage(doc[0]).extractDICT()
+            second = ocr_textpage(doc[0]).extractDICT()
+        assert fake_tesseract == ["eng"]
+        assert second == first
+        (line,) = [line for b in first["blocks"] for line in b.get("lines", [])]
+        assert line["spans"][0]["text"] == "Recognized"
+        assert line["bbox"][0] == pytest.approx(100)
+
+    def test_keyed_by_language(self, fake_tesseract, scanned_pdf):
+        ocr.set_cache(ResultCache(max_bytes=10**6))
+        with fitz.open(stream=scanned_pdf, filetype="pdf") as doc:
+            ocr_page(doc[0], language="eng")
+            ocr_page(doc[0], language="deu")
+            ocr_page(doc[0], language="deu")
+        assert fake_tesseract == ["eng", "deu"]
+
+    def test_keyed_by_rendered_content(self, fake_tesseract, scanned_pdf):
+        ocr.set_cache(ResultCache(max_bytes=10**6))
+        with fitz.open(stream=scanned_pdf, filetype="pdf") as doc:
+            ocr_page(doc[0])
+            # Same page content in another document is a hit.
+            with fitz.open(stream=scanned_pdf + b"\n", filetype="pdf") as copy:
+                ocr_page(copy[0])
+            doc[0].draw_rect(fitz.Rect(10, 10, 50, 50), fill=(0, 0, 0))
+            ocr_page(doc[0])
+        assert len(fake_tesseract) == 2
+
+    def test_disk_tier_survives_restart(self, fake_tesseract, tmp_path, scanned_pdf):
+        for _ in range(2):
+            ocr.set_cache(ResultCache(0, str(tmp_path), 10**7))
+            with fitz.open(stream=scanned_pdf, filetype="pdf") as doc:
+                assert "Recognized" in ocr_page(doc[0])
+        assert len(fake_tesseract) == 1
+
+    def test_keeps_legible_text(self, fake_tesseract, text_pdf):
+        with fitz.open(stream=text_pdf, filetype="pdf") as doc:
+            text = ocr_page(doc[0])
+        assert "John Smith" in text
+        assert "Recognized" in text
+
+
+@pytest.fixture
+def thread_recognizer(fake_tesseract):
+    """Recognizes images on a thread, as an OCR pool would in its workers."""
+    with futures.ThreadPoolExecutor(max_workers=1) as threads:
+        ocr.set_recognizer(
+            lambda *args: threads.submit(ocr.recognize_image, *args),
+            pages_in_flight=2,
+        )
+        yield fake_tesseract
+        ocr.set_recognizer(None)
+
+
+class TestRecognizer:
+    def test_recognizes_rendered_image(self, thread_recognizer, scanned_pdf):
+        with fitz.open(stream=scanned_pdf, filetype="pdf") as doc:
+            pending = ocr.submit_page(doc[0], "deu")
+            assert "Recognized" in pending.result().extractText()
+        assert thread_recognizer == ["deu"]
+        assert ocr.pages_in_flight() == 2
+
+    def test_result_is_cached(self, thread_recognizer, scanned_pdf):
+        ocr.set_cache(ResultCache(10**6))
+        with fitz.open(stream=scanned_pdf, filetype="pdf") as doc:
+            for _ in range(2):
+                assert "Recognized" in ocr_page(doc[0])
+        assert len(thread_recognizer) == 1
+
+    def test_rejects_invalid_window(self):
+        with pytest.raises(ValueError, match="pages_in_flight"):
+            ocr.set_recognizer(None, pages_in_flight=0)
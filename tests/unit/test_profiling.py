@@ -0,0 +1,148 @@
+import json
+import pstats
+from concurrent import futures
+
+import grpc
+import pytest
+
+from pdf_service import profiling
+from pdf_service.config import ServiceConfig
+from pdf_service.core import text_extraction
+from pdf_service.engine import ProcessPoolEngine
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2 as pb2
+from pdf_service.generated.redactr.pdf.v1 import pdf_service_pb2_grpc as pb2_grpc
+from pdf_service.grpc.servicer import PdfServiceServicer
+from pdf_service.sessions import DocumentStore
+from tests.unit.test_aio_servicer import run_with_stub
+
+PROFILE = ((profiling.REQUEST_KEY, "1"),)
+
+
+def summary_from(trailers):
+    for key, value in trailers:
+        if key == profiling.SUMMARY_KEY:
+            return json.loads(value)
+    return None
+
+
+class TestProfileCall:
+    def test_requested(self):
+        assert profiling.requested(PROFILE)
+        assert profiling.requested([(profiling.REQUEST_KEY, "true")])
+        assert not profiling.requested([(profiling.REQUEST_KEY, "0")])
+        assert not profiling.requested([("other", "1")])
+        assert not profiling.requested(None)
+
+    def test_summary_has_times_functions_and_pages(self, multi_page_pdf):
+        result, summary = profiling.profile_call(
+            text_extraction.extract_all_text, "", multi_page_pdf, None, False, None
+        )
+        assert [page["page_number"] for page in result] == [0, 1, 2]
+        assert summary["wall_s"] > 0
+        assert summary["pages"] == 3
+        assert sorted(n for n, _ in summary["slowest_pages"]) == [0, 1, 2]
+        assert 0 < len(summary["functions"]) <= profiling.TOP_FUNCTIONS
+        assert {"fn", "calls", "self_s", "cum_s"} <= set(summary["functions"][0])
+        assert "file" not in summary
+
+    def test_writes_full_profile(self, tmp_path, text_pdf):
+        _, summary = profiling.profile_call(
+            text_extraction.extract_all_text, str(tmp_path), text_pdf, None, False, None
+        )
+        assert summary["file"].startswith(str(tmp_path))
+        assert pstats.Stats(summary["file"]).total_calls > 0
+
+    def test_page_timing_is_off_outside_profiles(self, multi_page_pdf):
+        # Nothing is collected (or leaks into the next profile) otherwise.
+        text_extraction.extract_all_text(multi_page_pdf, None, False, None)
+        _, summary = profiling.profile_call(lambda: None, "")
+        assert summary["pages"] == 0
+
+    def test_profiles_in_worker_process(self, multi_page_pdf):
+        engine = ProcessPoolEngine(max_workers=1)
+        try:
+            result, summary = engine.run(
+                profiling.profiled(text_extraction.extract_all_text),
+                multi_page_pdf,
+                [1],
+                False,
+                None,
+            )
+        finally:
+            engine.shutdown()
+        assert [page["page_number"] for page in result] == [1]
+        assert summary["slowest_pages"][0][0] == 1
+
+
+class TestProfiledRpcs:
+    @pytest.fixture
+    def stub(self):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        servicer = PdfServiceServicer(config=ServiceConfig(profiling_enabled=True))
+        pb2_grpc.add_PdfServiceServicer_to_server(servicer, server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            yield pb2_grpc.PdfServiceStub(channel)
+        server.stop(grace=None)
+
+    def test_unary_summary_in_trailer(self, stub, multi_page_pdf):
+        request = pb2.PdfInput(pdf_data=multi_page_pdf)
+        response, call = stub.GetDocumentInfo.with_call(request, metadata=PROFILE)
+        summary = summary_from(call.trailing_metadata())
+        assert response.page_count == 3
+        assert summary["pages"] == 3
+
+        # Cached results are not profiled, so every profiled call does the work.
+        _, call = stub.GetDocumentInfo.with_call(request, metadata=PROFILE)
+        assert summary_from(call.trailing_metadata())["pages"] == 3
+
+    def test_streaming_summary_in_trailer(self, stub, multi_page_pdf):
+        call = stub.ExtractText(
+            pb2.ExtractTextRequest(pdf_data=multi_page_pdf, pages=[0, 2]),
+            metadata=PROFILE,
+        )
+        assert [page.page_number for page in call] == [0, 2]
+        summary = summary_from(call.trailing_metadata())
+        assert sorted(n for n, _ in summary["slowest_pages"]) == [0, 2]
+
+    def test_redaction_of_session(self, stub, text_pdf, suggestion_xfdf):
+        session = stub.OpenDocument(pb2.PdfInput(pdf_data=text_pdf))
+        response, call = stub.ApplyRedactions.with_call(
+            pb2.ApplyRedactionsRequest(doc_id=session.doc_id, xfdf=suggestion_xfdf),
+            metadata=PROFILE,
+        )
+        assert response.pdf_data.startswith(b"%PDF")
+        assert summary_from(call.trailing_metadata())["pages"] >= 1
+
+    def test_disabled_by_default(self, text_pdf):
+        servicer = PdfServiceServicer(
+            documents=DocumentStore(max_bytes=10**7, ttl_seconds=60)
+        )
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
+        pb2_grpc.add_PdfServiceServicer_to_server(servicer, server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        try:
+            with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = pb2_grpc.PdfServiceStub(channel)
+                _, call = stub.GetDocumentInfo.with_call(
+                    pb2.PdfInput(pdf_data=text_pdf), metadata=PROFILE
+                )
+        finally:
+            server.stop(grace=None)
+        assert summary_from(call.trailing_metadata()) is None
+
+    def test_async_server(self, multi_page_pdf):
+        async def call(stub):
+            rpc = stub.ExtractText(
+                pb2.ExtractTextRequest(pdf_data=multi_page_pdf), metadata=PROFILE
+            )
+            pages = [page.page_number async for page in rpc]
+            return pages, summary_from(await rpc.trailing_metadata())
+
+        pages, summary = run_with_stub(
+            call, config=ServiceConfig(profiling_enabled=True)
+        )
+        assert pages == [0, 1, 2]
+        assert summary["pages"] == 3
@@ -5,7 +5,7 @@ import fitz
 import pytest
 
 from pdf_service.core.annotation import get_suggestion_annotations
-from pdf_service.core.redaction import apply_redactions
+from pdf_service.core.redaction import apply_redactions, auto_redact, parse_xfdf
 
 
 class TestApplyRedactions:
@@ -151,3 +151,63 @@ class TestApplyRedactions:
         drawings = page.get_drawings()
         assert len(drawings) >= 1
         doc.close()
+
+
+class TestAutoRedact:
+    def test_matches_suggest_then_redact(self, multi_page_pdf):
+        texts = ["Project Alpha", "Confidential"]
+        suggestions = get_suggestion_annotations(multi_page_pdf, texts)
+        two_step = apply_redactions(multi_page_pdf, suggestions["xfdf"])
+        result = auto_redact(multi_page_pdf, texts)
+
+        assert result["page_count"] == 3
+        assert result["total_suggestions"] == suggestions["total_suggestions"]
+        assert result["results"] == suggestions["results"]
+        assert result["redactions_applied"] == two_step["redactions_applied"]
+        assert result["content_hash"] == hashlib.sha256(result["pdf_data"]).digest()
+        # Same areas, without the 2-decimal rounding of the XFDF round trip.
+        for auto, via_xfdf in zip(
+            result["redaction_log"], two_step["redaction_log"], strict=True
+        ):
+            assert auto["page"] == via_xfdf["page"]
+            assert auto["x0"] == pytest.approx(via_xfdf["x0"], abs=0.01)
+            assert auto["y1"] == pytest.approx(via_xfdf["y1"], abs=0.01)
+
+        doc = fitz.open(stream=result["pdf_data"], filetype="pdf")
+        text = "".join(page.get_text() for page in doc)
+        doc.close()
+        assert "Project Alpha" not in text
+
+    def test_no_matches(self, text_pdf):
+        result = auto_redact(text_pdf, ["Nowhere In This Document"])
+        assert result["redactions_applied"] == 0
+        assert result["results"] == []
+        assert result["pdf_data"].startswith(b"%PDF")
+
+    def test_with_style(self, text_pdf):
+        result = auto_redact(
+            text_pdf, ["John Smith"], style_config={"fill_color": "#005941"}
+        )
+        doc = fitz.open(stream=result["pdf_data"], filetype="pdf")
+        assert len(doc[0].get_drawings()) >= 1
+        doc.close()
+
+    def test_raises_for_empty_pdf_bytes(self):
+        with pytest.raises(ValueError, match="Empty PDF data"):
+            auto_redact(b"", ["John Smith"])
+
+
+def test_parse_xfdf_skips_invalid_annotations(text_pdf):
+    xfdf = (
+        '<xfdf xmlns="http://ns.adobe.com/xfdf/"><annots>'
+        '<highlight page="0" rect="10,20,30,40"/>'
+        '<highlight page="9" rect="10,20,30,40"/>'
+        '<square page="0" rect="1,2,3"/>'
+        "</annots></xfdf>"
+    )
+    doc = fitz.open(stream=text_pdf, filetype="pdf")
+    rects = parse_xfdf(doc, xfdf)
+    height = doc[0].rect.height
+    doc.close()
+    assert list(rects) == [0]
+    assert rects[0] == [fitz.Rect(10, height - 40, 30, height - 20)]
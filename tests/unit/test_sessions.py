@@ -0,0 +1,94 @@
+import pytest
+
+from pdf_service.sessions import (
+    DocumentNotFoundError,
+    DocumentStore,
+    DocumentTooLargeError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDocumentStore:
+    def test_open_and_get(self, multi_page_pdf):
+        store = DocumentStore(max_bytes=10**7, ttl_seconds=60)
+        session = store.open(multi_page_pdf)
+        assert len(session.doc) == 3
+        assert session.size == len(multi_page_pdf)
+        assert store.get(session.doc_id) is session
+
+    def test_unknown_doc_id(self):
+        store = DocumentStore(max_bytes=10**7, ttl_seconds=60)
+        with pytest.raises(DocumentNotFoundError):
+            store.get("missing")
+
+    def test_doc_id_of_another_process(self, text_pdf):
+        opened_by = DocumentStore(max_bytes=10**7, ttl_seconds=60, process_index=1)
+        store = DocumentStore(max_bytes=10**7, ttl_seconds=60, process_index=0)
+        session = opened_by.open(text_pdf)
+        assert session.doc_id.startswith("p1-")
+        assert opened_by.get(session.doc_id) is session
+        with pytest.raises(DocumentNotFoundError, match="opened by server process 1"):
+            store.get(session.doc_id)
+        with pytest.raises(DocumentNotFoundError, match="Unknown or expired"):
+            store.get("p0-" + session.doc_id[3:])
+
+    def test_rejects_corrupt_pdf(self):
+        store = DocumentStore(max_bytes=10**7, ttl_seconds=60)
+        with pytest.raises(ValueError, match="Invalid or corrupt PDF"):
+            store.open(b"not a pdf")
+        assert len(store) == 0
+
+    def test_rejects_document_over_budget(self, text_pdf):
+        store = DocumentStore(max_bytes=len(text_pdf) - 1, ttl_seconds=60)
+        with pytest.raises(DocumentTooLargeError):
+            store.open(text_pdf)
+
+    def test_close(self, text_pdf):
+        store = DocumentStore(max_bytes=10**7, ttl_seconds=60)
+        session = store.open(text_pdf)
+        assert store.close(session.doc_id) is True
+        assert store.close(session.doc_id) is False
+        assert store.total_bytes == 0
+        with pytest.raises(DocumentNotFoundError):
+            store.get(session.doc_id)
+
+    def test_evicts_least_recently_used_over_budget(self, text_pdf):
+        store = DocumentStore(max_bytes=len(text_pdf) * 2, ttl_seconds=60)
+        first = store.open(text_pdf)
+        second = store.open(text_pdf)
+        store.get(first.doc_id)  # first is now most recently used
+        third = store.open(text_pdf)
+
+        assert store.get(first.doc_id) is first
+        assert store.get(third.doc_id) is third
+        with pytest.raises(DocumentNotFoundError):
+            store.get(second.doc_id)
+        assert store.total_bytes == len(text_pdf) * 2
+
+    def test_expires_idle_sessions(self, text_pdf):
+        clock = FakeClock()
+        store = DocumentStore(max_bytes=10**7, ttl_seconds=30, clock=clock)
+        idle = store.open(text_pdf)
+        clock.now = 20
+        active = store.open(text_pdf)
+        clock.now = 40
+
+        assert store.get(active.doc_id) is active
+        with pytest.raises(DocumentNotFoundError):
+            store.get(idle.doc_id)
+        assert len(store) == 1
+
+    def test_resolve(self, text_pdf):
+        store = DocumentStore(max_bytes=10**7, ttl_seconds=60)
+        session = store.open(text_pdf)
+        assert store.resolve("", text_pdf) == text_pdf
+        assert store.resolve(session.doc_id, b"") is session
+        with pytest.raises(ValueError, match="not both"):
+            store.resolve(session.doc_id, text_pdf)
@@ -0,0 +1,109 @@
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+
+from pdf_service.config import ServiceConfig
+from pdf_service.server import _process_config
+from pdf_service.supervisor import Supervisor
+
+
+def exit_immediately(index, health):
+    sys.exit(3)
+
+
+def exit_once(directory, index, health):
+    marker = os.path.join(directory, "exited")
+    if index == 0 and not os.path.exists(marker):
+        open(marker, "w").close()
+        sys.exit(3)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    while True:
+        time.sleep(0.05)
+
+
+def serve_until_sigterm(directory, index, health):
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    open(os.path.join(directory, f"ready-{index}"), "w").close()
+    stopping.wait(30)
+    open(os.path.join(directory, f"stopped-{index}"), "w").close()
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def supervise(supervisor):
+    thread = threading.Thread(
+        target=supervisor.run, kwargs={"install_signal_handlers": False}
+    )
+    thread.start()
+    return thread
+
+
+class TestSupervisor:
+    def test_forwards_sigterm_and_waits(self, tmp_path):
+        supervisor = Supervisor(
+            functools.partial(serve_until_sigterm, str(tmp_path)), processes=2
+        )
+        thread = supervise(supervisor)
+        wait_for(lambda: len(list(tmp_path.glob("ready-*"))) == 2)
+        pids = {p.pid for p in supervisor.children.values()}
+        assert len(pids) == 2
+
+        supervisor.stop()
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+        assert sorted(p.name for p in tmp_path.glob("stopped-*")) == [
+            "stopped-0",
+            "stopped-1",
+        ]
+        assert supervisor.restarts == 0
+
+    def test_not_serving_until_crashed_child_is_back(self, tmp_path):
+        supervisor = Supervisor(
+            functools.partial(exit_once, str(tmp_path)),
+            processes=2,
+            restart_backoff=0.5,
+        )
+        health = []
+        thread = supervise(supervisor)
+        wait_for(lambda: supervisor.restarts == 1)
+        health.append((supervisor.health.serving(0), supervisor.health.serving(1)))
+        wait_for(lambda: supervisor.health.all_serving)
+        supervisor.stop()
+        thread.join(timeout=30)
+        # The child that stayed up serves throughout.
+        assert health == [(False, True)]
+        assert supervisor.restarts == 1
+
+    def test_restarts_crashed_children(self):
+        supervisor = Supervisor(exit_immediately, processes=1, restart_backoff=0.05)
+        thread = supervise(supervisor)
+        wait_for(lambda: supervisor.restarts >= 2)
+        supervisor.stop()
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+
+
+class TestProcessConfig:
+    def test_divides_worker_pools_across_processes(self):
+        config = ServiceConfig(
+            server_processes=3, process_workers=8, ocr_workers=4, metrics_port=9100
+        )
+        process_config = _process_config(config, 2)
+        assert process_config.process_workers == 2
+        assert process_config.ocr_workers == 1
+        assert process_config.metrics_port == 9102
+
+    def test_keeps_at_least_one_worker(self):
+        config = ServiceConfig(server_processes=4, process_workers=2, ocr_workers=0)
+        process_config = _process_config(config, 0)
+        assert process_config.process_workers == 1
+        assert process_config.ocr_workers == 0
@@ -1,6 +1,11 @@
+import fitz
 import pytest
 
-from pdf_service.core.text_extraction import extract_text
+from pdf_service.core import text_extraction
+from pdf_service.core.text_extraction import (
+    extract_text,
+    select_pages,
+)
 
 
 class TestExtractText:
@@ -59,3 +64,152 @@ class TestExtractText:
     def test_no_blocks_when_positions_disabled(self, text_pdf):
         pages = list(extract_text(text_pdf, None, False, None))
         assert pages[0]["blocks"] == []
+
+    def test_blocks_match_text(self, multi_page_pdf):
+        for page in extract_text(multi_page_pdf, None, True, None):
+            lines = [block["text"] for block in page["blocks"]]
+            assert lines
+            assert all(line in page["text"] for line in lines)
+
+    def test_ocr_text_and_positions_from_one_textpage(self, monkeypatch, scanned_pdf):
+        ocr_doc = fitz.open()
+        ocr_doc.new_page().insert_text((100, 200), "Recognized")
+        calls = []
+
+        def submit_page(page, language):
+            calls.append(language)
+            return ocr_doc[0].get_textpage()
+
+        monkeypatch.setattr(text_extraction.ocr, "submit_page", submit_page)
+        ocr = {"enabled": True, "language": "deu"}
+        (page,) = extract_text(scanned_pdf, None, True, ocr)
+        ocr_doc.close()
+        assert calls == ["deu"]
+        assert page["text"].strip() == "Recognized"
+        assert [b["text"] for b in page["blocks"]] == ["Recognized"]
+        assert page["blocks"][0]["x0"] == pytest.approx(100)
+
+    def test_ocr_pages_submitted_ahead(self, monkeypatch, scanned_pdf):
+        with fitz.open(stream=scanned_pdf, filetype="pdf") as scan:
+            doc = fitz.open()
+            for _ in range(4):
+                doc.insert_pdf(scan)
+        submitted = []
+
+        class Pending:
+            def __init__(self, page):
+                self.page = page
+
+            def result(self):
+                return self.page.get_textpage()
+
+        def submit_page(page, language):
+            submitted.append(page.number)
+            return Pending(page)
+
+        monkeypatch.setattr(text_extraction.ocr, "submit_page", submit_page)
+        monkeypatch.setattr(text_extraction.ocr, "PendingOcr", Pending)
+        monkeypatch.setattr(text_extraction.ocr, "_pages_in_flight", 2)
+        pages = text_extraction.extract_document_text(
+            doc, None, False, {"enabled": True}
+        )
+        assert next(pages)["page_number"] == 0
+        assert submitted == [0, 1]
+        assert [p["page_number"] for p in pages] == [1, 2, 3]
+        assert submitted == [0, 1, 2, 3]
+        doc.close()
+
+
+class TestPackedPositions:
+    def test_matches_blocks(self, multi_page_pdf, edge_case_pdf):
+        for pdf_data in (multi_page_pdf, edge_case_pdf):
+            pages = extract_text(pdf_data, None, True, None)
+            packed_pages = extract_text(pdf_data, None, True, None, True)
+            for page, packed_page in zip(pages, packed_pages, strict=True):
+                assert packed_page["blocks"] == []
+                assert packed_page["text"] == page["text"]
+                assert _unpack(packed_page) == page["blocks"]
+
+    def test_off_page_lines_match_blocks(self):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "on the page")
+        page.insert_text((-100, 200), "partly off the page")
+        page.insert_text((700, 300), "off the page")
+        pdf_data = doc.tobytes()
+        (page_result,) = extract_text(pdf_data, None, True, None)
+        (packed_page,) = extract_text(pdf_data, None, True, None, True)
+        assert packed_page["text"] == page_result["text"]
+        assert _unpack(packed_page) == page_result["blocks"]
+
+    def test_falls_back_when_lines_do_not_match_newlines(
+        self, monkeypatch, multi_page_pdf
+    ):
+        pages = extract_text(multi_page_pdf, None, True, None)
+        line_bboxes = text_extraction._line_bboxes
+
+        def one_line_too_many(textpage):
+            bboxes, counts = line_bboxes(textpage)
+            return [*bboxes, 0.0, 0.0, 1.0, 1.0], [*counts[:-1], counts[-1] + 1]
+
+        monkeypatch.setattr(text_extraction, "_line_bboxes", one_line_too_many)
+        packed_pages = extract_text(multi_page_pdf, None, True, None, True)
+        for page, packed_page in zip(pages, packed_pages, strict=True):
+            assert _unpack(packed_page) == page["blocks"]
+
+    def test_ignored_without_positions(self, text_pdf):
+        (page,) = extract_text(text_pdf, None, False, None, True)
+        assert page["packed_blocks"] is None
+        assert page["blocks"] == []
+
+
+def _unpack(page):
+    packed = page["packed_blocks"]
+    text = page["text"].encode()
+    offsets = packed["line_offsets"]
+    lines = []
+    for block_number, count in enumerate(packed["block_line_counts"]):
+        for line_number in range(count):
+            i = len(lines)
+            line_text = text[offsets[i] : offsets[i + 1]].decode()
+            assert line_text.endswith("\n")
+            x0, y0, x1, y1 = packed["bboxes"][4 * i : 4 * i + 4]
+            lines.append(
+                {
+                    "text": line_text[:-1],
+                    "x0": x0,
+                    "y0": y0,
+                    "x1": x1,
+                    "y1": y1,
+                    "block_number": block_number,
+                    "line_number": line_number,
+                }
+            )
+    assert offsets[-1] == len(text)
+    return lines
+
+
+class TestSelectPages:
+    def test_all_pages_when_no_filter(self, multi_page_pdf):
+        assert select_pages(multi_page_pdf, None) == [0, 1, 2]
+
+    def test_keeps_requested_order(self, multi_page_pdf):
+        assert select_pages(multi_page_pdf, [2, 0]) == [2, 0]
+
+    def test_raises_for_invalid_page_numbers(self, text_pdf):
+        with pytest.raises(ValueError, match="Page numbers out of range"):
+            select_pages(text_pdf, [5])
+
+    def test_page_range(self, multi_page_pdf):
+        assert select_pages(multi_page_pdf, None, 1) == [1, 2]
+        assert select_pages(multi_page_pdf, None, 0, 2) == [0, 1]
+
+    def test_raises_for_invalid_range(self, multi_page_pdf):
+        with pytest.raises(ValueError, match="Page range out of range"):
+            select_pages(multi_page_pdf, None, 2, 5)
+        with pytest.raises(ValueError, match="Page range out of range"):
+            select_pages(multi_page_pdf, None, 2, 2)
+
+    def test_raises_for_pages_and_range(self, multi_page_pdf):
+        with pytest.raises(ValueError, match="cannot both be given"):
+            select_pages(multi_page_pdf, [0], 1)